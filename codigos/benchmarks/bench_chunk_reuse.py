@@ -0,0 +1,110 @@
+"""
+Benchmark: reaproveitamento de fragmentos após edições sintéticas
+
+Gera documentos sintéticos, aplica pequenas edições (inserção de parágrafo no início,
+remoção de uma sentença no meio, alteração de uma palavra) e mede quantos fragmentos
+do documento editado já existiam (mesmo hash) antes da edição, para cada estratégia.
+
+Uso:
+    python benchmarks/bench_chunk_reuse.py [--docs 20] [--size 60000]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import get_chunking_strategies, get_chunking_strategy  # noqa: E402
+
+WORDS = (
+    "contrato cliente fornecedor valor prazo pagamento cláusula rescisão multa entrega "
+    "relatório mensal receita despesa imposto nota fiscal serviço produto garantia "
+    "responsabilidade parte acordo vigência reajuste índice anexo assinatura documento"
+).split()
+
+
+def make_sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 24))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_document(rng: random.Random, size: int) -> str:
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = " ".join(make_sentence(rng) for _ in range(rng.randint(3, 8)))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def edit_insert_paragraph(rng: random.Random, text: str) -> str:
+    position = text.find("\n\n", len(text) // 20)
+    paragraph = " ".join(make_sentence(rng) for _ in range(4))
+    return text[:position] + "\n\n" + paragraph + text[position:]
+
+
+def edit_delete_sentence(rng: random.Random, text: str) -> str:
+    middle = len(text) // 2
+    start = text.find(". ", middle) + 2
+    end = text.find(". ", start) + 2
+    return text[:start] + text[end:]
+
+
+def edit_change_word(rng: random.Random, text: str) -> str:
+    position = text.find(" ", len(text) // 3)
+    return text[:position] + " alterado" + text[position:]
+
+
+EDITS = {
+    "inserir parágrafo no início": edit_insert_paragraph,
+    "remover sentença no meio": edit_delete_sentence,
+    "alterar uma palavra": edit_change_word,
+}
+
+
+def chunk_hashes(strategy, text: str, max_chunk_size: int, chunk_overlap: int, min_chunk_size: int):
+    chunks = strategy(text, "bench.md", max_chunk_size, chunk_overlap, min_chunk_size)
+    return [hashlib.md5(chunk.encode("utf-8")).hexdigest() for chunk, _ in chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reaproveitamento de fragmentos após edições")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--size", type=int, default=60000)
+    parser.add_argument("--max-chunk-size", type=int, default=3000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--min-chunk-size", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    documents = [make_document(rng, args.size) for _ in range(args.docs)]
+
+    print(f"{args.docs} documentos de ~{args.size} caracteres, max_chunk_size={args.max_chunk_size}")
+    print(f"{'estratégia':<18} {'edição':<30} {'reuso':>8} {'inválidos/doc':>14} {'frag/doc':>9} {'tempo':>8}")
+
+    for name in get_chunking_strategies():
+        strategy = get_chunking_strategy(name)
+        for edit_name, edit in EDITS.items():
+            reused = total = total_chunks = 0
+            elapsed = 0.0
+            for index, document in enumerate(documents):
+                edited = edit(random.Random(index), document)
+                t0 = time.perf_counter()
+                before = set(chunk_hashes(strategy, document, args.max_chunk_size, args.chunk_overlap, args.min_chunk_size))
+                after = chunk_hashes(strategy, edited, args.max_chunk_size, args.chunk_overlap, args.min_chunk_size)
+                elapsed += time.perf_counter() - t0
+                reused += sum(1 for h in after if h in before)
+                total += len(after)
+                total_chunks += len(before)
+            invalid_per_doc = (total - reused) / len(documents)
+            print(f"{name:<18} {edit_name:<30} {reused / total * 100:>7.1f}% {invalid_per_doc:>14.1f} "
+                  f"{total_chunks / len(documents):>9.1f} {elapsed:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: tempo de fragmentação em textos de vários MB
+
+Compara a estratégia "fixed" (implementação original de IndexManager.chunk_text) com a
+estratégia "token" (índice de fins de sentença + tamanho em tokens). O tempo por MB deve
+permanecer constante à medida que o texto cresce, evidenciando o comportamento O(n).
+
+Uso:
+    python benchmarks/bench_chunk_speed.py [--sizes 1 2 4 8] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import _get_tokenizer, chunk_by_tokens, chunk_fixed  # noqa: E402
+
+WORDS = (
+    "contrato cliente fornecedor valor prazo pagamento cláusula rescisão multa entrega "
+    "relatório mensal receita despesa imposto nota fiscal serviço produto garantia"
+).split()
+
+MB = 1024 * 1024
+
+
+def make_prose(rng: random.Random, size: int) -> str:
+    """Texto com sentenças e parágrafos normais"""
+    parts = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + "."
+        parts.append(sentence)
+        length += len(sentence) + 1
+        if rng.random() < 0.15:
+            parts.append("\n\n")
+    return " ".join(parts)[:size]
+
+
+def make_table(rng: random.Random, size: int) -> str:
+    """Texto sem pontuação de fim de sentença (ex.: planilhas), pior caso para a busca de limites"""
+    rows = []
+    length = 0
+    while length < size:
+        row = "Linha {}: {}".format(len(rows) + 1, " | ".join(str(rng.randint(0, 99999)) for _ in range(8)))
+        rows.append(row)
+        length += len(row) + 1
+    return "\n".join(rows)[:size]
+
+
+def run(strategy, text: str, repeat: int, **options) -> tuple:
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = strategy(text, "bench.md", 3000, 200, 100, **options)
+        best = min(best, time.perf_counter() - t0)
+    # Cobertura: fração do texto alcançada pelo último fragmento (detecta fragmentação interrompida)
+    coverage = max(metadata['end_char'] for _, metadata in chunks) / len(text) if chunks else 0.0
+    return best, len(chunks), coverage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de fragmentação: fixed vs token")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4, 8], help="Tamanhos em MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = "tiktoken" if _get_tokenizer() is not None else "estimativa (tiktoken ausente)"
+    print(f"Tokenizador: {tokenizer}")
+    print(f"{'texto':<8} {'MB':>5} | {'fixed s':>8} {'s/MB':>6} {'frag':>6} {'cobert.':>7} | "
+          f"{'token s':>8} {'s/MB':>6} {'frag':>6} {'cobert.':>7}")
+
+    rng = random.Random(7)
+    for kind, generator in (("prosa", make_prose), ("tabela", make_table)):
+        for size_mb in args.sizes:
+            text = generator(rng, int(size_mb * MB))
+            fixed_time, fixed_chunks, fixed_coverage = run(chunk_fixed, text, args.repeat)
+            token_time, token_chunks, token_coverage = run(chunk_by_tokens, text, args.repeat, max_chunk_tokens=750,
+                                                           chunk_overlap_tokens=50, min_chunk_tokens=25)
+            print(f"{kind:<8} {size_mb:>5.1f} | {fixed_time:>8.3f} {fixed_time / size_mb:>6.3f} {fixed_chunks:>6} "
+                  f"{fixed_coverage:>7.0%} | {token_time:>8.3f} {token_time / size_mb:>6.3f} {token_chunks:>6} "
+                  f"{token_coverage:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: vazão da impressão dos bytes brutos em um corpus misto PDF/XLSX
+
+Mede a vazão (MB/s) de fingerprint.file_fingerprint para cada algoritmo disponível (blake2b e,
+com o pacote xxhash, xxh3), com e sem amostragem, e a compara com a verificação antiga: extrair
+o texto (read_file) e calcular o MD5 do texto. Esta última só é medida com --corpus apontando
+para arquivos reais e com os leitores instalados.
+
+Sem --corpus, gera um corpus sintético: PDFs e XLSX são conteúdo comprimido (fluxos deflate, zip),
+então bytes aleatórios com a mistura de tamanhos típica (muitos arquivos pequenos, alguns grandes)
+reproduzem o custo de leitura e hash.
+
+Uso:
+    python benchmarks/bench_fingerprint.py [--files 60] [--repeat 3] [--sample-mb 64]
+    python benchmarks/bench_fingerprint.py --corpus /caminho/para/vault --parse
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fingerprint import available_algorithms, file_fingerprint  # noqa: E402
+
+MB = 1024 * 1024
+
+# (extensão, tamanho mínimo, tamanho máximo, peso) - distribuição aproximada de um vault de documentos
+SYNTHETIC_MIX = [
+    (".pdf", 50 * 1024, 1 * MB, 5),
+    (".pdf", 1 * MB, 20 * MB, 2),
+    (".pdf", 80 * MB, 150 * MB, 1),
+    (".xlsx", 20 * 1024, 2 * MB, 4),
+    (".xlsx", 2 * MB, 15 * MB, 1),
+]
+
+
+def make_corpus(directory: str, files: int, rng: random.Random):
+    kinds = [kind for kind in SYNTHETIC_MIX for _ in range(kind[3])]
+    for i in range(files):
+        extension, low, high, _ = rng.choice(kinds)
+        size = rng.randint(low, high)
+        with open(os.path.join(directory, f"doc{i:04d}{extension}"), "wb") as f:
+            remaining = size
+            while remaining:
+                block = min(remaining, 4 * MB)
+                f.write(os.urandom(block))
+                remaining -= block
+
+
+def list_corpus(directory: str):
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith((".pdf", ".xlsx")))
+    return sorted(paths)
+
+
+def run(fn, paths, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            fn(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão da impressão de arquivos vs extração + MD5")
+    parser.add_argument("--corpus", help="Diretório com PDFs/XLSX reais (padrão: corpus sintético)")
+    parser.add_argument("--files", type=int, default=60, help="Arquivos do corpus sintético")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sample-mb", type=float, default=64, help="Limite de amostragem para as medições amostradas")
+    parser.add_argument("--parse", action="store_true", help="Medir também read_file + MD5 do texto (corpus real)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.corpus
+        if not directory:
+            directory = temporary
+            make_corpus(directory, args.files, random.Random(7))
+        paths = list_corpus(directory)
+        total_mb = sum(os.path.getsize(path) for path in paths) / MB
+        pdfs = sum(path.lower().endswith(".pdf") for path in paths)
+        print(f"Corpus: {len(paths)} arquivos ({pdfs} PDF, {len(paths) - pdfs} XLSX), {total_mb:.1f} MB"
+              f"{' (sintético)' if not args.corpus else ''}")
+        print(f"{'método':<28} {'s':>8} {'MB/s':>9} {'ms/arquivo':>11}")
+
+        sample_threshold = int(args.sample_mb * MB)
+        methods = []
+        for algorithm in available_algorithms():
+            methods.append((f"{algorithm} completo", lambda path, a=algorithm: file_fingerprint(path, a)))
+            methods.append((f"{algorithm} amostrado >{args.sample_mb:g} MB",
+                            lambda path, a=algorithm: file_fingerprint(path, a, sample_threshold)))
+        if args.parse:
+            from file_readers import read_file
+
+            methods.append(("read_file + md5 do texto",
+                            lambda path: hashlib.md5(read_file(path).encode("utf-8")).hexdigest()))
+
+        # Aquecer o cache de páginas do sistema operacional: medir hash, não o disco
+        run(lambda path: file_fingerprint(path, "blake2b"), paths, 1)
+        for name, fn in methods:
+            elapsed = run(fn, paths, 1 if name.startswith("read_file") else args.repeat)
+            print(f"{name:<28} {elapsed:>8.3f} {total_mb / elapsed:>9.1f} {1000 * elapsed / len(paths):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
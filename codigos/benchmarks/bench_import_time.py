@@ -0,0 +1,85 @@
+"""
+Benchmark: tempo de importação dos módulos de leitura e indexação
+
+Executa `python -X importtime -c "import <módulo>"` em processos novos e informa o tempo
+acumulado do módulo, os imports mais caros e se alguma biblioteca de leitura pesada (pandas,
+pdfplumber, docx) foi carregada. Elas só devem ser importadas no primeiro arquivo do formato
+(file_readers._backend). Com --check, termina com código 1 se uma delas aparecer no import ou se o
+tempo passar de --max-ms, para servir de guarda contra regressões.
+
+Uso:
+    python benchmarks/bench_import_time.py [--modules file_readers index_manager] [--repeat 5] [--top 10]
+    python benchmarks/bench_import_time.py --modules file_readers --check --max-ms 200
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+CODIGOS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bibliotecas que não podem ser importadas junto com file_readers
+HEAVY_BACKENDS = ("pandas", "pdfplumber", "docx")
+
+
+def measure(module: str):
+    """(tempo acumulado do módulo em µs, {import: tempo acumulado em µs}) de um processo novo"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=CODIGOS_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}: {result.stderr.strip().splitlines()[-1]}")
+    imports = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = max(imports.get(name.strip(), 0), int(cumulative))
+    return imports.get(module, 0), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de importação e bibliotecas carregadas no import")
+    parser.add_argument("--modules", nargs="+", default=["file_readers", "index_manager"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Imports mais caros a listar")
+    parser.add_argument("--check", action="store_true", help="Falhar se houver regressão")
+    parser.add_argument("--max-ms", type=float, default=None, help="Tempo máximo por módulo com --check")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        try:
+            runs = [measure(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(e)
+            failed = True
+            continue
+        best_us, imports = min(runs, key=lambda run: run[0])
+        loaded = [name for name in HEAVY_BACKENDS if name in imports]
+
+        print(f"\n{module}: {best_us / 1000:.1f} ms (melhor de {args.repeat}), {len(imports)} módulos importados")
+        print(f"  bibliotecas pesadas carregadas: {', '.join(loaded) if loaded else 'nenhuma'}")
+        top_level = sorted(
+            ((us, name) for name, us in imports.items() if name != module and "." not in name),
+            reverse=True
+        )[:args.top]
+        for us, name in top_level:
+            print(f"  {us / 1000:>9.1f} ms  {name}")
+
+        if args.check:
+            if module == "file_readers" and loaded:
+                print(f"  REGRESSÃO: {', '.join(loaded)} importado(s) junto com file_readers")
+                failed = True
+            if args.max_ms is not None and best_us / 1000 > args.max_ms:
+                print(f"  REGRESSÃO: {best_us / 1000:.1f} ms > {args.max_ms:g} ms")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
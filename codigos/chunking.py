@@ -0,0 +1,495 @@
+"""
+Estratégias de Fragmentação (Chunking)
+
+Este módulo reúne as estratégias de divisão de texto usadas pelo IndexManager.
+Cada estratégia recebe o texto e retorna uma lista de tuplas (chunk_text, chunk_metadata),
+no mesmo formato esperado por `IndexManager.chunk_text`.
+
+Estratégias disponíveis:
+- "fixed": cortes em posições fixas (max_chunk_size) com recuo até o fim de sentença e sobreposição
+- "content_defined": cortes definidos pelo conteúdo (rolling hash), alinhados a fins de sentença
+- "token": empacotamento de sentenças medido em tokens do modelo de embedding, em tempo linear
+"""
+
+import bisect
+import hashlib
+import re
+from typing import Callable, Dict, List, Tuple
+
+# Fins de sentença: pontuação seguida de espaço em branco ou quebra de parágrafo
+SENTENCE_END_PATTERN = re.compile(r'[.!?](?=\s)|\n\s*\n')
+
+# Codificação usada pelos modelos text-embedding-3-* (tiktoken é uma dependência opcional)
+TOKENIZER_ENCODING = "cl100k_base"
+_tokenizer = None
+_tokenizer_loaded = False
+
+# Sem tiktoken, a contagem é estimada: prosa em português fica em ~4 caracteres por token, mas
+# números (CNPJ, CPF, tabelas) e pontuação chegam perto de 2. O valor típico dimensiona os
+# fragmentos; o conservador só limita os pedaços enviados à API (embedding_utils.split_for_embedding)
+FALLBACK_CHARS_PER_TOKEN = 4
+DENSE_CHARS_PER_TOKEN = 2
+
+
+class _NullLogger:
+    """Logger silencioso usado quando nenhum logger é fornecido"""
+    verbose = False
+
+    def log_verbose(self, level: str, message: str):
+        pass
+
+    def log_always(self, level: str, message: str):
+        pass
+
+
+def _build_gear_table() -> List[int]:
+    """Gerar tabela determinística de 256 valores de 64 bits para o gear hash"""
+    table = []
+    for i in range(256):
+        digest = hashlib.blake2b(bytes([i]), digest_size=8, person=b'gladys-cdc').digest()
+        table.append(int.from_bytes(digest, 'big'))
+    return table
+
+
+# Tabela fixa: os limites precisam ser estáveis entre execuções e processos
+GEAR_TABLE = _build_gear_table()
+_MASK_64 = (1 << 64) - 1
+
+
+def _get_tokenizer():
+    """Carregar o tokenizador local na primeira chamada (None se tiktoken não estiver instalado)"""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        try:
+            import tiktoken
+            _tokenizer = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            _tokenizer = None
+    return _tokenizer
+
+
+def tokenizer_available() -> bool:
+    """Se a contagem de tokens é exata (tiktoken instalado) em vez de estimada"""
+    return _get_tokenizer() is not None
+
+
+def count_tokens(text: str) -> int:
+    """Contar tokens do modelo de embedding; sem tiktoken, estimar para cima (FALLBACK_CHARS_PER_TOKEN)"""
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode_ordinary(text))
+    return -(-len(text) // FALLBACK_CHARS_PER_TOKEN)
+
+
+def find_sentence_ends(text: str) -> List[int]:
+    """Retornar as posições (exclusivas) de todos os fins de sentença em uma única passada de regex"""
+    return [match.end() for match in SENTENCE_END_PATTERN.finditer(text)]
+
+
+def chunk_fixed(text: str, file_path: str, max_chunk_size: int, chunk_overlap: int,
+                min_chunk_size: int, logger=None, truncate_oversized: bool = True,
+                **options) -> List[Tuple[str, Dict]]:
+    """
+    Dividir texto em fragmentos sobrepostos de tamanho fixo.
+    Retorna lista de tuplas (chunk_text, chunk_metadata).
+    Com truncate_oversized=False, fragmentos que a mesclagem deixou maiores que o máximo são
+    mantidos inteiros (o embedding os divide em pedaços em vez de perder o final).
+    """
+    logger = logger or _NullLogger()
+
+    if len(text) <= max_chunk_size:
+        # Não é necessário fragmentar
+        if logger.verbose:
+            logger.log_verbose("info", f"Comprimento do texto {len(text)} <= max_chunk_size {max_chunk_size}, não é necessário fragmentar")
+        return [(text, {
+            'chunk_id': 0,
+            'total_chunks': 1,
+            'start_char': 0,
+            'end_char': len(text),
+            'file_path': file_path
+        })]
+
+    chunks = []
+    start = 0
+    chunk_id = 0
+    max_iterations = len(text) + 1000  # Limite de segurança para evitar loops infinitos
+    iteration_count = 0
+
+    if logger.verbose:
+        logger.log_verbose("info", f"Fragmentando texto de {len(text)} caracteres com max_chunk_size {max_chunk_size}")
+
+    while start < len(text) and iteration_count < max_iterations:
+        iteration_count += 1
+        # Calcular posição final para este fragmento
+        end = min(start + max_chunk_size, len(text))
+
+        # Se não for o último fragmento, tentar quebrar em limite de sentença
+        if end < len(text):
+            # Buscar finais de sentença nos últimos 500 caracteres do fragmento
+            search_start = max(start, end - 500)
+            search_text = text[search_start:end]
+
+            # Encontrar o último final de sentença (., !, ?) seguido por espaço em branco
+            sentence_end = -1
+            for i in range(len(search_text) - 1, -1, -1):
+                if search_text[i] in '.!?' and i + 1 < len(search_text) and search_text[i + 1].isspace():
+                    sentence_end = search_start + i + 1
+                    break
+
+            # Se for encontrado um bom limite de sentença, usar
+            if sentence_end > start and sentence_end < end:
+                end = sentence_end
+
+        # Extrair o fragmento
+        chunk_text = text[start:end].strip()
+
+        # Adicionar apenas fragmentos não vazios
+        if chunk_text:
+            chunk_metadata = {
+                'chunk_id': chunk_id,
+                'total_chunks': -1,  # Será atualizado após todos os fragmentos serem criados
+                'start_char': start,
+                'end_char': end,
+                'file_path': file_path
+            }
+            chunks.append((chunk_text, chunk_metadata))
+            chunk_id += 1
+
+            if logger.verbose:
+                logger.log_verbose("debug", f"  Fragmento {chunk_id}: {len(chunk_text)} caracteres ({start}-{end})")
+
+        # Ir para o próximo fragmento, considerando a sobreposição
+        # Garantir avanço para evitar loops infinitos
+        new_start = end  # Começar do fim do fragmento atual
+
+        # Aplicar sobreposição, mas garantindo progresso
+        if new_start > start:  # Aplicar apenas se houve progresso
+            new_start = max(new_start - chunk_overlap, start + 1)
+
+        # Forçar avanço se a sobreposição causar retrocesso
+        if new_start <= start:
+            new_start = start + 1
+
+        # Segurança adicional: se estiver perto do fim e o restante for pequeno, encerrar
+        remaining_text = len(text) - new_start
+        if remaining_text <= chunk_overlap:
+            break
+
+        # Segurança adicional: se não houver progresso suficiente, forçar avanço
+        if new_start <= start:
+            new_start = start + max_chunk_size // 2  # Avançar metade do tamanho do fragmento
+            logger.log_always("warning", f"Forçando progresso de {start} para {new_start}")
+
+        start = new_start
+
+        # Saída de debug para progresso do loop
+        if logger.verbose and iteration_count % 100 == 0:
+            logger.log_verbose("debug", f"  Iteração do loop {iteration_count}: início={start}, fim={end}, progresso={start}/{len(text)} ({start/len(text)*100:.1f}%)")
+
+        # Verificação de segurança para evitar loops infinitos
+        if start >= len(text):
+            break
+
+        # Segurança adicional: interromper se não houver progresso suficiente
+        if iteration_count > 100 and start < len(text) * 0.1:
+            logger.log_always("warning", f"Progresso insuficiente após {iteration_count} iterações. Interrompendo loop para evitar loop infinito.")
+            logger.log_always("warning", f"Posição atual: {start}/{len(text)} ({start/len(text)*100:.1f}%)")
+            break
+
+    # Verificar se o limite de iterações foi atingido (potencial loop infinito)
+    if iteration_count >= max_iterations:
+        logger.log_always("warning", f"Limite de iteração atingido ({max_iterations}) durante fragmentação. Isso pode indicar um loop infinito.")
+        logger.log_always("warning", f"Comprimento do texto: {len(text)}, fragmentos criados: {len(chunks)}, posição inicial final: {start}")
+
+    # Mesclar fragmentos pequenos com os anteriores para evitar trechos minúsculos
+    if len(chunks) > 1:
+        merged_chunks = []
+        i = 0
+        while i < len(chunks):
+            chunk_text, metadata = chunks[i]
+
+            # Se o fragmento for muito pequeno e não o primeiro, mesclar com o anterior
+            if len(chunk_text) < min_chunk_size and i > 0:
+                prev_chunk_text, prev_metadata = merged_chunks[-1]
+                # Mesclar os fragmentos
+                merged_text = prev_chunk_text + " " + chunk_text
+                merged_metadata = prev_metadata.copy()
+                merged_metadata['end_char'] = metadata['end_char']
+                merged_chunks[-1] = (merged_text, merged_metadata)
+                if logger.verbose:
+                    logger.log_verbose("debug", f"  Fragmento pequeno {i} ({len(chunk_text)} chars) mesclado com fragmento anterior")
+            else:
+                merged_chunks.append((chunk_text, metadata))
+            i += 1
+
+        chunks = merged_chunks
+        if logger.verbose:
+            logger.log_verbose("info", f"  Após mesclagem: {len(chunks)} fragmentos")
+
+    # Atualizar total_chunks para todos os fragmentos
+    for chunk_text, metadata in chunks:
+        metadata['total_chunks'] = len(chunks)
+
+    # Verificação final de segurança: garantir que nenhum fragmento exceda o tamanho máximo
+    oversized_chunks = [i for i, (chunk_text, _) in enumerate(chunks) if len(chunk_text) > max_chunk_size]
+    if oversized_chunks and truncate_oversized:
+        logger.log_always("warning", f"Encontrados {len(oversized_chunks)} fragmentos grandes demais, truncando-os")
+        for i in oversized_chunks:
+            chunk_text, metadata = chunks[i]
+            if len(chunk_text) > max_chunk_size:
+                chunks[i] = (chunk_text[:max_chunk_size], metadata)
+                logger.log_verbose("warning", f"  Fragmento {i} truncado de {len(chunk_text)} para {max_chunk_size} caracteres")
+
+    return chunks
+
+
+def chunk_content_defined(text: str, file_path: str, max_chunk_size: int, chunk_overlap: int,
+                          min_chunk_size: int, logger=None, **options) -> List[Tuple[str, Dict]]:
+    """
+    Dividir texto com limites definidos pelo conteúdo (content-defined chunking).
+
+    Um gear hash rolante marca candidatos a limite que dependem apenas dos ~64 caracteres
+    anteriores; cada candidato é então alinhado ao próximo fim de sentença. Assim, inserir ou
+    remover um parágrafo desloca apenas os um ou dois fragmentos ao redor da edição, e os
+    demais mantêm o mesmo texto (e o mesmo hash).
+    """
+    logger = logger or _NullLogger()
+
+    if len(text) <= max_chunk_size:
+        if logger.verbose:
+            logger.log_verbose("info", f"Comprimento do texto {len(text)} <= max_chunk_size {max_chunk_size}, não é necessário fragmentar")
+        return [(text, {
+            'chunk_id': 0,
+            'total_chunks': 1,
+            'start_char': 0,
+            'end_char': len(text),
+            'file_path': file_path
+        })]
+
+    # Limites: nunca menores que min_chunk_size, e alvo médio em torno de metade do máximo
+    min_size = max(min_chunk_size, max_chunk_size // 4)
+    target_size = max(min_size + 1, max_chunk_size // 2)
+    mask_bits = max(1, (target_size - min_size).bit_length() - 1)
+    boundary_mask = ((1 << mask_bits) - 1) << (64 - mask_bits)  # Usar bits altos (melhor distribuídos)
+
+    sentence_ends = find_sentence_ends(text)
+    text_length = len(text)
+    gear = GEAR_TABLE
+
+    if logger.verbose:
+        logger.log_verbose("info", f"Fragmentando (content-defined) texto de {text_length} caracteres: min={min_size}, alvo={target_size}, max={max_chunk_size}")
+
+    boundaries = []
+    start = 0
+    while start < text_length:
+        limit = min(start + max_chunk_size, text_length)
+        if limit == text_length and limit - start <= max_chunk_size:
+            boundaries.append(text_length)
+            break
+
+        # O hash depende só dos últimos 64 caracteres, então podemos começar perto de start + min_size
+        cut = -1
+        h = 0
+        for pos in range(max(start, start + min_size - 64), limit):
+            h = ((h << 1) + gear[ord(text[pos]) & 0xFF]) & _MASK_64
+            if pos + 1 >= start + min_size and not (h & boundary_mask):
+                cut = pos + 1
+                break
+
+        if cut != -1:
+            # Alinhar ao próximo fim de sentença dentro do limite máximo
+            idx = bisect.bisect_left(sentence_ends, cut)
+            if idx < len(sentence_ends) and sentence_ends[idx] <= limit:
+                cut = sentence_ends[idx]
+            else:
+                # Sem fim de sentença à frente: recuar para o último fim de sentença após min_size
+                idx = bisect.bisect_right(sentence_ends, cut) - 1
+                if idx >= 0 and sentence_ends[idx] >= start + min_size:
+                    cut = sentence_ends[idx]
+        else:
+            # Nenhum limite pelo hash: cortar no último fim de sentença antes do máximo
+            idx = bisect.bisect_right(sentence_ends, limit) - 1
+            if idx >= 0 and sentence_ends[idx] >= start + min_size:
+                cut = sentence_ends[idx]
+            else:
+                cut = limit
+
+        boundaries.append(cut)
+        start = cut
+
+    # Mesclar um último trecho pequeno demais com o anterior, se o resultado couber no máximo
+    if len(boundaries) > 1 and boundaries[-1] - boundaries[-2] < min_chunk_size:
+        previous_start = boundaries[-3] if len(boundaries) > 2 else 0
+        if boundaries[-1] - previous_start <= max_chunk_size:
+            boundaries.pop(-2)
+
+    chunks = []
+    start = 0
+    for end in boundaries:
+        # Sobreposição: prefixar o final do fragmento anterior, alinhado ao início de uma palavra,
+        # sem passar de max_chunk_size (os limites não mudam, só a sobreposição é encurtada)
+        overlap_start = start
+        if start > 0 and chunk_overlap > 0:
+            overlap_start = max(0, start - chunk_overlap, end - max_chunk_size)
+            space = text.find(' ', overlap_start, start)
+            if space != -1:
+                overlap_start = space + 1
+
+        chunk_text = text[overlap_start:end].strip()
+        if chunk_text:
+            chunks.append((chunk_text, {
+                'chunk_id': len(chunks),
+                'total_chunks': -1,
+                'start_char': overlap_start,
+                'end_char': end,
+                'file_path': file_path
+            }))
+            if logger.verbose:
+                logger.log_verbose("debug", f"  Fragmento {len(chunks)}: {len(chunk_text)} caracteres ({overlap_start}-{end})")
+        start = end
+
+    for chunk_text, metadata in chunks:
+        metadata['total_chunks'] = len(chunks)
+
+    return chunks
+
+
+def _split_oversized_segment(text: str, start: int, end: int, tokens: int, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """Dividir um trecho sem fins de sentença que excede max_tokens em janelas alinhadas a espaços"""
+    pieces = []
+    chars_per_token = (end - start) / max(tokens, 1)
+    window = max(1, int(max_tokens * chars_per_token * 0.9))  # Margem de segurança de 10%
+    position = start
+    while position < end:
+        piece_end = min(position + window, end)
+        if piece_end < end:
+            space = text.rfind(' ', position + window // 2, piece_end)
+            if space != -1:
+                piece_end = space + 1
+        piece_tokens = count_tokens(text[position:piece_end])
+        if piece_tokens > max_tokens and piece_end - position > 1:
+            # Estimativa otimista demais (ex.: texto denso em números): reduzir a janela
+            window = max(1, window // 2)
+            continue
+        pieces.append((position, piece_end, piece_tokens))
+        position = piece_end
+    return pieces
+
+
+def chunk_by_tokens(text: str, file_path: str, max_chunk_size: int, chunk_overlap: int,
+                    min_chunk_size: int, logger=None, max_chunk_tokens: int = None,
+                    chunk_overlap_tokens: int = None, min_chunk_tokens: int = None,
+                    **options) -> List[Tuple[str, Dict]]:
+    """
+    Dividir texto empacotando sentenças até um limite em tokens do modelo de embedding.
+
+    Os fins de sentença são obtidos em uma única passada de regex e cada sentença é tokenizada
+    uma única vez, então o custo total é O(n) mesmo para textos de vários MB. Os limites em
+    caracteres são usados apenas como fallback (1 token ≈ 4 caracteres) quando os limites em
+    tokens não são informados. Nenhum fragmento excede max_chunk_tokens, então embed_text
+    nunca precisa truncá-lo.
+    """
+    logger = logger or _NullLogger()
+    max_tokens = max_chunk_tokens or max(1, max_chunk_size // 4)
+    overlap_tokens = chunk_overlap_tokens if chunk_overlap_tokens is not None else chunk_overlap // 4
+    min_tokens = min_chunk_tokens if min_chunk_tokens is not None else min_chunk_size // 4
+
+    # Segmentos = sentenças (com o espaço que as precede), cada um com sua contagem de tokens
+    segments = []
+    previous_end = 0
+    for sentence_end in find_sentence_ends(text) + [len(text)]:
+        if sentence_end <= previous_end:
+            continue
+        tokens = count_tokens(text[previous_end:sentence_end])
+        if tokens > max_tokens:
+            segments.extend(_split_oversized_segment(text, previous_end, sentence_end, tokens, max_tokens))
+        else:
+            segments.append((previous_end, sentence_end, tokens))
+        previous_end = sentence_end
+
+    total_tokens = sum(tokens for _, _, tokens in segments)
+    if total_tokens <= max_tokens:
+        if logger.verbose:
+            logger.log_verbose("info", f"Texto com {total_tokens} tokens <= max_chunk_tokens {max_tokens}, não é necessário fragmentar")
+        return [(text, {
+            'chunk_id': 0,
+            'total_chunks': 1,
+            'start_char': 0,
+            'end_char': len(text),
+            'token_count': total_tokens,
+            'file_path': file_path
+        })]
+
+    if logger.verbose:
+        logger.log_verbose("info", f"Fragmentando texto de {len(text)} caracteres ({total_tokens} tokens, {len(segments)} sentenças) com max_chunk_tokens {max_tokens}")
+
+    # Empacotamento guloso com ponteiros: cada segmento entra em no máximo um fragmento
+    # mais os poucos reaproveitados pela sobreposição
+    spans = []
+    first = 0
+    while first < len(segments):
+        last = first
+        tokens = 0
+        while last < len(segments) and tokens + segments[last][2] <= max_tokens:
+            tokens += segments[last][2]
+            last += 1
+        spans.append((first, last, tokens))
+        if last >= len(segments):
+            break
+
+        # Recuar sentenças inteiras para a sobreposição, garantindo progresso
+        next_first = last
+        overlap = 0
+        while next_first - 1 > first and overlap + segments[next_first - 1][2] <= overlap_tokens:
+            next_first -= 1
+            overlap += segments[next_first][2]
+        first = next_first
+
+    # Mesclar um último fragmento pequeno demais, se couber no anterior
+    if len(spans) > 1 and spans[-1][2] < min_tokens:
+        prev_first, _, _ = spans[-2]
+        last_first, last_last, _ = spans[-1]
+        merged_tokens = sum(segment[2] for segment in segments[prev_first:last_last])
+        if merged_tokens <= max_tokens:
+            spans[-2:] = [(prev_first, last_last, merged_tokens)]
+
+    chunks = []
+    for first, last, tokens in spans:
+        start_char = segments[first][0]
+        end_char = segments[last - 1][1]
+        chunk_text = text[start_char:end_char].strip()
+        if chunk_text:
+            chunks.append((chunk_text, {
+                'chunk_id': len(chunks),
+                'total_chunks': -1,
+                'start_char': start_char,
+                'end_char': end_char,
+                'token_count': tokens,
+                'file_path': file_path
+            }))
+            if logger.verbose:
+                logger.log_verbose("debug", f"  Fragmento {len(chunks)}: {tokens} tokens ({start_char}-{end_char})")
+
+    for chunk_text, metadata in chunks:
+        metadata['total_chunks'] = len(chunks)
+
+    return chunks
+
+
+# Registro de estratégias selecionáveis por INDEX_CONFIG["chunking_strategy"]
+CHUNKING_STRATEGIES: Dict[str, Callable[..., List[Tuple[str, Dict]]]] = {
+    "fixed": chunk_fixed,
+    "content_defined": chunk_content_defined,
+    "token": chunk_by_tokens,
+}
+
+
+def get_chunking_strategy(name: str) -> Callable[..., List[Tuple[str, Dict]]]:
+    """Obter a função de uma estratégia de fragmentação pelo nome (padrão: "fixed")"""
+    return CHUNKING_STRATEGIES.get(name or "fixed", chunk_fixed)
+
+
+def get_chunking_strategies() -> List[str]:
+    """Obter os nomes de todas as estratégias de fragmentação registradas"""
+    return list(CHUNKING_STRATEGIES.keys())
@@ -0,0 +1,89 @@
+"""
+Utilitários de Embedding
+
+Funções compartilhadas pelo IndexManager e pelo ChatMemoryManager para lidar com textos
+maiores que o limite do modelo de embedding: em vez de truncar, o texto é dividido em
+pedaços limitados em tokens, todos embedados em uma única requisição, e os vetores são
+combinados (pooling) ou mantidos separados.
+
+Modos (`embedding_oversize_mode`):
+- "truncate": comportamento original, corta o texto no limite de caracteres
+- "pool": média dos vetores dos pedaços, ponderada pelo número de tokens e normalizada
+- "multi": um vetor por pedaço (o chamador armazena vários vetores para o mesmo fragmento)
+"""
+
+import asyncio
+import weakref
+from typing import List, Tuple
+
+import numpy as np
+
+from chunking import DENSE_CHARS_PER_TOKEN, FALLBACK_CHARS_PER_TOKEN, chunk_by_tokens, count_tokens, tokenizer_available
+
+OVERSIZE_MODES = ("truncate", "pool", "multi")
+
+# Clientes assíncronos por event loop: o cliente HTTP do AsyncOpenAI não pode ser compartilhado entre loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def split_for_embedding(text: str, max_tokens: int) -> List[str]:
+    """Dividir texto em pedaços de no máximo max_tokens tokens, alinhados a fins de sentença"""
+    if not tokenizer_available():
+        # Contagem estimada: limitar como se o texto fosse denso (números, tabelas), para nunca
+        # ultrapassar o limite do modelo
+        max_tokens = max(1, max_tokens * DENSE_CHARS_PER_TOKEN // FALLBACK_CHARS_PER_TOKEN)
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    chunks = chunk_by_tokens(text, "", 0, 0, 0, max_chunk_tokens=max_tokens,
+                             chunk_overlap_tokens=0, min_chunk_tokens=0)
+    return [chunk for chunk, _ in chunks]
+
+
+def request_embeddings(client, model: str, inputs: List[str]) -> Tuple[List[np.ndarray], int]:
+    """Criar embeddings para vários textos em uma única requisição; retorna (vetores, tokens usados)"""
+    resp = client.embeddings.create(model=model, input=inputs)
+    return _parse_embedding_response(resp, inputs)
+
+
+async def arequest_embeddings(client, model: str, inputs: List[str]) -> Tuple[List[np.ndarray], int]:
+    """Versão assíncrona de request_embeddings, para uso com AsyncOpenAI"""
+    resp = await client.embeddings.create(model=model, input=inputs)
+    return _parse_embedding_response(resp, inputs)
+
+
+def get_async_client(api_key: str):
+    """Obter o cliente AsyncOpenAI do event loop atual (criado na primeira chamada)"""
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(api_key=api_key)
+        _async_clients[loop] = client
+    return client
+
+
+def _parse_embedding_response(resp, inputs: List[str]) -> Tuple[List[np.ndarray], int]:
+    """Extrair vetores (na ordem das entradas) e uso de tokens de uma resposta da API"""
+    data = sorted(resp.data, key=lambda item: item.index)
+    vectors = [np.array(item.embedding, dtype=np.float32) for item in data]
+
+    if hasattr(resp, 'usage') and resp.usage and hasattr(resp.usage, 'total_tokens'):
+        tokens_used = resp.usage.total_tokens
+    else:
+        # Estimativa: 1 token ≈ 4 caracteres
+        tokens_used = sum(len(text) for text in inputs) // 4
+    return vectors, tokens_used
+
+
+def pool_embeddings(vectors: List[np.ndarray], weights: List[int]) -> np.ndarray:
+    """Média ponderada dos vetores, renormalizada para norma 1 (como os vetores da OpenAI)"""
+    matrix = np.vstack(vectors)
+    w = np.asarray(weights, dtype=np.float32)
+    if w.sum() <= 0:
+        w = np.ones(len(vectors), dtype=np.float32)
+    pooled = (matrix * w[:, None]).sum(axis=0) / w.sum()
+    norm = np.linalg.norm(pooled)
+    if norm > 0:
+        pooled = pooled / norm
+    return pooled.astype(np.float32)
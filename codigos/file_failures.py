@@ -0,0 +1,128 @@
+"""
+Registro de Arquivos Vazios ou Ilegíveis
+
+read_file devolve "" para arquivos vazios e também quando a leitura falha (PDF corrompido, DOCX
+protegido por senha, PDF só com imagens). Sem registro, esses arquivos seriam lidos de novo a
+cada ciclo de atualização. A tabela index_file_failures guarda, por arquivo, o (mtime, tamanho)
+da tentativa, o motivo e o horário da próxima tentativa: o arquivo é ignorado até mudar no disco
+ou até o fim do intervalo de espera, que dobra a cada nova falha do mesmo conteúdo.
+
+As funções recebem qualquer sessão/conexão SQLAlchemy com execute(), como em usage_rollup.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from sqlalchemy import text
+
+# Motivos registrados
+REASON_EMPTY_FILE = "empty_file"  # Arquivo com 0 bytes
+REASON_NO_TEXT = "no_text"  # Arquivo com conteúdo, mas sem texto extraído (corrompido, protegido, só imagens)
+REASON_ERROR = "error"  # Exceção ao processar o arquivo
+
+
+def ensure_failures_table(session):
+    """Criar a tabela index_file_failures"""
+    session.execute(text("""
+        CREATE TABLE IF NOT EXISTS index_file_failures (
+            file_path TEXT PRIMARY KEY,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            first_failed_at DATETIME NOT NULL,
+            last_attempt_at DATETIME NOT NULL,
+            next_attempt_at DATETIME NOT NULL
+        )
+    """))
+
+
+def retry_delay(attempts: int, base_sec: float, max_sec: float) -> float:
+    """Espera antes da próxima tentativa: base_sec dobrando a cada falha, até max_sec"""
+    return min(base_sec * 2 ** max(attempts - 1, 0), max_sec)
+
+
+def record_failure(session, file_path: str, mtime: float, size: int, reason: str, error: str = None,
+                   base_sec: float = 3600, max_sec: float = 7 * 86400) -> Dict:
+    """Registrar uma falha; falhas repetidas com o mesmo (mtime, tamanho) aumentam a espera"""
+    now = datetime.utcnow()
+    previous = session.execute(
+        text("SELECT mtime, size, attempts, first_failed_at FROM index_file_failures WHERE file_path = :file_path"),
+        {"file_path": file_path}
+    ).fetchone()
+    same_content = previous is not None and (previous[0], previous[1]) == (mtime, size)
+    attempts = previous[2] + 1 if same_content else 1
+    row = {
+        "file_path": file_path,
+        "mtime": mtime,
+        "size": size,
+        "reason": reason,
+        "error": error,
+        "attempts": attempts,
+        "first_failed_at": previous[3] if same_content else now,
+        "last_attempt_at": now,
+        "next_attempt_at": now + timedelta(seconds=retry_delay(attempts, base_sec, max_sec))
+    }
+    session.execute(text("""
+        INSERT OR REPLACE INTO index_file_failures
+            (file_path, mtime, size, reason, error, attempts, first_failed_at, last_attempt_at, next_attempt_at)
+        VALUES (:file_path, :mtime, :size, :reason, :error, :attempts, :first_failed_at, :last_attempt_at, :next_attempt_at)
+    """), row)
+    return row
+
+
+def clear_failure(session, file_path: str) -> bool:
+    """Remover o registro de um arquivo lido com sucesso; retorna True se havia registro"""
+    result = session.execute(text("DELETE FROM index_file_failures WHERE file_path = :file_path"), {"file_path": file_path})
+    return bool(result.rowcount)
+
+
+def load_failures(session) -> Dict[str, tuple]:
+    """{caminho: (mtime, tamanho, próxima tentativa)} de todos os arquivos registrados"""
+    rows = session.execute(text("SELECT file_path, mtime, size, next_attempt_at FROM index_file_failures")).fetchall()
+    return {file_path: (mtime, size, _as_datetime(next_attempt)) for file_path, mtime, size, next_attempt in rows}
+
+
+def should_skip(entry: tuple, mtime: float, size: int, now: datetime = None) -> bool:
+    """Ignorar o arquivo: mesmo (mtime, tamanho) da falha e ainda dentro do intervalo de espera"""
+    if entry is None:
+        return False
+    failed_mtime, failed_size, next_attempt = entry
+    return (failed_mtime, failed_size) == (mtime, size) and (now or datetime.utcnow()) < next_attempt
+
+
+def prune_failures(session, existing_paths: Iterable[str], registered: Iterable[str]) -> int:
+    """Remover registros de arquivos que não existem mais (registered: caminhos registrados)"""
+    existing_paths = set(existing_paths)
+    stale = [file_path for file_path in registered if file_path not in existing_paths]
+    for file_path in stale:
+        session.execute(text("DELETE FROM index_file_failures WHERE file_path = :file_path"), {"file_path": file_path})
+    return len(stale)
+
+
+def list_failures(session) -> List[Dict]:
+    """Registros para a página de administração, falhas mais recentes primeiro"""
+    rows = session.execute(text("""
+        SELECT file_path, reason, error, attempts, size, first_failed_at, last_attempt_at, next_attempt_at
+        FROM index_file_failures
+        ORDER BY last_attempt_at DESC
+    """)).fetchall()
+    return [
+        {
+            "file_path": file_path,
+            "reason": reason,
+            "error": error,
+            "attempts": attempts,
+            "size": size,
+            "first_failed_at": _as_datetime(first_failed).isoformat(),
+            "last_attempt_at": _as_datetime(last_attempt).isoformat(),
+            "next_attempt_at": _as_datetime(next_attempt).isoformat()
+        }
+        for file_path, reason, error, attempts, size, first_failed, last_attempt, next_attempt in rows
+    ]
+
+
+def _as_datetime(value) -> datetime:
+    """DATETIME do SQLite volta como texto em consultas com text()"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
@@ -1,6 +1,4 @@
-from docx import Document
-import pandas as pd
-import pdfplumber
+import importlib
 import math
 import os
 from config import FILE_READER_CONFIG
@@ -36,6 +34,18 @@ def log_always(level: str, message: str):
     elif level == "success":
         log_file_readers_success(message)
 
+# Bibliotecas de leitura pesadas (pandas sozinho custa centenas de ms e dezenas de MB) são
+# importadas só no primeiro arquivo do formato, não ao importar este módulo
+_backends = {}
+
+def _backend(module_name: str):
+    """Importa a biblioteca de leitura no primeiro uso"""
+    module = _backends.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+        _backends[module_name] = module
+    return module
+
 def read_md(file_path: str) -> str:
     """Lê arquivos .md"""
     try:
@@ -73,7 +83,7 @@ def read_docx(file_path: str) -> str:
     try:
         # print(f"Tentando ler arquivo DOCX: {file_path}")
         log_verbose("info", f"Tentando ler arquivo DOCX: {file_path}")
-        doc = Document(file_path)
+        doc = _backend("docx").Document(file_path)
         text = "\n".join([para.text for para in doc.paragraphs])
         # print(f"Arquivo DOCX lido com sucesso: {len(text)} caracteres")
         log_verbose("success", f"Arquivo DOCX lido com sucesso: {len(text)} caracteres")
@@ -91,6 +101,8 @@ def read_xlsx(file_path: str) -> str:
         # print(f"Tentando ler arquivo XLSX: {file_path}")
         log_verbose("info", f"Tentando ler arquivo XLSX: {file_path}")
         
+        pd = _backend("pandas")
+
         # Ler todas as planilhas do arquivo Excel
         excel_file = pd.ExcelFile(file_path)
         all_text = []
@@ -166,7 +178,7 @@ def read_pdf(file_path: str) -> str:
         # print(f"Tentando ler arquivo PDF: {file_path}")
         log_verbose("info", f"Tentando ler arquivo PDF: {file_path}")
         text = []
-        with pdfplumber.open(file_path) as pdf:
+        with _backend("pdfplumber").open(file_path) as pdf:
             for i, page in enumerate(pdf.pages):
                 page_content = []
                 
@@ -208,23 +220,26 @@ def read_pdf(file_path: str) -> str:
         log_always("error", f"Erro lendo arquivo PDF {file_path}: {e}")
         return ""
 
+# Registro de formatos: extensão -> leitor
+READERS = {
+    ".md": read_md,
+    ".txt": read_txt,
+    ".docx": read_docx,
+    ".xlsx": read_xlsx,
+    ".pdf": read_pdf,
+}
+
+SUPPORTED_EXTENSIONS = tuple(READERS)
+
 def read_file(file_path: str) -> str:
     """Lê arquivos suportados (.md, .txt, .docx, .xlsx, .pdf)"""
     ext = os.path.splitext(file_path)[1].lower()
     # print(f"Lendo arquivo: {file_path} (extensão: {ext})")
     log_verbose("info", f"Lendo arquivo: {file_path} (extensão: {ext})")
     
-    if ext == ".md":
-        return read_md(file_path)
-    elif ext == ".txt":
-        return read_txt(file_path)
-    elif ext == ".docx":
-        return read_docx(file_path)
-    elif ext == ".xlsx":
-        return read_xlsx(file_path)
-    elif ext == ".pdf":
-        return read_pdf(file_path)
-    else:
+    reader = READERS.get(ext)
+    if reader is None:
         # print(f"Extensão não suportada: {ext}")
         log_always("warning", f"Extensão não suportada: {ext}")
         return ""
+    return reader(file_path)
@@ -0,0 +1,79 @@
+"""
+Impressão Digital dos Bytes Brutos de Arquivos
+
+Verificação primária de alteração da atualização do índice: um hash dos bytes do arquivo, lido em
+blocos de tamanho fixo (memória constante), calculado sem extrair o texto. Só quando a impressão
+difere da guardada em file_metadata.raw_fingerprint o arquivo é extraído e o hash do texto é
+comparado (verificação secundária).
+
+Algoritmos: BLAKE2b de 128 bits (hashlib, sempre disponível) ou XXH3 de 128 bits, bem mais rápido,
+quando o pacote opcional xxhash está instalado. A impressão leva o nome do algoritmo como prefixo
+("blake2b:…", "xxh3:…"), para que trocar de algoritmo nunca produza uma falsa igualdade.
+
+Amostragem (opcional, para arquivos enormes): acima de sample_threshold bytes, apenas o tamanho,
+sample_blocks blocos igualmente espaçados e o último bloco entram no hash ("…-sampled:…"). É muito
+mais rápida, mas uma alteração fora dos blocos amostrados com o mesmo tamanho passa despercebida;
+por isso vem desativada, e impressões amostradas nunca são usadas como chave do cache de texto.
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+try:
+    import xxhash
+except ImportError:  # Dependência opcional
+    xxhash = None
+
+BLOCK_SIZE = 1 << 20
+SAMPLE_BLOCKS = 16
+
+
+def available_algorithms():
+    """Algoritmos suportados neste ambiente"""
+    return ("xxh3", "blake2b") if xxhash is not None else ("blake2b",)
+
+
+def default_algorithm() -> str:
+    """XXH3 se o xxhash estiver instalado, senão BLAKE2b"""
+    return available_algorithms()[0]
+
+
+def _new_hasher(algorithm: str):
+    if algorithm == "xxh3":
+        if xxhash is None:
+            raise ValueError("Algoritmo xxh3 requer o pacote xxhash")
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    raise ValueError(f"Algoritmo de impressão desconhecido: {algorithm}")
+
+
+def file_fingerprint(file_path: str, algorithm: Optional[str] = None, sample_threshold: int = 0,
+                     block_size: int = BLOCK_SIZE, sample_blocks: int = SAMPLE_BLOCKS) -> str:
+    """Impressão "<algoritmo>:<hex>" dos bytes do arquivo (amostrada acima de sample_threshold, se > 0)"""
+    algorithm = algorithm or default_algorithm()
+    hasher = _new_hasher(algorithm)
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        # Amostrar só quando o arquivo é maior que os blocos lidos na amostra
+        if sample_threshold and size > max(sample_threshold, block_size * (sample_blocks + 1)):
+            hasher.update(size.to_bytes(8, "little"))
+            step = max((size - block_size) // sample_blocks, block_size)
+            for offset in list(range(0, size - block_size, step))[:sample_blocks] + [size - block_size]:
+                f.seek(offset)
+                hasher.update(f.read(block_size))
+            return f"{algorithm}-sampled:{hasher.hexdigest()}"
+        buffer = bytearray(block_size)
+        view = memoryview(buffer)
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            hasher.update(view[:read])
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def is_exact(fingerprint: Optional[str]) -> bool:
+    """Se a impressão cobre todos os bytes do arquivo (não amostrada)"""
+    return bool(fingerprint) and "-sampled:" not in fingerprint
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import faiss
 import pickle
 import numpy as np
@@ -12,6 +13,9 @@ from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import json
 from config import CHAT_MEMORY_CONFIG, OPENAI_API_KEY, EMBEDDING_MODEL
+from chunking import count_tokens
+from embedding_utils import arequest_embeddings, get_async_client, pool_embeddings, request_embeddings, split_for_embedding
+from usage_rollup import ensure_rollup_tables, record_usage
 from logger import log_index_chat_manager_error, log_index_chat_manager_warning, log_index_chat_manager_info, log_index_chat_manager_success, log_index_chat_manager_debug
 
 class ChatMemoryManager:
@@ -29,6 +33,11 @@ class ChatMemoryManager:
         self.max_memory_results = CHAT_MEMORY_CONFIG["max_memory_results"]
         self.default_hard_delete = CHAT_MEMORY_CONFIG["default_hard_delete"]
         
+        # Textos maiores que o limite do modelo: "truncate" (original) ou "pool".
+        # Cada memória tem um único vetor, então "multi" é tratado como "pool".
+        self.embedding_oversize_mode = CHAT_MEMORY_CONFIG.get("embedding_oversize_mode", "truncate")
+        self.max_embedding_tokens = CHAT_MEMORY_CONFIG.get("max_embedding_tokens", 8000)
+        
         # Inicializar cliente OpenAI
         self.client = OpenAI(api_key=OPENAI_API_KEY)
         
@@ -39,6 +48,11 @@ class ChatMemoryManager:
         # Conexão com banco de dados
         self.db_engine = None
         self.db_session = None
+        self.usage_rollups_available = False
+        # A sessão é compartilhada entre chamadas síncronas, a thread de atualização e o trabalho de banco
+        # das APIs assíncronas (em threads): todo método que usa db_session a obtém sob esta trava (reentrante,
+        # porque alguns desses métodos chamam outros)
+        self._db_lock = threading.RLock()
         self._init_database()
         
         # Carregar ou criar índice de memória de longo prazo
@@ -89,6 +103,15 @@ class ChatMemoryManager:
             Session = sessionmaker(bind=self.db_engine)
             self.db_session = Session()
             
+            # Agregados diário/mensal de uso de embeddings, compartilhados com o IndexManager
+            try:
+                ensure_rollup_tables(self.db_session)
+                self.db_session.commit()
+                self.usage_rollups_available = True
+            except Exception as e:
+                self.db_session.rollback()
+                self.log_always("warning", f"Agregados de uso de embeddings indisponíveis: {e}")
+            
             if self.verbose:
                 # print("Database connection established for chat memory")
                 self.log_verbose("success", "Conexão com banco de dados estabelecida para memória de chat")
@@ -100,144 +123,148 @@ class ChatMemoryManager:
     
     def _get_conversation_messages(self, conversation_id: str) -> List[Dict]:
         """Obter mensagens de uma conversa do banco de dados, excluindo chats excluídos suavemente"""
-        if not self.db_session:
-            return []
+        with self._db_lock:
+            if not self.db_session:
+                return []
         
-        try:
-            # Consultar mensagens da conversa, excluindo chats excluídos suavemente
-            result = self.db_session.execute(
-                text("""
-                    SELECT m.id, m.role, m.content, m.timestamp 
-                    FROM message m
-                    JOIN chat c ON m.chat_id = c.id
-                    LEFT JOIN chat_memory cm ON c.id = cm.chat_id
-                    WHERE m.chat_id = :conv_id 
-                    AND (cm.is_deleted IS NULL OR cm.is_deleted = 0)
-                    ORDER BY m.timestamp
-                """),
-                {"conv_id": conversation_id}
-            )
+            try:
+                # Consultar mensagens da conversa, excluindo chats excluídos suavemente
+                result = self.db_session.execute(
+                    text("""
+                        SELECT m.id, m.role, m.content, m.timestamp 
+                        FROM message m
+                        JOIN chat c ON m.chat_id = c.id
+                        LEFT JOIN chat_memory cm ON c.id = cm.chat_id
+                        WHERE m.chat_id = :conv_id 
+                        AND (cm.is_deleted IS NULL OR cm.is_deleted = 0)
+                        ORDER BY m.timestamp
+                    """),
+                    {"conv_id": conversation_id}
+                )
             
-            messages = []
-            for row in result:
-                messages.append({
-                    'id': row[0],
-                    'role': row[1],
-                    'content': row[2],
-                    'timestamp': row[3]
-                })
+                messages = []
+                for row in result:
+                    messages.append({
+                        'id': row[0],
+                        'role': row[1],
+                        'content': row[2],
+                        'timestamp': row[3]
+                    })
             
-            return messages
+                return messages
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error getting conversation messages: {e}")
-                self.log_always("error", f"Erro ao obter mensagens da conversa: {e}")
-            return []
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error getting conversation messages: {e}")
+                    self.log_always("error", f"Erro ao obter mensagens da conversa: {e}")
+                return []
     
     def _get_all_conversations(self) -> List[Dict]:
         """Obter todas as conversas não excluídas do banco de dados"""
-        if not self.db_session:
-            return []
+        with self._db_lock:
+            if not self.db_session:
+                return []
         
-        try:
-            # Consultar todas as conversas que não foram excluídas suavemente
-            result = self.db_session.execute(
-                text("""
-                    SELECT c.id, c.title, c.created_at, c.user_id
-                    FROM chat c
-                    LEFT JOIN chat_memory cm ON c.id = cm.chat_id
-                    WHERE (cm.is_deleted IS NULL OR cm.is_deleted = 0)
-                    ORDER BY c.created_at DESC
-                """)
-            )
+            try:
+                # Consultar todas as conversas que não foram excluídas suavemente
+                result = self.db_session.execute(
+                    text("""
+                        SELECT c.id, c.title, c.created_at, c.user_id
+                        FROM chat c
+                        LEFT JOIN chat_memory cm ON c.id = cm.chat_id
+                        WHERE (cm.is_deleted IS NULL OR cm.is_deleted = 0)
+                        ORDER BY c.created_at DESC
+                    """)
+                )
             
-            conversations = []
-            for row in result:
-                conversations.append({
-                    'id': row[0],
-                    'title': row[1],
-                    'created_at': row[2],
-                    'user_id': row[3]
-                })
+                conversations = []
+                for row in result:
+                    conversations.append({
+                        'id': row[0],
+                        'title': row[1],
+                        'created_at': row[2],
+                        'user_id': row[3]
+                    })
             
-            return conversations
+                return conversations
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error getting conversations: {e}")
-                self.log_always("error", f"Erro ao obter conversas: {e}")
-            return []
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error getting conversations: {e}")
+                    self.log_always("error", f"Erro ao obter conversas: {e}")
+                return []
     
     def _is_conversation_deleted(self, conversation_id: str) -> bool:
         """Verificar se uma conversa foi excluída suavemente"""
-        if not self.db_session:
-            return False
+        with self._db_lock:
+            if not self.db_session:
+                return False
         
-        try:
-            result = self.db_session.execute(
-                text("""
-                    SELECT cm.is_deleted 
-                    FROM chat_memory cm 
-                    WHERE cm.chat_id = :conv_id
-                """),
-                {"conv_id": conversation_id}
-            )
+            try:
+                result = self.db_session.execute(
+                    text("""
+                        SELECT cm.is_deleted 
+                        FROM chat_memory cm 
+                        WHERE cm.chat_id = :conv_id
+                    """),
+                    {"conv_id": conversation_id}
+                )
             
-            row = result.fetchone()
-            return row and row[0] == 1
+                row = result.fetchone()
+                return row and row[0] == 1
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error checking conversation deletion status: {e}")
-                self.log_always("error", f"Erro ao verificar status de exclusão da conversa: {e}")
-            return False
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error checking conversation deletion status: {e}")
+                    self.log_always("error", f"Erro ao verificar status de exclusão da conversa: {e}")
+                return False
     
     def _soft_delete_conversation(self, conversation_id: str, user_id: int):
         """Marcar uma conversa como excluída (exclusão suave)"""
-        if not self.db_session:
-            return False
+        with self._db_lock:
+            if not self.db_session:
+                return False
         
-        try:
-            # Obter ou criar registro de memória
-            result = self.db_session.execute(
-                text("""
-                    INSERT OR REPLACE INTO chat_memory (chat_id, user_id, is_deleted, deleted_at, last_updated)
-                    VALUES (:chat_id, :user_id, 1, :deleted_at, :last_updated)
-                """),
-                {
-                    "chat_id": conversation_id,
-                    "user_id": user_id,
-                    "deleted_at": datetime.now(timezone.utc).isoformat(),
-                    "last_updated": datetime.now(timezone.utc).isoformat()
-                }
-            )
+            try:
+                # Obter ou criar registro de memória
+                result = self.db_session.execute(
+                    text("""
+                        INSERT OR REPLACE INTO chat_memory (chat_id, user_id, is_deleted, deleted_at, last_updated)
+                        VALUES (:chat_id, :user_id, 1, :deleted_at, :last_updated)
+                    """),
+                    {
+                        "chat_id": conversation_id,
+                        "user_id": user_id,
+                        "deleted_at": datetime.now(timezone.utc).isoformat(),
+                        "last_updated": datetime.now(timezone.utc).isoformat()
+                    }
+                )
             
-            # Também excluir suavemente todos os chunks de memória para esta conversa
-            result = self.db_session.execute(
-                text("""
-                    UPDATE memory_chunks 
-                    SET is_deleted = 1, deleted_at = :deleted_at
-                    WHERE conversation_id = :conv_id
-                """),
-                {
-                    "deleted_at": datetime.utcnow().isoformat(),
-                    "conv_id": conversation_id
-                }
-            )
+                # Também excluir suavemente todos os chunks de memória para esta conversa
+                result = self.db_session.execute(
+                    text("""
+                        UPDATE memory_chunks 
+                        SET is_deleted = 1, deleted_at = :deleted_at
+                        WHERE conversation_id = :conv_id
+                    """),
+                    {
+                        "deleted_at": datetime.utcnow().isoformat(),
+                        "conv_id": conversation_id
+                    }
+                )
             
-            self.db_session.commit()
+                self.db_session.commit()
             
-            if self.verbose:
-                # print(f"Soft-deleted conversation: {conversation_id}")
-                self.log_verbose("success", f"Conversa excluída suavemente: {conversation_id}")
-            return True
+                if self.verbose:
+                    # print(f"Soft-deleted conversation: {conversation_id}")
+                    self.log_verbose("success", f"Conversa excluída suavemente: {conversation_id}")
+                return True
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error soft-deleting conversation: {e}")
-                self.log_always("error", f"Erro ao excluir suavemente a conversa: {e}")
-            return False
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error soft-deleting conversation: {e}")
+                    self.log_always("error", f"Erro ao excluir suavemente a conversa: {e}")
+                return False
     
     def _create_memory_chunk(self, user_message: str, assistant_message: str, conversation_id: str, timestamp: str) -> str:
         """Criar um chunk de memória a partir de mensagens do usuário e assistente"""
@@ -255,6 +282,9 @@ class ChatMemoryManager:
     
     def _embed_memory(self, memory_text: str, conversation_id: str, operation: str = "create") -> Optional[np.ndarray]:
         """Criar embedding para texto de memória usando API OpenAI"""
+        if self.embedding_oversize_mode != "truncate":
+            return self._embed_memory_pooled(memory_text, conversation_id, operation)
+        
         try:
             # Verificação de segurança: garantir que o texto não exceda o limite de tokens
             max_chars = 6000  # Estimativa conservadora para 8k tokens
@@ -290,40 +320,99 @@ class ChatMemoryManager:
             self.log_always("error", f"Erro ao criar embedding de memória: {e}")
             return None
     
-    def _track_memory_embedding_usage(self, conversation_id: str, text_length: int, tokens_used: int, operation: str):
-        """Rastrear uso de embedding de memória no banco de dados"""
-        if not self.enable_usage_tracking:
-            return
+    def _embed_memory_pooled(self, memory_text: str, conversation_id: str, operation: str = "create") -> Optional[np.ndarray]:
+        """Criar embedding sem truncar: dividir em pedaços limitados em tokens, uma requisição, vetor combinado"""
+        try:
+            pieces = split_for_embedding(memory_text, self.max_embedding_tokens)
+            if self.verbose:
+                self.log_verbose("info", f"Criando embedding para memória de {len(memory_text)} caracteres ({len(pieces)} pedaço(s))")
             
+            vectors, tokens_used = request_embeddings(self.client, EMBEDDING_MODEL, pieces)
+            
+            # Salvar uso no banco de dados se habilitado
+            if self.enable_usage_tracking:
+                self._track_memory_embedding_usage(conversation_id, len(memory_text), tokens_used, operation)
+            
+            if len(vectors) == 1:
+                return vectors[0]
+            return pool_embeddings(vectors, [count_tokens(piece) for piece in pieces])
+            
+        except Exception as e:
+            self.log_always("error", f"Erro ao criar embedding de memória: {e}")
+            return None
+    
+    async def _aembed_memory(self, memory_text: str, conversation_id: str, operation: str = "create") -> Optional[np.ndarray]:
+        """Versão assíncrona de _embed_memory usando AsyncOpenAI"""
         try:
-            # Tentar usar conexão existente com banco de dados
-            if self.db_session:
-                # Inserir registro de uso na tabela de uso existente
-                result = self.db_session.execute(
-                    text("""
-                        INSERT INTO index_embedding_usage 
-                        (file_path, model, text_length, tokens_used, operation, created_at) 
-                        VALUES (:file_path, :model, :text_length, :tokens_used, :operation, :created_at)
-                    """),
-                    {
-                        "file_path": f"chat_memory_{conversation_id}",
-                        "model": EMBEDDING_MODEL,
-                        "text_length": text_length,
-                        "tokens_used": tokens_used,
-                        "operation": operation,
-                        "created_at": datetime.utcnow().isoformat()
-                    }
+            if self.embedding_oversize_mode == "truncate":
+                max_chars = 6000  # Estimativa conservadora para 8k tokens
+                if len(memory_text) > max_chars:
+                    self.log_always("warning", f"Comprimento do texto de memória {len(memory_text)} excede o limite seguro {max_chars}, truncando")
+                    memory_text = memory_text[:max_chars]
+                pieces = [memory_text]
+            else:
+                pieces = split_for_embedding(memory_text, self.max_embedding_tokens)
+            
+            vectors, tokens_used = await arequest_embeddings(get_async_client(OPENAI_API_KEY), EMBEDDING_MODEL, pieces)
+            
+            # Salvar uso no banco de dados se habilitado
+            if self.enable_usage_tracking:
+                await asyncio.to_thread(
+                    self._with_db_lock, self._track_memory_embedding_usage,
+                    conversation_id, len(memory_text), tokens_used, operation
                 )
-                self.db_session.commit()
+            
+            if len(vectors) == 1:
+                return vectors[0]
+            return pool_embeddings(vectors, [count_tokens(piece) for piece in pieces])
+            
+        except Exception as e:
+            self.log_always("error", f"Erro ao criar embedding de memória (assíncrono): {e}")
+            return None
+    
+    def _with_db_lock(self, fn, *args):
+        """Executar fn(*args) com acesso exclusivo à sessão do banco (usado pelas APIs assíncronas)"""
+        with self._db_lock:
+            return fn(*args)
+    
+    def _track_memory_embedding_usage(self, conversation_id: str, text_length: int, tokens_used: int, operation: str):
+        """Rastrear uso de embedding de memória no banco de dados"""
+        with self._db_lock:
+            if not self.enable_usage_tracking:
+                return
+            
+            try:
+                # Tentar usar conexão existente com banco de dados
+                if self.db_session:
+                    created_at = datetime.utcnow()
+                    # Inserir registro de uso na tabela de uso existente
+                    result = self.db_session.execute(
+                        text("""
+                            INSERT INTO index_embedding_usage 
+                            (file_path, model, text_length, tokens_used, operation, created_at) 
+                            VALUES (:file_path, :model, :text_length, :tokens_used, :operation, :created_at)
+                        """),
+                        {
+                            "file_path": f"chat_memory_{conversation_id}",
+                            "model": EMBEDDING_MODEL,
+                            "text_length": text_length,
+                            "tokens_used": tokens_used,
+                            "operation": operation,
+                            "created_at": created_at.isoformat()
+                        }
+                    )
+                    if self.usage_rollups_available:
+                        record_usage(self.db_session, operation, EMBEDDING_MODEL, tokens_used, text_length, created_at)
+                    self.db_session.commit()
                 
-                if self.verbose:
-                    # print(f"Tracked memory embedding usage: {tokens_used} tokens for conversation {conversation_id} ({operation})")
-                    self.log_verbose("info", f"Uso de embedding de memória rastreado: {tokens_used} tokens para conversa {conversation_id} ({operation})")
+                    if self.verbose:
+                        # print(f"Tracked memory embedding usage: {tokens_used} tokens for conversation {conversation_id} ({operation})")
+                        self.log_verbose("info", f"Uso de embedding de memória rastreado: {tokens_used} tokens para conversa {conversation_id} ({operation})")
                     
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error tracking memory embedding usage: {e}")
-                self.log_always("error", f"Erro ao rastrear uso de embedding de memória: {e}")
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error tracking memory embedding usage: {e}")
+                    self.log_always("error", f"Erro ao rastrear uso de embedding de memória: {e}")
             # Não falhar a operação principal se o rastreamento falhar
     
     def load_or_create_memory_index(self):
@@ -347,104 +436,106 @@ class ChatMemoryManager:
     
     def create_new_memory_index(self):
         """Criar novo índice de memória a partir de conversas existentes"""
-        if self.verbose:
-            # print("Creating new chat memory index...")
-            self.log_verbose("info", "Criando novo índice de memória de chat...")
+        with self._db_lock:
+            if self.verbose:
+                # print("Creating new chat memory index...")
+                self.log_verbose("info", "Criando novo índice de memória de chat...")
         
-        self.chunk_ids = []
+            self.chunk_ids = []
         
-        if not self.db_session:
-            if self.verbose:
-                # print("No database connection available")
-                self.log_always("warning", "Nenhuma conexão com banco de dados disponível")
-            return
+            if not self.db_session:
+                if self.verbose:
+                    # print("No database connection available")
+                    self.log_always("warning", "Nenhuma conexão com banco de dados disponível")
+                return
         
-        embeddings = []
-        conversations = self._get_all_conversations()
+            embeddings = []
+            conversations = self._get_all_conversations()
         
-        for conv in conversations:
-            conversation_id = str(conv['id'])
-            messages = self._get_conversation_messages(conversation_id)
+            for conv in conversations:
+                conversation_id = str(conv['id'])
+                messages = self._get_conversation_messages(conversation_id)
             
-            # Processar mensagens em pares (usuário + assistente)
-            for i in range(0, len(messages) - 1, 2):
-                if i + 1 < len(messages):
-                    user_msg = messages[i]['content']
-                    assistant_msg = messages[i + 1]['content']
-                    timestamp = messages[i]['timestamp']
+                # Processar mensagens em pares (usuário + assistente)
+                for i in range(0, len(messages) - 1, 2):
+                    if i + 1 < len(messages):
+                        user_msg = messages[i]['content']
+                        assistant_msg = messages[i + 1]['content']
+                        timestamp = messages[i]['timestamp']
                     
-                    # Criar chunk de memória
-                    memory_text = self._create_memory_chunk(user_msg, assistant_msg, conversation_id, timestamp)
+                        # Criar chunk de memória
+                        memory_text = self._create_memory_chunk(user_msg, assistant_msg, conversation_id, timestamp)
                     
-                    # Criar embedding
-                    embedding = self._embed_memory(memory_text, conversation_id, "create")
-                    if embedding is not None:
-                        # Armazenar no banco de dados em vez de RAM
-                        chunk_id = self._store_memory_chunk_in_db(
-                            conversation_id, memory_text, user_msg, assistant_msg, timestamp, embedding
-                        )
+                        # Criar embedding
+                        embedding = self._embed_memory(memory_text, conversation_id, "create")
+                        if embedding is not None:
+                            # Armazenar no banco de dados em vez de RAM
+                            chunk_id = self._store_memory_chunk_in_db(
+                                conversation_id, memory_text, user_msg, assistant_msg, timestamp, embedding
+                            )
                         
-                        if chunk_id is not None:
-                            self.chunk_ids.append(chunk_id)
-                            embeddings.append(embedding)
+                            if chunk_id is not None:
+                                self.chunk_ids.append(chunk_id)
+                                embeddings.append(embedding)
         
-        if embeddings:
-            dim = len(embeddings[0])
-            self.long_term_index = faiss.IndexFlatL2(dim)
-            self.long_term_index.add(np.array(embeddings))
-            self.save_memory_index()
-            if self.verbose:
-                # print(f"New chat memory index created with {len(self.chunk_ids)} memory chunks")
-                self.log_verbose("success", f"Novo índice de memória de chat criado com {len(self.chunk_ids)} fragmentos de memória")
-        else:
-            if self.verbose:
-                # print("No valid conversations found to create memory index")
-                self.log_verbose("warning", "Nenhuma conversa válida encontrada para criar índice de memória")
+            if embeddings:
+                dim = len(embeddings[0])
+                self.long_term_index = faiss.IndexFlatL2(dim)
+                self.long_term_index.add(np.array(embeddings))
+                self.save_memory_index()
+                if self.verbose:
+                    # print(f"New chat memory index created with {len(self.chunk_ids)} memory chunks")
+                    self.log_verbose("success", f"Novo índice de memória de chat criado com {len(self.chunk_ids)} fragmentos de memória")
+            else:
+                if self.verbose:
+                    # print("No valid conversations found to create memory index")
+                    self.log_verbose("warning", "Nenhuma conversa válida encontrada para criar índice de memória")
     
     def _store_memory_chunk_in_db(self, conversation_id: str, memory_text: str, user_message: str, 
                                  assistant_message: str, timestamp: str, embedding: np.ndarray) -> Optional[int]:
         """Armazenar chunk de memória no banco de dados e retornar chunk_id"""
-        if not self.db_session:
-            return None
+        with self._db_lock:
+            if not self.db_session:
+                return None
         
-        try:
-            # Obter próximo chunk_id para esta conversa
-            result = self.db_session.execute(
-                text("""
-                    SELECT COALESCE(MAX(chunk_id), -1) + 1 
-                    FROM memory_chunks 
-                    WHERE conversation_id = :conv_id
-                """),
-                {"conv_id": conversation_id}
-            )
-            chunk_id = result.fetchone()[0]
+            try:
+                # Obter próximo chunk_id para esta conversa
+                result = self.db_session.execute(
+                    text("""
+                        SELECT COALESCE(MAX(chunk_id), -1) + 1 
+                        FROM memory_chunks 
+                        WHERE conversation_id = :conv_id
+                    """),
+                    {"conv_id": conversation_id}
+                )
+                chunk_id = result.fetchone()[0]
             
-            # Inserir chunk de memória
-            result = self.db_session.execute(
-                text("""
-                    INSERT INTO memory_chunks 
-                    (conversation_id, memory_text, user_message, assistant_message, timestamp, chunk_id, embedding_vector)
-                    VALUES (:conv_id, :memory_text, :user_msg, :assistant_msg, :timestamp, :chunk_id, :embedding)
-                """),
-                {
-                    "conv_id": conversation_id,
-                    "memory_text": memory_text,
-                    "user_msg": user_message,
-                    "assistant_msg": assistant_message,
-                    "timestamp": timestamp,
-                    "chunk_id": chunk_id,
-                    "embedding": embedding.tobytes()
-                }
-            )
+                # Inserir chunk de memória
+                result = self.db_session.execute(
+                    text("""
+                        INSERT INTO memory_chunks 
+                        (conversation_id, memory_text, user_message, assistant_message, timestamp, chunk_id, embedding_vector)
+                        VALUES (:conv_id, :memory_text, :user_msg, :assistant_msg, :timestamp, :chunk_id, :embedding)
+                    """),
+                    {
+                        "conv_id": conversation_id,
+                        "memory_text": memory_text,
+                        "user_msg": user_message,
+                        "assistant_msg": assistant_message,
+                        "timestamp": timestamp,
+                        "chunk_id": chunk_id,
+                        "embedding": embedding.tobytes()
+                    }
+                )
             
-            self.db_session.commit()
-            return chunk_id
+                self.db_session.commit()
+                return chunk_id
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error storing memory chunk in database: {e}")
-                self.log_always("error", f"Erro ao armazenar fragmento de memória no banco de dados: {e}")
-            return None
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error storing memory chunk in database: {e}")
+                    self.log_always("error", f"Erro ao armazenar fragmento de memória no banco de dados: {e}")
+                return None
     
     def save_memory_index(self):
         """Salvar índice de memória em arquivo"""
@@ -518,6 +609,26 @@ class ChatMemoryManager:
         if query_embedding is None:
             return []
         
+        return self._search_memory_with_embedding(query, query_embedding, conversation_id, k)
+    
+    async def asearch_long_term_memory(self, query: str, conversation_id: str = None, k: int = None) -> List[Dict]:
+        """Versão assíncrona de search_long_term_memory"""
+        if k is None:
+            k = self.max_memory_results
+        
+        if self.long_term_index is None or not self.chunk_ids:
+            return []
+        
+        query_embedding = await self._aembed_memory(query, "search_query", "search")
+        if query_embedding is None:
+            return []
+        
+        return await asyncio.to_thread(
+            self._with_db_lock, self._search_memory_with_embedding, query, query_embedding, conversation_id, k
+        )
+    
+    def _search_memory_with_embedding(self, query: str, query_embedding: np.ndarray, conversation_id: str, k: int) -> List[Dict]:
+        """Buscar no índice de memória a partir do embedding da consulta já calculado"""
         try:
             # Buscar no índice
             D, I = self.long_term_index.search(np.array([query_embedding]), k)
@@ -590,46 +701,68 @@ class ChatMemoryManager:
     
     def _get_memory_chunk_from_db(self, chunk_id: int) -> Optional[Dict]:
         """Obter dados de chunk de memória do banco de dados por chunk_id"""
-        if not self.db_session:
-            return None
+        with self._db_lock:
+            if not self.db_session:
+                return None
         
-        try:
-            result = self.db_session.execute(
-                text("""
-                    SELECT conversation_id, memory_text, user_message, assistant_message, timestamp
-                    FROM memory_chunks 
-                    WHERE chunk_id = :chunk_id
-                """),
-                {"chunk_id": chunk_id}
-            )
+            try:
+                result = self.db_session.execute(
+                    text("""
+                        SELECT conversation_id, memory_text, user_message, assistant_message, timestamp
+                        FROM memory_chunks 
+                        WHERE chunk_id = :chunk_id
+                    """),
+                    {"chunk_id": chunk_id}
+                )
             
-            row = result.fetchone()
-            if row:
-                return {
-                    'conversation_id': row[0],
-                    'memory_text': row[1],
-                    'user_message': row[2],
-                    'assistant_message': row[3],
-                    'timestamp': row[4]
-                }
-            return None
+                row = result.fetchone()
+                if row:
+                    return {
+                        'conversation_id': row[0],
+                        'memory_text': row[1],
+                        'user_message': row[2],
+                        'assistant_message': row[3],
+                        'timestamp': row[4]
+                    }
+                return None
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error getting memory chunk from database: {e}")
-                self.log_always("error", f"Erro ao obter fragmento de memória do banco de dados: {e}")
-            return None
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error getting memory chunk from database: {e}")
+                    self.log_always("error", f"Erro ao obter fragmento de memória do banco de dados: {e}")
+                return None
     
     def get_context_with_memory(self, conversation_id: str, current_query: str, max_memories: int = 3) -> str:
         """Obter contexto combinando memória de curto prazo e memórias de longo prazo relevantes"""
-        context_parts = []
-        
         if self.verbose:
             # print(f"Getting context for conversation: {conversation_id}")
             self.log_verbose("debug", f"Obtendo contexto para conversa: {conversation_id}")
         
-        # Adicionar memória de curto prazo do banco de dados
+        # Memória de curto prazo do banco de dados e memórias de longo prazo relevantes APENAS desta conversa
         short_term = self.get_short_term_memory(conversation_id, max_exchanges=3)
+        relevant_memories = self.search_long_term_memory(current_query, conversation_id, max_memories)
+        return self._format_memory_context(short_term, relevant_memories)
+    
+    async def aget_context_with_memory(self, conversation_id: str, current_query: str, max_memories: int = 3) -> str:
+        """Versão assíncrona de get_context_with_memory
+        
+        A memória de curto prazo (banco) e a busca de longo prazo (embedding assíncrono + FAISS)
+        rodam em paralelo, sem bloquear o event loop.
+        """
+        if self.verbose:
+            self.log_verbose("debug", f"Obtendo contexto para conversa: {conversation_id}")
+        
+        short_term, relevant_memories = await asyncio.gather(
+            asyncio.to_thread(self._with_db_lock, self.get_short_term_memory, conversation_id, 3),
+            self.asearch_long_term_memory(current_query, conversation_id, max_memories)
+        )
+        return self._format_memory_context(short_term, relevant_memories)
+    
+    def _format_memory_context(self, short_term: List[Dict], relevant_memories: List[Dict]) -> str:
+        """Montar o texto de contexto a partir das memórias de curto e longo prazo"""
+        context_parts = []
+        
+        # Adicionar memória de curto prazo
         if short_term:
             if self.verbose:
                 # print(f"  Found {len(short_term)} short-term memory exchanges")
@@ -644,8 +777,7 @@ class ChatMemoryManager:
                 # print("  No short-term memory found")
                 self.log_verbose("debug", "  Nenhuma memória de curto prazo encontrada")
         
-        # Adicionar memórias de longo prazo relevantes APENAS desta conversa
-        relevant_memories = self.search_long_term_memory(current_query, conversation_id, max_memories)
+        # Adicionar memórias de longo prazo relevantes
         if relevant_memories:
             if self.verbose:
                 # print(f"  Found {len(relevant_memories)} relevant long-term memories from this conversation")
@@ -668,281 +800,285 @@ class ChatMemoryManager:
     
     def delete_conversation_memory(self, conversation_id: str, user_id: int, hard_delete: bool = None):
         """Excluir memória de conversa (usa padrão de configuração se não especificado)"""
-        if hard_delete is None:
-            hard_delete = self.default_hard_delete
-        if hard_delete:
-            # Exclusão definitiva: remover do banco de dados e reconstruir índice
-            if self.db_session:
-                try:
-                    # Excluir chunks de memória do banco de dados
-                    self.db_session.execute(
-                        text("DELETE FROM memory_chunks WHERE conversation_id = :conv_id"),
-                        {"conv_id": conversation_id}
-                    )
+        with self._db_lock:
+            if hard_delete is None:
+                hard_delete = self.default_hard_delete
+            if hard_delete:
+                # Exclusão definitiva: remover do banco de dados e reconstruir índice
+                if self.db_session:
+                    try:
+                        # Excluir chunks de memória do banco de dados
+                        self.db_session.execute(
+                            text("DELETE FROM memory_chunks WHERE conversation_id = :conv_id"),
+                            {"conv_id": conversation_id}
+                        )
                     
-                    # Excluir registro de memória de chat
-                    self.db_session.execute(
-                        text("DELETE FROM chat_memory WHERE chat_id = :conv_id"),
-                        {"conv_id": conversation_id}
-                    )
+                        # Excluir registro de memória de chat
+                        self.db_session.execute(
+                            text("DELETE FROM chat_memory WHERE chat_id = :conv_id"),
+                            {"conv_id": conversation_id}
+                        )
                     
-                    self.db_session.commit()
+                        self.db_session.commit()
                     
-                    # Reconstruir índice FAISS
-                    self._rebuild_memory_index()
+                        # Reconstruir índice FAISS
+                        self._rebuild_memory_index()
                     
-                    if self.verbose:
-                        # print(f"Hard deleted conversation {conversation_id}")
-                        self.log_verbose("success", f"Conversa {conversation_id} excluída permanentemente")
+                        if self.verbose:
+                            # print(f"Hard deleted conversation {conversation_id}")
+                            self.log_verbose("success", f"Conversa {conversation_id} excluída permanentemente")
                         
-                except Exception as e:
-                    if self.verbose:
-                        # print(f"Error hard deleting conversation: {e}")
-                        self.log_always("error", f"Erro ao excluir permanentemente a conversa: {e}")
-        else:
-            # Exclusão suave: marcar como excluído no banco de dados
-            self._soft_delete_conversation(conversation_id, user_id)
-            if self.verbose:
-                # print(f"Soft deleted conversation {conversation_id}")
-                self.log_verbose("success", f"Conversa {conversation_id} excluída suavemente")
+                    except Exception as e:
+                        if self.verbose:
+                            # print(f"Error hard deleting conversation: {e}")
+                            self.log_always("error", f"Erro ao excluir permanentemente a conversa: {e}")
+            else:
+                # Exclusão suave: marcar como excluído no banco de dados
+                self._soft_delete_conversation(conversation_id, user_id)
+                if self.verbose:
+                    # print(f"Soft deleted conversation {conversation_id}")
+                    self.log_verbose("success", f"Conversa {conversation_id} excluída suavemente")
     
     def _rebuild_memory_index(self):
         """Reconstruir o índice FAISS após exclusões definitivas"""
-        if not self.db_session:
-            return
+        with self._db_lock:
+            if not self.db_session:
+                return
         
-        try:
-            # Obter todos os chunks de memória não excluídos do banco de dados
-            result = self.db_session.execute(
-                text("SELECT chunk_id, embedding_vector FROM memory_chunks WHERE is_deleted = 0 ORDER BY chunk_id")
-            )
+            try:
+                # Obter todos os chunks de memória não excluídos do banco de dados
+                result = self.db_session.execute(
+                    text("SELECT chunk_id, embedding_vector FROM memory_chunks WHERE is_deleted = 0 ORDER BY chunk_id")
+                )
             
-            embeddings = []
-            chunk_ids = []
+                embeddings = []
+                chunk_ids = []
             
-            for row in result:
-                chunk_id = row[0]
-                embedding_bytes = row[1]
+                for row in result:
+                    chunk_id = row[0]
+                    embedding_bytes = row[1]
                 
-                if embedding_bytes:
-                    embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
-                    embeddings.append(embedding)
-                    chunk_ids.append(chunk_id)
+                    if embedding_bytes:
+                        embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
+                        embeddings.append(embedding)
+                        chunk_ids.append(chunk_id)
             
-            if embeddings:
-                dim = len(embeddings[0])
-                self.long_term_index = faiss.IndexFlatL2(dim)
-                self.long_term_index.add(np.array(embeddings))
-                self.chunk_ids = chunk_ids
-                self.save_memory_index()
-                # print(f"Memory index rebuilt with {len(embeddings)} embeddings")
-                self.log_verbose("success", f"Índice de memória reconstruído com {len(embeddings)} embeddings")
-            else:
-                self.long_term_index = None
-                self.chunk_ids = []
-                self.save_memory_index()
-                # print("Memory index cleared - no embeddings found")
-                self.log_verbose("warning", "Índice de memória limpo - nenhum embedding encontrado")
+                if embeddings:
+                    dim = len(embeddings[0])
+                    self.long_term_index = faiss.IndexFlatL2(dim)
+                    self.long_term_index.add(np.array(embeddings))
+                    self.chunk_ids = chunk_ids
+                    self.save_memory_index()
+                    # print(f"Memory index rebuilt with {len(embeddings)} embeddings")
+                    self.log_verbose("success", f"Índice de memória reconstruído com {len(embeddings)} embeddings")
+                else:
+                    self.long_term_index = None
+                    self.chunk_ids = []
+                    self.save_memory_index()
+                    # print("Memory index cleared - no embeddings found")
+                    self.log_verbose("warning", "Índice de memória limpo - nenhum embedding encontrado")
                 
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error rebuilding memory index: {e}")
-                self.log_always("error", f"Erro ao reconstruir índice de memória: {e}")
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error rebuilding memory index: {e}")
+                    self.log_always("error", f"Erro ao reconstruir índice de memória: {e}")
     
     def cleanup_orphaned_memory_chunks(self, hard_delete: bool = None) -> int:
         """Limpar chunks de memória órfãos que referenciam chats inexistentes"""
-        if hard_delete is None:
-            hard_delete = self.default_hard_delete
+        with self._db_lock:
+            if hard_delete is None:
+                hard_delete = self.default_hard_delete
         
-        if not self.db_session:
-            return 0
+            if not self.db_session:
+                return 0
         
-        try:
-            # Encontrar chunks de memória órfãos
-            result = self.db_session.execute(
-                text("""
-                    SELECT mc.id, mc.conversation_id 
-                    FROM memory_chunks mc
-                    LEFT JOIN chat c ON mc.conversation_id = c.id
-                    WHERE c.id IS NULL
-                """)
-            )
-            orphaned_chunks = result.fetchall()
+            try:
+                # Encontrar chunks de memória órfãos
+                result = self.db_session.execute(
+                    text("""
+                        SELECT mc.id, mc.conversation_id 
+                        FROM memory_chunks mc
+                        LEFT JOIN chat c ON mc.conversation_id = c.id
+                        WHERE c.id IS NULL
+                    """)
+                )
+                orphaned_chunks = result.fetchall()
             
-            if not orphaned_chunks:
-                if self.verbose:
-                    # print("No orphaned memory chunks found")
-                    self.log_verbose("info", "Nenhum fragmento de memória órfão encontrado")
-                return 0
+                if not orphaned_chunks:
+                    if self.verbose:
+                        # print("No orphaned memory chunks found")
+                        self.log_verbose("info", "Nenhum fragmento de memória órfão encontrado")
+                    return 0
             
-            cleaned_count = 0
+                cleaned_count = 0
             
-            for chunk in orphaned_chunks:
-                chunk_id = chunk[0]
-                conversation_id = chunk[1]
+                for chunk in orphaned_chunks:
+                    chunk_id = chunk[0]
+                    conversation_id = chunk[1]
                 
-                if hard_delete:
-                    # Exclusão definitiva: remover do banco de dados
-                    self.db_session.execute(
-                        text("DELETE FROM memory_chunks WHERE id = :chunk_id"),
-                        {"chunk_id": chunk_id}
-                    )
-                    if self.verbose:
-                        # print(f"Hard deleted orphaned memory chunk {chunk_id} for conversation {conversation_id}")
-                        self.log_verbose("success", f"Fragmento de memória órfão {chunk_id} excluído permanentemente para conversa {conversation_id}")
-                else:
-                    # Exclusão suave: marcar como excluído
-                    self.db_session.execute(
-                        text("""
-                            UPDATE memory_chunks 
-                            SET is_deleted = 1, deleted_at = :deleted_at
-                            WHERE id = :chunk_id
-                        """),
-                        {
-                                                    "deleted_at": datetime.now(timezone.utc).isoformat(),
-                        "chunk_id": chunk_id
-                        }
-                    )
-                    if self.verbose:
-                        # print(f"Soft deleted orphaned memory chunk {chunk_id} for conversation {conversation_id}")
-                        self.log_verbose("success", f"Fragmento de memória órfão {chunk_id} excluído suavemente para conversa {conversation_id}")
+                    if hard_delete:
+                        # Exclusão definitiva: remover do banco de dados
+                        self.db_session.execute(
+                            text("DELETE FROM memory_chunks WHERE id = :chunk_id"),
+                            {"chunk_id": chunk_id}
+                        )
+                        if self.verbose:
+                            # print(f"Hard deleted orphaned memory chunk {chunk_id} for conversation {conversation_id}")
+                            self.log_verbose("success", f"Fragmento de memória órfão {chunk_id} excluído permanentemente para conversa {conversation_id}")
+                    else:
+                        # Exclusão suave: marcar como excluído
+                        self.db_session.execute(
+                            text("""
+                                UPDATE memory_chunks 
+                                SET is_deleted = 1, deleted_at = :deleted_at
+                                WHERE id = :chunk_id
+                            """),
+                            {
+                                                        "deleted_at": datetime.now(timezone.utc).isoformat(),
+                            "chunk_id": chunk_id
+                            }
+                        )
+                        if self.verbose:
+                            # print(f"Soft deleted orphaned memory chunk {chunk_id} for conversation {conversation_id}")
+                            self.log_verbose("success", f"Fragmento de memória órfão {chunk_id} excluído suavemente para conversa {conversation_id}")
                 
-                cleaned_count += 1
+                    cleaned_count += 1
             
-            # Também limpar registros órfãos de chat_memory
-            result = self.db_session.execute(
-                text("""
-                    SELECT cm.id, cm.chat_id 
-                    FROM chat_memory cm
-                    LEFT JOIN chat c ON cm.chat_id = c.id
-                    WHERE c.id IS NULL
-                """)
-            )
-            orphaned_memories = result.fetchall()
+                # Também limpar registros órfãos de chat_memory
+                result = self.db_session.execute(
+                    text("""
+                        SELECT cm.id, cm.chat_id 
+                        FROM chat_memory cm
+                        LEFT JOIN chat c ON cm.chat_id = c.id
+                        WHERE c.id IS NULL
+                    """)
+                )
+                orphaned_memories = result.fetchall()
             
-            for memory in orphaned_memories:
-                memory_id = memory[0]
-                chat_id = memory[1]
+                for memory in orphaned_memories:
+                    memory_id = memory[0]
+                    chat_id = memory[1]
                 
-                if hard_delete:
-                    # Exclusão definitiva: remover do banco de dados
-                    self.db_session.execute(
-                        text("DELETE FROM chat_memory WHERE id = :memory_id"),
-                        {"memory_id": memory_id}
-                    )
-                    if self.verbose:
-                        # print(f"Hard deleted orphaned chat memory {memory_id} for chat {chat_id}")
-                        self.log_verbose("success", f"Memória de chat órfã {memory_id} excluída permanentemente para chat {chat_id}")
-                    cleaned_count += 1
-                else:
-                    # Exclusão suave: marcar como excluído
-                    self.db_session.execute(
-                        text("""
-                            UPDATE chat_memory 
-                            SET is_deleted = 1, deleted_at = :deleted_at, last_updated = :last_updated
-                            WHERE id = :memory_id
-                        """),
-                        {
-                                                    "deleted_at": datetime.now(timezone.utc).isoformat(),
-                        "last_updated": datetime.now(timezone.utc).isoformat(),
-                        "memory_id": memory_id
-                        }
-                    )
-                    if self.verbose:
-                        # print(f"Soft deleted orphaned chat memory {memory_id} for chat {chat_id}")
-                        self.log_verbose("success", f"Memória de chat órfã {memory_id} excluída suavemente para chat {chat_id}")
-                    cleaned_count += 1
+                    if hard_delete:
+                        # Exclusão definitiva: remover do banco de dados
+                        self.db_session.execute(
+                            text("DELETE FROM chat_memory WHERE id = :memory_id"),
+                            {"memory_id": memory_id}
+                        )
+                        if self.verbose:
+                            # print(f"Hard deleted orphaned chat memory {memory_id} for chat {chat_id}")
+                            self.log_verbose("success", f"Memória de chat órfã {memory_id} excluída permanentemente para chat {chat_id}")
+                        cleaned_count += 1
+                    else:
+                        # Exclusão suave: marcar como excluído
+                        self.db_session.execute(
+                            text("""
+                                UPDATE chat_memory 
+                                SET is_deleted = 1, deleted_at = :deleted_at, last_updated = :last_updated
+                                WHERE id = :memory_id
+                            """),
+                            {
+                                                        "deleted_at": datetime.now(timezone.utc).isoformat(),
+                            "last_updated": datetime.now(timezone.utc).isoformat(),
+                            "memory_id": memory_id
+                            }
+                        )
+                        if self.verbose:
+                            # print(f"Soft deleted orphaned chat memory {memory_id} for chat {chat_id}")
+                            self.log_verbose("success", f"Memória de chat órfã {memory_id} excluída suavemente para chat {chat_id}")
+                        cleaned_count += 1
             
-            # Confirmar alterações
-            self.db_session.commit()
+                # Confirmar alterações
+                self.db_session.commit()
             
-            # Reconstruir índice se excluímos chunks definitivamente
-            if hard_delete and cleaned_count > 0:
-                self._rebuild_memory_index()
+                # Reconstruir índice se excluímos chunks definitivamente
+                if hard_delete and cleaned_count > 0:
+                    self._rebuild_memory_index()
             
-            if self.verbose:
-                # print(f"Cleaned up {cleaned_count} orphaned memory records")
-                self.log_verbose("success", f"Limpeza de {cleaned_count} registros de memória órfãos concluída")
+                if self.verbose:
+                    # print(f"Cleaned up {cleaned_count} orphaned memory records")
+                    self.log_verbose("success", f"Limpeza de {cleaned_count} registros de memória órfãos concluída")
             
-            return cleaned_count
+                return cleaned_count
             
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error cleaning up orphaned memory chunks: {e}")
-                self.log_always("error", f"Erro ao limpar fragmentos de memória órfãos: {e}")
-            self.db_session.rollback()
-            return 0
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error cleaning up orphaned memory chunks: {e}")
+                    self.log_always("error", f"Erro ao limpar fragmentos de memória órfãos: {e}")
+                self.db_session.rollback()
+                return 0
     
     def get_memory_stats(self) -> Dict:
         """Obter estatísticas do sistema de memória"""
         # Contar chunks de memória no banco de dados
-        chunk_count = 0
-        deleted_count = 0
-        orphaned_count = 0
+        with self._db_lock:
+            chunk_count = 0
+            deleted_count = 0
+            orphaned_count = 0
         
-        if self.db_session:
-            try:
-                # Contar chunks totais
-                result = self.db_session.execute(
-                    text("SELECT COUNT(*) FROM memory_chunks")
-                )
-                chunk_count = result.fetchone()[0] or 0
+            if self.db_session:
+                try:
+                    # Contar chunks totais
+                    result = self.db_session.execute(
+                        text("SELECT COUNT(*) FROM memory_chunks")
+                    )
+                    chunk_count = result.fetchone()[0] or 0
                 
-                # Contar conversas e chunks de memória excluídos suavemente
-                result = self.db_session.execute(
-                    text("SELECT COUNT(*) FROM chat_memory WHERE is_deleted = 1")
-                )
-                deleted_conversations = result.fetchone()[0] or 0
+                    # Contar conversas e chunks de memória excluídos suavemente
+                    result = self.db_session.execute(
+                        text("SELECT COUNT(*) FROM chat_memory WHERE is_deleted = 1")
+                    )
+                    deleted_conversations = result.fetchone()[0] or 0
                 
-                result = self.db_session.execute(
-                    text("SELECT COUNT(*) FROM memory_chunks WHERE is_deleted = 1")
-                )
-                deleted_chunks = result.fetchone()[0] or 0
+                    result = self.db_session.execute(
+                        text("SELECT COUNT(*) FROM memory_chunks WHERE is_deleted = 1")
+                    )
+                    deleted_chunks = result.fetchone()[0] or 0
                 
-                deleted_count = deleted_conversations + deleted_chunks
+                    deleted_count = deleted_conversations + deleted_chunks
                 
-                # Contar chunks de memória órfãos (referenciando chats inexistentes)
-                result = self.db_session.execute(
-                    text("""
-                        SELECT COUNT(*) FROM memory_chunks mc
-                        LEFT JOIN chat c ON mc.conversation_id = c.id
-                        WHERE c.id IS NULL AND mc.is_deleted = 0
-                    """)
-                )
-                orphaned_count = result.fetchone()[0] or 0
+                    # Contar chunks de memória órfãos (referenciando chats inexistentes)
+                    result = self.db_session.execute(
+                        text("""
+                            SELECT COUNT(*) FROM memory_chunks mc
+                            LEFT JOIN chat c ON mc.conversation_id = c.id
+                            WHERE c.id IS NULL AND mc.is_deleted = 0
+                        """)
+                    )
+                    orphaned_count = result.fetchone()[0] or 0
                 
-                # Armazenar detalhamento para exibição de administrador
-                self._deleted_breakdown = {
-                    'conversations': deleted_conversations,
-                    'chunks': deleted_chunks,
-                    'total': deleted_count
-                }
+                    # Armazenar detalhamento para exibição de administrador
+                    self._deleted_breakdown = {
+                        'conversations': deleted_conversations,
+                        'chunks': deleted_chunks,
+                        'total': deleted_count
+                    }
                 
-            except Exception as e:
-                if self.verbose:
-                    # print(f"Error counting memory statistics: {e}")
-                    self.log_always("error", f"Erro ao contar estatísticas de memória: {e}")
+                except Exception as e:
+                    if self.verbose:
+                        # print(f"Error counting memory statistics: {e}")
+                        self.log_always("error", f"Erro ao contar estatísticas de memória: {e}")
         
-        return {
-            "short_term_memory": {
-                "source": "database_messages_table",
-                "max_exchanges": self.max_short_term_memory,
-                "max_tokens": self.max_short_term_tokens
-            },
-            "long_term_memory": {
-                "total_chunks": chunk_count,
-                "index_size": self.long_term_index.ntotal if self.long_term_index else 0,
-                "deleted_conversations": deleted_count,
-                "orphaned_chunks": orphaned_count,
-                "deleted_breakdown": getattr(self, '_deleted_breakdown', {'conversations': 0, 'chunks': 0, 'total': 0})
-            },
-            "configuration": {
-                "relevance_threshold": self.relevance_threshold,
-                "max_memory_results": self.max_memory_results,
-                "chunk_size": self.long_term_memory_chunk_size,
-                "default_hard_delete": self.default_hard_delete
+            return {
+                "short_term_memory": {
+                    "source": "database_messages_table",
+                    "max_exchanges": self.max_short_term_memory,
+                    "max_tokens": self.max_short_term_tokens
+                },
+                "long_term_memory": {
+                    "total_chunks": chunk_count,
+                    "index_size": self.long_term_index.ntotal if self.long_term_index else 0,
+                    "deleted_conversations": deleted_count,
+                    "orphaned_chunks": orphaned_count,
+                    "deleted_breakdown": getattr(self, '_deleted_breakdown', {'conversations': 0, 'chunks': 0, 'total': 0})
+                },
+                "configuration": {
+                    "relevance_threshold": self.relevance_threshold,
+                    "max_memory_results": self.max_memory_results,
+                    "chunk_size": self.long_term_memory_chunk_size,
+                    "default_hard_delete": self.default_hard_delete
+                }
             }
-        }
     
     def start_auto_update(self, interval_sec: int = None):
         """Iniciar atualizações automáticas de memória em thread de segundo plano"""
@@ -967,47 +1103,48 @@ class ChatMemoryManager:
     
     def _sync_with_database(self):
         """Sincronizar memória com alterações do banco de dados"""
-        try:
-            # Verificar novas conversas e mensagens
-            conversations = self._get_all_conversations()
+        with self._db_lock:
+            try:
+                # Verificar novas conversas e mensagens
+                conversations = self._get_all_conversations()
             
-            for conv in conversations:
-                conversation_id = str(conv['id'])
+                for conv in conversations:
+                    conversation_id = str(conv['id'])
                 
-                # Verificar se temos esta conversa na memória (excluindo chunks excluídos suavemente)
-                result = self.db_session.execute(
-                    text("SELECT COUNT(*) FROM memory_chunks WHERE conversation_id = :conv_id AND is_deleted = 0"),
-                    {"conv_id": conversation_id}
-                )
-                existing_count = result.fetchone()[0] or 0
+                    # Verificar se temos esta conversa na memória (excluindo chunks excluídos suavemente)
+                    result = self.db_session.execute(
+                        text("SELECT COUNT(*) FROM memory_chunks WHERE conversation_id = :conv_id AND is_deleted = 0"),
+                        {"conv_id": conversation_id}
+                    )
+                    existing_count = result.fetchone()[0] or 0
                 
-                if existing_count == 0:
-                    # Nova conversa, adicionar à memória
-                    messages = self._get_conversation_messages(conversation_id)
-                    for i in range(0, len(messages) - 1, 2):
-                        if i + 1 < len(messages):
-                            self.add_conversation_memory(
-                                conversation_id,
-                                messages[i]['content'],
-                                messages[i + 1]['content'],
-                                messages[i]['timestamp']
-                            )
+                    if existing_count == 0:
+                        # Nova conversa, adicionar à memória
+                        messages = self._get_conversation_messages(conversation_id)
+                        for i in range(0, len(messages) - 1, 2):
+                            if i + 1 < len(messages):
+                                self.add_conversation_memory(
+                                    conversation_id,
+                                    messages[i]['content'],
+                                    messages[i + 1]['content'],
+                                    messages[i]['timestamp']
+                                )
             
-            # Limpeza automática de chunks órfãos se exclusão definitiva estiver habilitada
-            if self.default_hard_delete:
-                orphaned_count = self.cleanup_orphaned_memory_chunks(hard_delete=True)
-                if orphaned_count > 0 and self.verbose:
-                    # print(f"Auto-cleaned up {orphaned_count} orphaned memory chunks during sync")
-                    self.log_verbose("info", f"Limpeza automática de {orphaned_count} fragmentos de memória órfãos durante sincronização")
+                # Limpeza automática de chunks órfãos se exclusão definitiva estiver habilitada
+                if self.default_hard_delete:
+                    orphaned_count = self.cleanup_orphaned_memory_chunks(hard_delete=True)
+                    if orphaned_count > 0 and self.verbose:
+                        # print(f"Auto-cleaned up {orphaned_count} orphaned memory chunks during sync")
+                        self.log_verbose("info", f"Limpeza automática de {orphaned_count} fragmentos de memória órfãos durante sincronização")
             
-            # Salvar quaisquer atualizações
-            if self.chunk_ids:
-                self.save_memory_index()
+                # Salvar quaisquer atualizações
+                if self.chunk_ids:
+                    self.save_memory_index()
                 
-        except Exception as e:
-            if self.verbose:
-                # print(f"Error syncing with database: {e}")
-                self.log_always("error", f"Erro ao sincronizar com banco de dados: {e}")
+            except Exception as e:
+                if self.verbose:
+                    # print(f"Error syncing with database: {e}")
+                    self.log_always("error", f"Erro ao sincronizar com banco de dados: {e}")
 
 # Instância global
 chat_memory_manager = None
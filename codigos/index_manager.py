@@ -1,17 +1,40 @@
 import os
+import asyncio
 import faiss
 import pickle
 import numpy as np
 import hashlib
+import shutil
 import time
 import threading
+import queue
+import re
+import json
 from datetime import datetime, timedelta
 from openai import OpenAI
 from typing import List, Dict, Optional, Tuple
 from file_readers import read_file
-from config import INDEX_CONFIG, OPENAI_API_KEY, EMBEDDING_MODEL
+from query_intent_analyzer import extract_identifiers
+from chunking import count_tokens, get_chunking_strategy
+from embedding_utils import arequest_embeddings, get_async_client, pool_embeddings, request_embeddings, split_for_embedding
+from search_cache import SearchResultCache, make_cache_key
+from index_stats import IndexStats
+from index_work_queue import IndexWorkQueue
+from text_cache import CACHED_EXTENSIONS, ParsedTextCache
+from fingerprint import available_algorithms, default_algorithm, file_fingerprint, is_exact
+from file_failures import (REASON_EMPTY_FILE, REASON_ERROR, REASON_NO_TEXT, clear_failure, ensure_failures_table,
+                           list_failures, load_failures, prune_failures, record_failure, should_skip)
+from summaries import precompute_summaries, smart_summary
+from usage_rollup import compact_usage, ensure_rollup_tables, recent_tokens, record_usage, usage_summary
+from rw_lock import ReadWriteLock
+from sharded_index import SHARD_STRATEGIES, ShardedIndex, shard_key
+from near_duplicates import INSERT_ROW_SQL, cluster as cluster_near_duplicates, fingerprint_row, from_signed, hamming, simhash
+from config import INDEX_CONFIG, SEARCH_CONFIG, OPENAI_API_KEY, EMBEDDING_MODEL
 from logger import log_index_manager_error, log_index_manager_warning, log_index_manager_info, log_index_manager_success, log_index_manager_debug
 
+# Marca em chunk_ids dos vetores cujo fragmento foi excluído do banco; ignorados nas buscas até a reconstrução
+STALE_CHUNK_ID = -1
+
 class IndexManager:
     def __init__(self, vault_path: str = None, index_path: str = None, enable_usage_tracking: bool = None, verbose: bool = None):
         # Usar valores de configuração com alternativas (fallbacks)
@@ -21,9 +44,16 @@ class IndexManager:
         # Manter apenas metadados essenciais em memória para buscas rápidas
         self.chunk_hashes = []  # Apenas referências de hash para o índice FAISS
         self.chunk_ids = []  # IDs de banco de dados para os fragmentos
+        self._chunk_positions = {}  # ID do fragmento -> posições no índice FAISS (um fragmento pode ter vários vetores)
+        self._stale_vectors = 0  # Vetores marcados com STALE_CHUNK_ID, descartados na próxima reconstrução
         
         self.last_update = None
         self.is_updating = False
+        # Buscas leem o índice sob trava compartilhada; atualizações montam um novo índice à parte
+        # e só o publicam (troca das referências) sob trava exclusiva
+        self.index_lock = ReadWriteLock()
+        self._update_lock = threading.Lock()
+        self._standalone_engine = None  # engine do banco fora do contexto Flask, criado sob demanda
         self.enable_usage_tracking = enable_usage_tracking if enable_usage_tracking is not None else INDEX_CONFIG["enable_usage_tracking"]
         self.verbose = verbose if verbose is not None else INDEX_CONFIG["verbose"]
         
@@ -31,6 +61,114 @@ class IndexManager:
         self.max_chunk_size = INDEX_CONFIG["max_chunk_size"]
         self.chunk_overlap = INDEX_CONFIG["chunk_overlap"]
         self.min_chunk_size = INDEX_CONFIG["min_chunk_size"]
+        self.chunking_strategy = INDEX_CONFIG.get("chunking_strategy", "fixed")  # "fixed", "content_defined" ou "token"
+        # Limites em tokens do modelo de embedding (usados pela estratégia "token")
+        self.max_chunk_tokens = INDEX_CONFIG.get("max_chunk_tokens", 750)
+        self.chunk_overlap_tokens = INDEX_CONFIG.get("chunk_overlap_tokens", 50)
+        self.min_chunk_tokens = INDEX_CONFIG.get("min_chunk_tokens", 25)
+        
+        # Textos maiores que o limite do modelo: "truncate" (original), "pool" ou "multi"
+        self.embedding_oversize_mode = INDEX_CONFIG.get("embedding_oversize_mode", "truncate")
+        self.max_embedding_tokens = INDEX_CONFIG.get("max_embedding_tokens", 8000)
+        
+        # Pipeline de indexação: tamanho do lote de embeddings e da fila entre leitura e embedding
+        self.index_batch_size = INDEX_CONFIG.get("index_batch_size", 64)
+        self.pipeline_queue_size = INDEX_CONFIG.get("pipeline_queue_size", 8)
+        self.max_tokens_per_embedding_request = INDEX_CONFIG.get("max_tokens_per_embedding_request", 250000)
+        
+        # Checkpoint da indexação inicial: salvo a cada N lotes para retomar após falhas
+        self.checkpoint_every_batches = INDEX_CONFIG.get("checkpoint_every_batches", 10)
+        self.checkpoint_path = self.index_path + ".checkpoint"
+        
+        # Fila de prioridade da atualização: boosts do administrador, arquivos recentes e pequenos primeiro;
+        # cada ciclo lê e embeda arquivos da fila por até update_time_budget_sec e, havendo pendências,
+        # repete após busy_update_interval_sec
+        self.work_queue = IndexWorkQueue(recent_window_sec=INDEX_CONFIG.get("recent_file_window_sec", 3600))
+        self.update_time_budget_sec = INDEX_CONFIG.get("update_time_budget_sec", 30)
+        self.busy_update_interval_sec = INDEX_CONFIG.get("busy_update_interval_sec", 5)
+        # Fração de vetores obsoletos que força a reconstrução mesmo com arquivos na fila
+        self.stale_vector_rebuild_ratio = INDEX_CONFIG.get("stale_vector_rebuild_ratio", 0.1)
+        # Durante uma ingestão em massa o índice é gravado no máximo a cada index_save_interval_sec
+        # (e ao esvaziar a fila), em vez de a cada ciclo
+        self.index_save_interval_sec = INDEX_CONFIG.get("index_save_interval_sec", 300)
+        self._index_dirty = False
+        self._last_index_save = time.monotonic()
+        
+        # Arquivos vazios ou ilegíveis: ignorados até mudarem no disco ou até a próxima tentativa (espera exponencial)
+        self.failed_file_retry_base_sec = INDEX_CONFIG.get("failed_file_retry_base_sec", 3600)
+        self.failed_file_retry_max_sec = INDEX_CONFIG.get("failed_file_retry_max_sec", 7 * 86400)
+        self.file_failures_available = False
+        self._failed_files = set()  # Caminhos com registro em index_file_failures
+        
+        # Impressão dos bytes brutos (file_metadata.raw_fingerprint): verificação primária de alteração,
+        # sem extrair o texto; algoritmo None = xxh3 se o xxhash estiver instalado, senão blake2b
+        self.fingerprint_algorithm = INDEX_CONFIG.get("fingerprint_algorithm") or default_algorithm()
+        if self.fingerprint_algorithm not in available_algorithms():
+            self.log_always("warning", f"Algoritmo de impressão '{self.fingerprint_algorithm}' indisponível, usando {default_algorithm()}")
+            self.fingerprint_algorithm = default_algorithm()
+        # Acima deste tamanho, amostrar blocos do arquivo em vez de ler tudo (0 = sempre ler o arquivo inteiro)
+        self.fingerprint_sample_threshold = int(INDEX_CONFIG.get("fingerprint_sample_threshold_mb", 0) * 1024 * 1024)
+        self.file_fingerprint_available = False
+        
+        # Cache do texto extraído de PDF/DOCX/XLSX, endereçado pela impressão dos bytes: arquivos apenas
+        # tocados (mtime alterado, mesmos bytes) não são extraídos de novo para a verificação de hash
+        self.text_cache = None
+        if INDEX_CONFIG.get("enable_parsed_text_cache", True):
+            self.text_cache = ParsedTextCache(
+                self.index_path + ".textcache",
+                max_bytes=INDEX_CONFIG.get("parsed_text_cache_max_mb", 512) * 1024 * 1024
+            )
+        
+        # Particionamento opcional do índice em shards ("folder" ou "hash"); cada shard é salvo à parte
+        self.shard_strategy = INDEX_CONFIG.get("shard_strategy") or None
+        if self.shard_strategy not in (None,) + SHARD_STRATEGIES:
+            self.log_always("warning", f"Estratégia de shards desconhecida '{self.shard_strategy}', usando índice único")
+            self.shard_strategy = None
+        self.num_shards = INDEX_CONFIG.get("num_shards", 8)
+        self.shard_search_workers = INDEX_CONFIG.get("shard_search_workers", 4)
+        self.shard_dir = self.index_path + ".shards"
+        
+        # Fragmentos quase duplicados (SimHash): só o representante de cada grupo é embedado e indexado.
+        # Desativado por padrão: membros que diferem só em valores, datas ou nomes deixam de chegar ao chat
+        self.enable_near_duplicate_detection = INDEX_CONFIG.get("enable_near_duplicate_detection", False)
+        self.near_duplicate_max_distance = INDEX_CONFIG.get("near_duplicate_max_distance", 3)
+        self.near_duplicate_index_available = False
+        self.chunk_occurrences_available = False
+        
+        # Busca léxica (FTS5/BM25) sobre text_chunks e modo de busca padrão ("vector" ou "hybrid")
+        self.enable_lexical_index = INDEX_CONFIG.get("enable_lexical_index", True)
+        self.lexical_index_available = False
+        self.identifier_index_available = False
+        self.max_exact_results = SEARCH_CONFIG.get("max_exact_results", 200)
+        self.search_mode = SEARCH_CONFIG.get("search_mode", "vector")
+        self.rrf_k = SEARCH_CONFIG.get("rrf_k", 60)
+        self.search_multiplier = SEARCH_CONFIG.get("search_multiplier", 3)
+        # Busca filtrada: até este número de vetores, comparar o subconjunto diretamente em vez de usar IDSelector
+        self.filtered_search_subset_limit = SEARCH_CONFIG.get("filtered_search_subset_limit", 20000)
+        # Reordenação por diversidade (MMR) com limite de fragmentos por arquivo
+        self.enable_diversity_rerank = SEARCH_CONFIG.get("enable_diversity_rerank", True)
+        self.mmr_lambda = SEARCH_CONFIG.get("mmr_lambda", 0.7)
+        self.max_chunks_per_file = SEARCH_CONFIG.get("max_chunks_per_file", 2)
+        # Tamanhos de resumo pré-calculados ao salvar cada fragmento (search_with_summaries apenas os consulta)
+        self.summary_lengths = SEARCH_CONFIG.get("summary_lengths", [SEARCH_CONFIG.get("max_summary_length", 1500)])
+        
+        # Cache de resultados de busca, invalidado pela época do índice (incrementada a cada alteração)
+        self.index_epoch = 0
+        self.search_cache = SearchResultCache(
+            max_size=SEARCH_CONFIG.get("result_cache_size", 256),
+            ttl_sec=SEARCH_CONFIG.get("result_cache_ttl_sec", 600)
+        )
+        
+        # Estatísticas mantidas incrementalmente pela indexação (get_stats não consulta o banco)
+        self.stats = IndexStats(self.vault_path)
+        
+        # Agregados diário/mensal de uso de embeddings e retenção das linhas brutas (0 = manter todas)
+        self.usage_rollups_available = False
+        self.usage_raw_retention_days = INDEX_CONFIG.get("usage_raw_retention_days", 90)
+        self._last_usage_compaction = None
+        # Intervalo para reler do banco o uso dos últimos 30 dias (entre releituras, soma-se cada uso)
+        self.recent_usage_refresh_sec = INDEX_CONFIG.get("recent_usage_refresh_sec", 3600)
+        self._last_recent_usage_refresh = None
         
         # Configurações de cache
         self.max_cache_size = 1000  # Máximo de fragmentos a manter no cache de memória
@@ -43,6 +181,24 @@ class IndexManager:
         # Inicializar cliente OpenAI
         self.client = OpenAI(api_key=OPENAI_API_KEY)
         
+        # Criar agregados de uso antes de indexar, para que os embeddings da indexação já sejam somados
+        self._ensure_usage_rollups()
+        
+        # Ocorrências (arquivo, posição) de cada fragmento: conteúdo idêntico em vários arquivos é salvo uma vez
+        self._ensure_chunk_occurrences()
+        
+        # Registro de arquivos vazios/ilegíveis, consultado pela varredura antes de reler um arquivo
+        self._ensure_file_failures()
+        self._ensure_file_fingerprint_column()
+        
+        # Criar índices léxicos (FTS5 e identificadores) antes de indexar, para que já sejam alimentados
+        if self.enable_lexical_index:
+            self._ensure_lexical_index()
+            self._ensure_identifier_index()
+        
+        if self.enable_near_duplicate_detection:
+            self._ensure_near_duplicate_index()
+        
         # Carregar ou criar índice
         self.load_or_create_index()
         
@@ -178,159 +334,34 @@ class IndexManager:
     
     def chunk_text(self, text: str, file_path: str) -> List[Tuple[str, Dict]]:
         """
-        Dividir texto em fragmentos sobrepostos para melhor processamento.
+        Dividir texto em fragmentos usando a estratégia configurada (INDEX_CONFIG["chunking_strategy"]).
         Retorna lista de tuplas (chunk_text, chunk_metadata).
         """
-        if len(text) <= self.max_chunk_size:
-            # Não é necessário fragmentar
-            if self.verbose:
-                self.log_verbose("info", f"Comprimento do texto {len(text)} <= max_chunk_size {self.max_chunk_size}, não é necessário fragmentar")
-            return [(text, {
-                'chunk_id': 0,
-                'total_chunks': 1,
-                'start_char': 0,
-                'end_char': len(text),
-                'file_path': file_path
-            })]
-        
-        chunks = []
-        start = 0
-        chunk_id = 0
-        max_iterations = len(text) + 1000  # Limite de segurança para evitar loops infinitos
-        iteration_count = 0
-        
-        if self.verbose:
-            self.log_verbose("info", f"Fragmentando texto de {len(text)} caracteres com max_chunk_size {self.max_chunk_size}")
-        
-        while start < len(text) and iteration_count < max_iterations:
-            iteration_count += 1
-            # Calcular posição final para este fragmento
-            end = min(start + self.max_chunk_size, len(text))
-            
-            # Se não for o último fragmento, tentar quebrar em limite de sentença
-            if end < len(text):
-                # Buscar finais de sentença nos últimos 500 caracteres do fragmento
-                search_start = max(start, end - 500)
-                search_text = text[search_start:end]
-                
-                # Encontrar o último final de sentença (., !, ?) seguido por espaço em branco
-                sentence_end = -1
-                for i in range(len(search_text) - 1, -1, -1):
-                    if search_text[i] in '.!?' and i + 1 < len(search_text) and search_text[i + 1].isspace():
-                        sentence_end = search_start + i + 1
-                        break
-                
-                # Se for encontrado um bom limite de sentença, usar
-                if sentence_end > start and sentence_end < end:
-                    end = sentence_end
-            
-            # Extrair o fragmento
-            chunk_text = text[start:end].strip()
-            
-            # Adicionar apenas fragmentos não vazios
-            if chunk_text:
-                chunk_metadata = {
-                    'chunk_id': chunk_id,
-                    'total_chunks': -1,  # Será atualizado após todos os fragmentos serem criados
-                    'start_char': start,
-                    'end_char': end,
-                    'file_path': file_path
-                }
-                chunks.append((chunk_text, chunk_metadata))
-                chunk_id += 1
-                
-                if self.verbose:
-                    self.log_verbose("debug", f"  Fragmento {chunk_id}: {len(chunk_text)} caracteres ({start}-{end})")
-            
-            # Ir para o próximo fragmento, considerando a sobreposição
-            # Garantir avanço para evitar loops infinitos
-            new_start = end  # Começar do fim do fragmento atual
-            
-            # Aplicar sobreposição, mas garantindo progresso
-            if new_start > start:  # Aplicar apenas se houve progresso
-                new_start = max(new_start - self.chunk_overlap, start + 1)
-            
-            # Forçar avanço se a sobreposição causar retrocesso
-            if new_start <= start:
-                new_start = start + 1
-            
-            # Segurança adicional: se estiver perto do fim e o restante for pequeno, encerrar
-            remaining_text = len(text) - new_start
-            if remaining_text <= self.chunk_overlap:
-                break
-            
-            # Segurança adicional: se não houver progresso suficiente, forçar avanço
-            if new_start <= start:
-                new_start = start + self.max_chunk_size // 2  # Avançar metade do tamanho do fragmento
-                self.log_always("warning", f"Forçando progresso de {start} para {new_start}")
-            
-            start = new_start
-            
-            # Saída de debug para progresso do loop
-            if self.verbose and iteration_count % 100 == 0:
-                self.log_verbose("debug", f"  Iteração do loop {iteration_count}: início={start}, fim={end}, progresso={start}/{len(text)} ({start/len(text)*100:.1f}%)")
-            
-            # Verificação de segurança para evitar loops infinitos
-            if start >= len(text):
-                break
-            
-            # Segurança adicional: interromper se não houver progresso suficiente
-            if iteration_count > 100 and start < len(text) * 0.1:
-                self.log_always("warning", f"Progresso insuficiente após {iteration_count} iterações. Interrompendo loop para evitar loop infinito.")
-                self.log_always("warning", f"Posição atual: {start}/{len(text)} ({start/len(text)*100:.1f}%)")
-                break
-        
-        # Verificar se o limite de iterações foi atingido (potencial loop infinito)
-        if iteration_count >= max_iterations:
-            self.log_always("warning", f"Limite de iteração atingido ({max_iterations}) durante fragmentação. Isso pode indicar um loop infinito.")
-            self.log_always("warning", f"Comprimento do texto: {len(text)}, fragmentos criados: {len(chunks)}, posição inicial final: {start}")
-        
-        # Mesclar fragmentos pequenos com os anteriores para evitar trechos minúsculos
-        if len(chunks) > 1:
-            merged_chunks = []
-            i = 0
-            while i < len(chunks):
-                chunk_text, metadata = chunks[i]
-                
-                # Se o fragmento for muito pequeno e não o primeiro, mesclar com o anterior
-                if len(chunk_text) < self.min_chunk_size and i > 0:
-                    prev_chunk_text, prev_metadata = merged_chunks[-1]
-                    # Mesclar os fragmentos
-                    merged_text = prev_chunk_text + " " + chunk_text
-                    merged_metadata = prev_metadata.copy()
-                    merged_metadata['end_char'] = metadata['end_char']
-                    merged_chunks[-1] = (merged_text, merged_metadata)
-                    if self.verbose:
-                        self.log_verbose("debug", f"  Fragmento pequeno {i} ({len(chunk_text)} chars) mesclado com fragmento anterior")
-                else:
-                    merged_chunks.append((chunk_text, metadata))
-                i += 1
-            
-            chunks = merged_chunks
-            if self.verbose:
-                self.log_verbose("info", f"  Após mesclagem: {len(chunks)} fragmentos")
-        
-        # Atualizar total_chunks para todos os fragmentos
-        for chunk_text, metadata in chunks:
-            metadata['total_chunks'] = len(chunks)
-        
-        # Verificação final de segurança: garantir que nenhum fragmento exceda o tamanho máximo
-        oversized_chunks = [i for i, (chunk_text, _) in enumerate(chunks) if len(chunk_text) > self.max_chunk_size]
-        if oversized_chunks:
-            self.log_always("warning", f"Encontrados {len(oversized_chunks)} fragmentos grandes demais, truncando-os")
-            for i in oversized_chunks:
-                chunk_text, metadata = chunks[i]
-                if len(chunk_text) > self.max_chunk_size:
-                    chunks[i] = (chunk_text[:self.max_chunk_size], metadata)
-                    self.log_verbose("warning", f"  Fragmento {i} truncado de {len(chunk_text)} para {self.max_chunk_size} caracteres")
+        chunker = get_chunking_strategy(self.chunking_strategy)
+        chunks = chunker(
+            text, file_path, self.max_chunk_size, self.chunk_overlap, self.min_chunk_size, logger=self,
+            max_chunk_tokens=self.max_chunk_tokens,
+            chunk_overlap_tokens=self.chunk_overlap_tokens,
+            min_chunk_tokens=self.min_chunk_tokens,
+            # Só truncar fragmentos grandes demais quando embed_text também trunca
+            truncate_oversized=(self.embedding_oversize_mode == "truncate")
+        )
         
         if self.verbose:
-            self.log_verbose("info", f"Dividido {os.path.basename(file_path)} em {len(chunks)} fragmentos")
+            self.log_verbose("info", f"Dividido {os.path.basename(file_path)} em {len(chunks)} fragmentos (estratégia: {self.chunking_strategy})")
         
         return chunks
     
     def embed_text(self, text: str, file_path: str = None, operation: str = "create") -> Optional[np.ndarray]:
         """Criar embedding para o texto usando a API da OpenAI"""
+        if self.embedding_oversize_mode != "truncate":
+            # Dividir textos longos em pedaços e combinar os vetores em vez de truncar
+            embedded = self._embed_pieces(text, file_path, operation)
+            if embedded is None:
+                return None
+            vectors, weights = embedded
+            return vectors[0] if len(vectors) == 1 else pool_embeddings(vectors, weights)
+        
         try:
             # Verificação de segurança: garantir que o texto não exceda o limite de tokens
             # A maioria dos modelos de embedding tem limite de 8k tokens; usar estimativa conservadora
@@ -363,10 +394,121 @@ class IndexManager:
             self.log_always("error", f"Erro ao criar embedding: {e}")
             return None
     
+    def embed_text_multi(self, text: str, file_path: str = None, operation: str = "create") -> Optional[np.ndarray]:
+        """Criar um ou mais embeddings (matriz n x dim) para o texto de um fragmento.
+        
+        No modo "multi" cada pedaço de um texto longo gera uma linha; nos demais modos
+        a matriz tem uma única linha (vetor truncado ou combinado).
+        """
+        if self.embedding_oversize_mode == "multi":
+            embedded = self._embed_pieces(text, file_path, operation)
+            if embedded is None:
+                return None
+            return np.vstack(embedded[0])
+        
+        embedding = self.embed_text(text, file_path, operation)
+        if embedding is None:
+            return None
+        return embedding.reshape(1, -1)
+    
+    def _embed_pieces(self, text: str, file_path: str = None, operation: str = "create") -> Optional[Tuple[List[np.ndarray], List[int]]]:
+        """Dividir o texto em pedaços limitados em tokens e embedá-los em uma única requisição"""
+        try:
+            pieces = split_for_embedding(text, self.max_embedding_tokens)
+            if self.verbose:
+                if len(pieces) > 1:
+                    self.log_verbose("info", f"Texto de {len(text)} caracteres dividido em {len(pieces)} pedaços para embedding (modo {self.embedding_oversize_mode})")
+                else:
+                    self.log_verbose("info", f"Criando embedding para texto de {len(text)} caracteres")
+            
+            vectors, tokens_used = request_embeddings(self.client, EMBEDDING_MODEL, pieces)
+            
+            # Salvar uso no banco se file_path for fornecido
+            if file_path and self.enable_usage_tracking:
+                self._track_embedding_usage(file_path, len(text), tokens_used, operation)
+            
+            return vectors, [count_tokens(piece) for piece in pieces]
+        except Exception as e:
+            self.log_always("error", f"Erro ao criar embedding: {e}")
+            return None
+    
+    def embed_texts(self, texts: List[str], file_paths: List[str] = None, operation: str = "create") -> List[Optional[np.ndarray]]:
+        """Criar embeddings para vários fragmentos com o mínimo de requisições.
+        
+        Retorna, para cada texto, uma matriz (n x dim) como embed_text_multi, ou None se falhar.
+        Os textos (ou seus pedaços, nos modos "pool"/"multi") são agrupados em requisições de até
+        max_tokens_per_embedding_request tokens.
+        """
+        file_paths = file_paths or [None] * len(texts)
+        
+        # Preparar as entradas de cada texto conforme o modo de textos grandes
+        pieces_per_text = []
+        for text in texts:
+            if self.embedding_oversize_mode == "truncate":
+                max_chars = 6000  # Estimativa conservadora para 8k tokens
+                if len(text) > max_chars:
+                    self.log_always("warning", f"Comprimento do texto {len(text)} excede o limite seguro {max_chars}, truncando")
+                    text = text[:max_chars]
+                pieces_per_text.append([text])
+            else:
+                pieces_per_text.append(split_for_embedding(text, self.max_embedding_tokens))
+        
+        # Agrupar as entradas em requisições limitadas em tokens
+        flat_inputs = [(text_index, piece) for text_index, pieces in enumerate(pieces_per_text) for piece in pieces]
+        piece_tokens = [count_tokens(piece) for _, piece in flat_inputs]
+        piece_vectors = [None] * len(flat_inputs)
+        
+        request_start = 0
+        while request_start < len(flat_inputs):
+            request_end = request_start
+            request_tokens = 0
+            while (request_end < len(flat_inputs) and request_end - request_start < 2048
+                   and (request_end == request_start or request_tokens + piece_tokens[request_end] <= self.max_tokens_per_embedding_request)):
+                request_tokens += piece_tokens[request_end]
+                request_end += 1
+            
+            inputs = [piece for _, piece in flat_inputs[request_start:request_end]]
+            try:
+                vectors, tokens_used = request_embeddings(self.client, EMBEDDING_MODEL, inputs)
+                piece_vectors[request_start:request_end] = vectors
+                if self.enable_usage_tracking:
+                    self._track_batch_usage(flat_inputs[request_start:request_end], file_paths, tokens_used, operation)
+            except Exception as e:
+                self.log_always("error", f"Erro ao criar embeddings em lote ({len(inputs)} entradas): {e}")
+            request_start = request_end
+        
+        # Remontar o resultado por texto
+        results = []
+        position = 0
+        for text_index, pieces in enumerate(pieces_per_text):
+            vectors = piece_vectors[position:position + len(pieces)]
+            weights = piece_tokens[position:position + len(pieces)]
+            position += len(pieces)
+            if any(vector is None for vector in vectors):
+                results.append(None)
+            elif len(vectors) == 1 or self.embedding_oversize_mode == "multi":
+                results.append(np.vstack(vectors))
+            else:
+                results.append(pool_embeddings(vectors, weights).reshape(1, -1))
+        return results
+    
+    def _track_batch_usage(self, inputs: List[Tuple[int, str]], file_paths: List[str], tokens_used: int, operation: str):
+        """Distribuir o uso de tokens de uma requisição em lote entre os arquivos, proporcionalmente ao texto"""
+        chars_per_file = {}
+        for text_index, piece in inputs:
+            file_path = file_paths[text_index]
+            if file_path:
+                chars_per_file[file_path] = chars_per_file.get(file_path, 0) + len(piece)
+        
+        total_chars = sum(chars_per_file.values()) or 1
+        for file_path, chars in chars_per_file.items():
+            self._track_embedding_usage(file_path, chars, round(tokens_used * chars / total_chars), operation)
+    
     def _track_embedding_usage(self, file_path: str, text_length: int, tokens_used: int, operation: str):
         """Rastrear o uso de embeddings no banco de dados"""
         if not self.enable_usage_tracking:
             return
+        self.stats.add_tokens(operation, tokens_used)
             
         try:
             # Tentar usar primeiro o contexto do app Flask
@@ -385,6 +527,8 @@ class IndexManager:
                 )
                 
                 db.session.add(usage)
+                if self.usage_rollups_available:
+                    record_usage(db.session, operation, EMBEDDING_MODEL, tokens_used, text_length)
                 db.session.commit()
                 if self.verbose:
                     self.log_verbose("info", f"Uso de embedding rastreado: {tokens_used} tokens para {os.path.basename(file_path)} ({operation})")
@@ -420,6 +564,8 @@ class IndexManager:
                     )
                     
                     session.add(usage)
+                    if self.usage_rollups_available:
+                        record_usage(session, operation, EMBEDDING_MODEL, tokens_used, text_length)
                     session.commit()
                     session.close()
                     
@@ -486,8 +632,8 @@ class IndexManager:
         
         return {}
     
-    def _save_file_metadata_to_db(self, file_path: str, mtime: float, size: int, file_hash: str):
-        """Salvar metadados do arquivo no banco de dados"""
+    def _save_file_metadata_to_db(self, file_path: str, mtime: float, size: int, file_hash: str, raw_fingerprint: str = None):
+        """Salvar metadados do arquivo no banco de dados (e a impressão dos bytes, se informada)"""
         try:
             from database import FileMetadata, db
             from flask import current_app
@@ -549,6 +695,10 @@ class IndexManager:
             
         except Exception as e:
             self.log_always("error", f"Erro ao salvar metadados do arquivo no banco de dados: {e}")
+        
+        if raw_fingerprint:
+            # Gravada à parte: o modelo FileMetadata não conhece a coluna
+            self._set_file_fingerprint(file_path, raw_fingerprint)
             #  não falhar na operação principal se o salvamento de metadados falhar
     
     def _cleanup_file_metadata_from_db(self, file_path: str):
@@ -624,17 +774,29 @@ class IndexManager:
     
     def load_or_create_index(self):
         """Carregar índice existente ou criar um novo"""
-        if os.path.exists(self.index_path):
+        if os.path.exists(self.checkpoint_path):
+            # Indexação inicial interrompida: retomar do checkpoint
+            self.create_new_index()
+        elif os.path.exists(self.index_path):
             try:
                 with open(self.index_path, "rb") as f:
                     data = pickle.load(f)
                     self.index = data["index"]
                     self.chunk_hashes = data.get("chunk_hashes", []) # carega o hash dos fragmentos
                     self.chunk_ids = data.get("chunk_ids", []) # carrega os ids dos fragmentos
+                    self._rebuild_chunk_positions()
                     self.last_update = data.get("last_update")
+                    self.stats.load(data.get("stats"))
+                    if isinstance(self.index, ShardedIndex):
+                        self.index.load_shards(self.shard_dir)
                     if self.verbose:
                         # print(f"FAISS index loaded with {len(self.chunk_hashes)} chunks")
                         self.log_verbose("info", f"Índice FAISS carregado com {len(self.chunk_hashes)} fragmentos")
+                if not self._index_layout_matches(self.index):
+                    # Configuração de shards mudou: reorganizar a partir dos embeddings armazenados
+                    self.log_always("info", "Configuração de shards alterada, reorganizando índice...")
+                    self.rebuild_index()
+                    self.save_index()
             except Exception as e:
                 # print(f"Error loading index: {e}")
                 self.log_always("error", f"Erro ao carregar índice: {e}")
@@ -643,23 +805,108 @@ class IndexManager:
             self.create_new_index()
     
     def create_new_index(self):
-        """Criar novo índice FAISS do zero"""
-        self.log_always("info", "Criando novo índice FAISS...")
-        self.chunk_hashes = [] # Inicializar para novo índice
-        self.chunk_ids = [] # Inicializar para novo índice
+        """Criar novo índice FAISS do zero (ou retomar a partir do checkpoint)"""
+        checkpoint = self._load_checkpoint()
+        if checkpoint:
+            self._publish_index(checkpoint["index"], checkpoint["chunk_ids"], checkpoint["chunk_hashes"])
+            self.stats.load(checkpoint.get("stats"))
+            completed_files = set(checkpoint["completed_files"])
+            self.log_always("info", f"Retomando indexação do checkpoint: {len(completed_files)} arquivos e {len(self.chunk_ids)} vetores já indexados")
+        else:
+            self.log_always("info", "Criando novo índice FAISS...")
+            self._publish_index(None, [], []) # Inicializar para novo índice
+            self.stats.reset()
+            completed_files = set()
         
         if not os.path.exists(self.vault_path):
             self.log_always("error", f"Caminho do vault {self.vault_path} não existe")
             return
         
-        embeddings = []
-        # Recursivamente escanear todos os subdiretórios para arquivos markdown
+        # Pipeline em estágios: os vetores entram no índice em lotes e ficam pesquisáveis à medida que chegam,
+        # na ordem da fila de prioridade (recentes e pequenos primeiro)
+        failures = self._load_file_failures()
+        pending_files = self.work_queue.order(
+            path for path in self._iter_indexable_files()
+            if path not in completed_files and not self._skip_failed_file(path, failures)
+        )
+        added, interrupted = self._run_indexing_pipeline(pending_files, "create", completed_files)
+        
+        if interrupted:
+            self.log_always("warning", f"Indexação interrompida; progresso salvo em {self.checkpoint_path} e será retomado na próxima inicialização")
+            return
+        
+        if self.chunk_ids:
+            self.save_index()
+            self._remove_checkpoint()
+            # Fragmentos de execuções interrompidas que não entraram no índice (quase duplicados de
+            # fragmentos indexados ficam de fora do índice, mas não são órfãos)
+            keep_ids = set(self.chunk_ids)
+            keep_ids.update(member for member, representative in self._near_duplicate_pairs() if representative in keep_ids)
+            self._cleanup_orphan_chunks(keep_ids)
+            self.log_always("success", f"Novo índice FAISS criado com {len(self.chunk_hashes)} fragmentos de {self.vault_path} e subdiretórios")
+            
+            # Sync document metadata to database after creating index
+            if self.verbose:
+                self.log_verbose("info", "Sincronizando metadados de documentos com banco de dados...")
+            self._sync_document_metadata_to_db()
+        else:
+            self._remove_checkpoint()
+            self.log_always("warning", "Nenhum documento válido encontrado para criar índice")
+    
+    def _load_checkpoint(self) -> Optional[Dict]:
+        """Carregar o checkpoint da indexação inicial, se existir e for do vault atual"""
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                checkpoint = pickle.load(f)
+            if checkpoint.get("vault_path") != self.vault_path:
+                self.log_always("warning", "Checkpoint de outro vault ignorado")
+                return None
+            return checkpoint
+        except Exception as e:
+            self.log_always("error", f"Erro ao carregar checkpoint: {e}")
+            return None
+    
+    def _save_checkpoint(self, completed_files: set, last_chunk_id: Optional[int]):
+        """Salvar índice parcial e cursor de progresso (gravação atômica)"""
+        try:
+            os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+            data = {
+                "index": self.index,
+                "chunk_hashes": self.chunk_hashes,
+                "chunk_ids": self.chunk_ids,
+                "completed_files": sorted(completed_files),
+                "last_chunk_id": last_chunk_id,
+                "stats": self.stats.to_dict(),
+                "vault_path": self.vault_path,
+                "saved_at": datetime.now()
+            }
+            temp_path = self.checkpoint_path + ".tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(data, f)
+            os.replace(temp_path, self.checkpoint_path)
+            if self.verbose:
+                self.log_verbose("info", f"Checkpoint salvo: {len(completed_files)} arquivos, {len(self.chunk_ids)} vetores")
+        except Exception as e:
+            self.log_always("error", f"Erro ao salvar checkpoint: {e}")
+    
+    def _remove_checkpoint(self):
+        """Remover o checkpoint após a conclusão da indexação"""
+        try:
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+        except Exception as e:
+            self.log_always("error", f"Erro ao remover checkpoint: {e}")
+    
+    def _iter_indexable_files(self):
+        """Gerar recursivamente os caminhos de arquivos suportados e não excluídos do vault"""
         for root, dirs, files in os.walk(self.vault_path):
             # Pular diretórios excluídos
             if self.should_exclude_path(root):
                 self.log_verbose("info", f"Pulando diretório excluído: {root}")
                 continue
-                
+            
             for file in files:
                 if file.endswith(".md") or file.endswith(".txt") or file.endswith(".docx") or file.endswith(".xlsx") or file.endswith(".pdf"):
                     file_path = os.path.join(root, file)
@@ -668,50 +915,204 @@ class IndexManager:
                     if self.should_exclude_path(file_path):
                         self.log_verbose("info", f"Pulando arquivo excluído: {file_path}")
                         continue
-                        
+                    
+                    yield file_path
+    
+    def _run_indexing_pipeline(self, file_paths, operation: str = "create", completed_files: set = None) -> Tuple[int, bool]:
+        """Indexar arquivos em estágios (ler → fragmentar → embedar → adicionar) com memória limitada.
+        
+        Uma thread leitora lê e fragmenta os arquivos e os entrega por uma fila limitada
+        (back-pressure: a leitura pausa quando a fila enche). A thread atual salva os fragmentos,
+        acumula até index_batch_size, embeda o lote em uma requisição e adiciona os vetores
+        ao índice imediatamente.
+        
+        Se completed_files for informado, um checkpoint é salvo a cada checkpoint_every_batches
+        lotes; se um lote inteiro falhar (ex.: cota da API), o checkpoint é salvo e a indexação para.
+        Retorna (vetores adicionados, interrompido).
+        """
+        file_queue = queue.Queue(maxsize=self.pipeline_queue_size)
+        stop_event = threading.Event()
+        
+        def reader_stage():
+            try:
+                for file_path in file_paths:
+                    if stop_event.is_set():
+                        break
                     try:
                         # Usar o módulo file_readers para ler diferentes formatos de arquivo
-                        text = read_file(file_path)
+                        text = self._read_file_cached(file_path)
                         if text.strip():  # Processar apenas arquivos não vazios
-                            # Dividir texto em fragmentos
-                            chunks = self.chunk_text(text, file_path)
-                            for chunk_text, chunk_meta in chunks:
-                                # Salvar fragmento no banco de dados
-                                chunk_hash = self.hash_text(chunk_text)
-                                chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash)
-                                if chunk_id is not None:
-                                    self.chunk_hashes.append(chunk_hash)
-                                    self.chunk_ids.append(chunk_id)
-                                    embedding = self.embed_text(chunk_text, file_path, "create")
-                                    if embedding is not None:
-                                        embeddings.append(embedding)
-                                    else:
-                                        # Remover o fragmento se o embedding falhar
-                                        self._delete_chunk_from_db(chunk_id)
-                                        self.chunk_hashes.pop()
-                                        self.chunk_ids.pop()
-                                else:
-                                    self.log_always("error", f"Falha ao salvar fragmento para {os.path.basename(file_path)}")
+                            file_queue.put((file_path, self.chunk_text(text, file_path)))
+                            self._clear_file_failure(file_path)
+                        else:
+                            self._record_file_failure(file_path)
                     except Exception as e:
                         self.log_always("error", f"Erro ao processar arquivo {file_path}: {e}")
+                        self._record_file_failure(file_path, REASON_ERROR, str(e))
+            finally:
+                file_queue.put(None)  # Sinalizar fim da leitura
         
-        if embeddings:
-            dim = len(embeddings[0])
-            self.index = faiss.IndexFlatL2(dim)
-            self.index.add(np.array(embeddings))
-            self.save_index()
-            self.log_always("success", f"Novo índice FAISS criado com {len(self.chunk_hashes)} fragmentos de {self.vault_path} e subdiretórios")
+        reader = threading.Thread(target=reader_stage, daemon=True)
+        reader.start()
+        
+        added = 0
+        interrupted = False
+        batches_since_checkpoint = 0
+        pending = []  # (chunk_id, chunk_hash, chunk_text, file_path)
+        queued_ids = set(self.chunk_ids)  # Fragmentos já no índice ou em pending
+        queued_files = []  # Arquivos com todos os fragmentos em pending
+        
+        def flush():
+            nonlocal added, interrupted, batches_since_checkpoint, pending, queued_files
+            batch_added, batch_failed = self._embed_and_add_batch(pending, operation)
+            if batch_failed == len(pending):
+                # Nenhum embedding retornado: provável falha da API; parar e manter os fragmentos para retomar
+                interrupted = True
+                if completed_files is not None:
+                    self._save_checkpoint(completed_files, self.chunk_ids[-1] if self.chunk_ids else None)
+                return
+            added += batch_added
+            if completed_files is not None:
+                completed_files.update(queued_files)
+                batches_since_checkpoint += 1
+                if batches_since_checkpoint >= self.checkpoint_every_batches:
+                    self._save_checkpoint(completed_files, pending[-1][0])
+                    batches_since_checkpoint = 0
+            pending = []
+            queued_files = []
+        
+        try:
+            while not interrupted:
+                item = file_queue.get()
+                if item is None:
+                    break
+                file_path, chunks = item
+                saved = 0
+                for position, (chunk_text, chunk_meta) in enumerate(chunks):
+                    # Salvar fragmento no banco de dados (fragmentos já salvos são reaproveitados pelo hash)
+                    chunk_hash = self.hash_text(chunk_text)
+                    chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash, position)
+                    if chunk_id is None:
+                        self.log_always("error", f"Falha ao salvar fragmento para {os.path.basename(file_path)}")
+                        continue
+                    saved += 1
+                    if saved == 1:
+                        self.stats.set_file(file_path, 0)
+                    self.stats.add_chunks(file_path, 1)
+                    if chunk_id in queued_ids:
+                        # Conteúdo idêntico já indexado (ou no lote) por outro arquivo: só a ocorrência é nova
+                        continue
+                    queued_ids.add(chunk_id)
+                    pending.append((chunk_id, chunk_hash, chunk_text, file_path))
+                    if len(pending) >= self.index_batch_size:
+                        flush()
+                        if interrupted:
+                            break
+                if not interrupted:
+                    queued_files.append(file_path)
             
-            # Sync document metadata to database after creating index
-            if self.verbose:
-                self.log_verbose("info", "Sincronizando metadados de documentos com banco de dados...")
-            self._sync_document_metadata_to_db()
-        else:
-            self.log_always("warning", "Nenhum documento válido encontrado para criar índice")
+            if pending and not interrupted:
+                flush()
+            if completed_files is not None and not interrupted:
+                completed_files.update(queued_files)
+        finally:
+            # Em caso de erro, liberar a thread leitora caso esteja bloqueada na fila cheia
+            stop_event.set()
+            while reader.is_alive():
+                try:
+                    file_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        
+        return added, interrupted
+    
+    def _embed_and_add_batch(self, batch: List[Tuple[int, str, str, str]], operation: str,
+                             failed_files: set = None) -> Tuple[int, int]:
+        """Embedar um lote de fragmentos salvos e adicioná-los ao índice; retorna (vetores adicionados, falhas).
+        
+        Embeddings já armazenados em text_chunks.embedding_vector (ex.: de uma execução interrompida)
+        são reaproveitados sem nova chamada à API. Fragmentos quase duplicados de outro já indexado
+        ficam fora do índice (são expandidos nos resultados do representante). failed_files, se
+        informado, recebe os arquivos com algum fragmento que ficou sem embedding.
+        """
+        members = self._near_duplicate_members([item[0] for item in batch])
+        if members:
+            batch = [item for item in batch if item[0] not in members]
+            if not batch:
+                return 0, 0
+        stored = self._get_chunk_embeddings_from_db([item[0] for item in batch])
+        to_embed = [item for item in batch if item[0] not in stored]
+        
+        if to_embed:
+            vectors_per_chunk = self.embed_texts([item[2] for item in to_embed], [item[3] for item in to_embed], operation)
+            new_embeddings = {}
+            for item, vectors in zip(to_embed, vectors_per_chunk):
+                if vectors is not None:
+                    new_embeddings[item[0]] = vectors
+            if new_embeddings:
+                self._save_chunk_embeddings_to_db(new_embeddings)
+            stored.update(new_embeddings)
+        
+        if not stored:
+            # Lote inteiro falhou: não excluir os fragmentos, eles serão reaproveitados ao retomar
+            if failed_files is not None:
+                failed_files.update(item[3] for item in batch)
+            return 0, len(batch)
+        
+        rows = []
+        row_ids = []
+        row_hashes = []
+        row_paths = []
+        failed = 0
+        for chunk_id, chunk_hash, chunk_text, file_path in batch:
+            vectors = stored.get(chunk_id)
+            if vectors is None:
+                # Remover o fragmento se o embedding falhar
+                self._delete_chunk_from_db(chunk_id)
+                self.stats.add_chunks(file_path, -1)
+                failed += 1
+                if failed_files is not None:
+                    failed_files.add(file_path)
+                continue
+            # Uma entrada por vetor (várias no modo "multi")
+            for vector in vectors:
+                rows.append(vector)
+                row_ids.append(chunk_id)
+                row_hashes.append(chunk_hash)
+                row_paths.append(file_path)
+        
+        if rows:
+            self._add_vectors_to_index(np.vstack(rows).astype(np.float32), row_ids, row_hashes, row_paths)
+        return len(rows), failed
+    
+    def _add_vectors_to_index(self, vectors: np.ndarray, chunk_ids: List[int], chunk_hashes: List[str], file_paths: List[str] = None):
+        """Adicionar vetores ao índice (criando-o no primeiro lote) e torná-los pesquisáveis"""
+        with self.index_lock.write():
+            if self.index is None:
+                self.index = self._new_index(vectors.shape[1])
+            if isinstance(self.index, ShardedIndex):
+                file_paths = file_paths or [None] * len(chunk_ids)
+                self.index.add_with_keys(vectors, [self._shard_key(chunk_id, file_path) for chunk_id, file_path in zip(chunk_ids, file_paths)])
+            else:
+                self.index.add(vectors)
+            for position, chunk_id in enumerate(chunk_ids, start=len(self.chunk_ids)):
+                self._chunk_positions.setdefault(chunk_id, []).append(position)
+            self.chunk_ids.extend(chunk_ids)
+            self.chunk_hashes.extend(chunk_hashes)
+            self._bump_index_epoch()
+        if self.verbose:
+            self.log_verbose("info", f"Lote de {len(chunk_ids)} vetores adicionado ao índice (total: {self.index.ntotal})")
     
     def update_index(self):
-        """Atualizar o índice incrementalmente com arquivos novos/modificados"""
-        if self.is_updating:
+        """Atualizar o índice incrementalmente com arquivos novos/modificados
+        
+        Em duas etapas: _scan_for_changes percorre o vault só com os.stat e coloca os arquivos novos ou
+        alterados na fila de prioridade (work_queue); _process_work_queue lê, classifica e embeda os
+        pendentes, na ordem da fila, até esgotar update_time_budget_sec. O restante continua no próximo
+        ciclo. A reconstrução que descarta os vetores obsoletos acontece com a fila vazia ou acima de
+        stale_vector_rebuild_ratio; a gravação do índice, com a fila vazia ou a cada index_save_interval_sec.
+        """
+        if not self._update_lock.acquire(blocking=False):
             self.log_verbose("info", "Atualização já em andamento, pulando...")
             return
         
@@ -721,150 +1122,51 @@ class IndexManager:
                 self.log_always("error", f"Caminho do vault {self.vault_path} não existe")
                 return
             
-            changes = {
-                'added': [],
-                'modified': [],
-                'removed': [],
-                'unchanged': []
-            }
-            
-            current_files = set()
-            
-            # Escanear recursivamente todos os subdiretórios por arquivos suportados
             if self.verbose:
                 self.log_verbose("info", f"Escaneando diretório: {self.vault_path}")
-            
-            for root, dirs, files in os.walk(self.vault_path):
-                # Pular diretórios excluídos
-                if self.should_exclude_path(root):
-                    if self.verbose:
-                        self.log_verbose("info", f"Pulando diretório excluído: {root}")
-                    continue
-                
-                # Filtrar arquivos suportados
-                supported_files = [f for f in files if f.endswith(".md") or f.endswith(".txt") or f.endswith(".docx") or f.endswith(".xlsx") or f.endswith(".pdf")]
-                if self.verbose and supported_files:
-                    self.log_verbose("info", f"Encontrados {len(supported_files)} arquivos suportados em {root}: {supported_files}")
-                
-                for file in supported_files:
-                    
-                    file_path = os.path.join(root, file)
-                    
-                    # Pular arquivos excluídos
-                    if self.should_exclude_path(file_path):
-                        continue
-                    
-                    current_files.add(file_path)
-                    
-                    try:
-                        # Verificar primeiro a data de modificação e tamanho do arquivo (verificação rápida)
-                        stat = os.stat(file_path)
-                        file_mtime = stat.st_mtime
-                        file_size = stat.st_size
-                        
-                        # Verificar se este arquivo existe no nosso índice consultando o banco de dados
-                        file_exists = self._file_exists_in_index(file_path)
-                        
-                        if not file_exists:
-                            # Novo arquivo - ler e adicionar todos os fragmentos
-                            text = read_file(file_path)
-                            if not text.strip():
-                                if self.verbose:
-                                    self.log_verbose("warning", f"Arquivo está vazio ou falhou ao ler: {file_path}")
-                                continue
-                            
-                            if self.verbose:
-                                self.log_verbose("info", f"Arquivo lido com sucesso: {file_path} ({len(text)} caracteres)")
-                            
-                            chunks = self.chunk_text(text, file_path)
-                            changes['added'].append((file_path, chunks))
-                            if self.verbose:
-                                self.log_verbose("info", f"Adicionando: {os.path.basename(file_path)} ({len(chunks)} fragmentos)")
-                        else:
-                            # Verificar se o arquivo pode ter mudado usando a data de modificação e tamanho (verificação rápida)
-                            # Obter fragmentos existentes para este arquivo do banco de dados
-                            existing_chunks = self._get_chunks_for_file(file_path)
-                            if existing_chunks:
-                                # Obter metadados armazenados no banco de dados para comparação
-                                stored_metadata = self._get_file_metadata_from_db(file_path)
-                                
-                                if self.verbose and stored_metadata:
-                                    self.log_verbose("info", f"  Metadados recuperados do banco de dados para {os.path.basename(file_path)}: mtime={stored_metadata.get('mtime')}, size={stored_metadata.get('size')}")
-                                elif self.verbose:
-                                    self.log_verbose("info", f"  Nenhum metadado encontrado no banco de dados para {os.path.basename(file_path)}")
-                                
-                                # Verificação rápida: se a data de modificação e tamanho não mudaram, pular a leitura
-                                if (stored_metadata.get('mtime') == file_mtime and 
-                                    stored_metadata.get('size') == file_size):
-                                    changes['unchanged'].append(file_path)
-                                    if self.verbose:
-                                        self.log_verbose("info", f"  Arquivo {os.path.basename(file_path)} inalterado (mtime/size correspondem)")
-                                    continue
-                                
-                                # O arquivo pode ter mudado - ler e verificar hash
-                                text = read_file(file_path)
-                                if not text.strip():
-                                    if self.verbose:
-                                        self.log_verbose("warning", f"Arquivo está vazio ou falhou ao ler: {file_path}")
-                                    continue
-                                
-                                if self.verbose:
-                                    self.log_verbose("info", f"Arquivo lido com sucesso: {file_path} ({len(text)} caracteres)")
-                                
-                                full_file_hash = self.hash_text(text)
-
-                                # Verificar se existe um hash armazenado para este arquivo
-                                stored_hash = stored_metadata.get('hash')
-                                
-                                if stored_hash is None:
-                                    # Primeira vez vendo este arquivo, salvar metadados e assumir inalterado
-                                    if self.verbose:
-                                        self.log_verbose("info", f"  Primeira vez processando {os.path.basename(file_path)}")
-                                    self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash)
-                                    changes['unchanged'].append(file_path)
-                                elif stored_hash == full_file_hash:
-                                    # Hash do arquivo corresponde, não há mudança - atualizar metadados
-                                    self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash)
-                                    changes['unchanged'].append(file_path)
-                                    if self.verbose:
-                                        self.log_verbose("info", f"  Arquivo {os.path.basename(file_path)} inalterado (hash corresponde)")
-                                else:
-                                    # Hash do arquivo mudou, o conteúdo realmente mudou
-                                    chunks = self.chunk_text(text, file_path)
-                                    changes['modified'].append((file_path, chunks))
-                                    # Atualizar metadados armazenados
-                                    self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash)
-                                    if self.verbose:
-                                        self.log_verbose("info", f"Modificando: {os.path.basename(file_path)} ({len(chunks)} fragmentos) - hash alterado")
-                    except Exception as e:
-                        self.log_always("error", f"Erro ao processar arquivo {file_path}: {e}")
-            
-            # Encontrar arquivos removidos verificando quais arquivos no banco não estão mais em disco
-            indexed_files = self._get_all_indexed_files()
-            for file_path in indexed_files:
-                if file_path not in current_files:
-                    changes['removed'].append(file_path)
-                    # Limpar metadados do banco para arquivo removido
-                    self._cleanup_file_metadata_from_db(file_path)
-                    if self.verbose:
-                        self.log_verbose("info", f"Removendo: {os.path.basename(file_path)}")
+            deadline = time.monotonic() + self.update_time_budget_sec if self.update_time_budget_sec else None
+            rebuilt = False
+            removed = self._scan_for_changes()
+            changes = self._process_work_queue(removed, deadline)
             
             # Estratégia de atualização inteligente
-            if changes['added'] or changes['removed']:
-                # File count changed - need to rebuild
+            if self.chunk_occurrences_available:
+                # Alterações já aplicadas e embedadas por _process_work_queue; reconstruir com a fila vazia
+                # ou quando os vetores obsoletos passarem de stale_vector_rebuild_ratio do índice, para não
+                # remontar o índice inteiro a cada ciclo durante uma ingestão em massa
+                stale_ratio = self._stale_vectors / max(self.index.ntotal if self.index is not None else 0, 1)
+                if self._stale_vectors and (not len(self.work_queue) or stale_ratio >= self.stale_vector_rebuild_ratio):
+                    self.log_verbose("info", f"Reconstruindo índice para descartar {self._stale_vectors} vetores obsoletos ({stale_ratio:.0%} do índice)")
+                    self.rebuild_index()
+                    rebuilt = True
+                if changes['added'] or changes['removed'] or changes['modified']:
+                    self._index_dirty = True
+                if not changes['modified'] and not changes['added'] and not changes['removed'] and self.verbose:
+                    self.log_verbose("info", "Nenhuma alteração detectada")
+            elif changes['removed']:
+                # Arquivos removidos - o FAISS não remove vetores, reconstruir
                 if self.verbose:
                     self.log_verbose("info", f"Contagem de arquivos alterada ({len(changes['added'])} adicionados, {len(changes['removed'])} removidos) - reconstruindo índice")
                     self.log_verbose("info", f"Estado atual: {len(self.chunk_hashes)} fragmentos")
                 self._apply_changes_and_rebuild(changes)
-            elif changes['modified']:
-                # Apenas conteúdo alterado - tentar atualização incremental
-                if self.verbose:
-                    self.log_verbose("info", f"Conteúdo alterado para {len(changes['modified'])} arquivos - tentando atualização incremental")
-                self._apply_incremental_update(changes)
             else:
-                if self.verbose:
+                if changes['modified']:
+                    # Conteúdo alterado - tentar atualização incremental
+                    if self.verbose:
+                        self.log_verbose("info", f"Conteúdo alterado para {len(changes['modified'])} arquivos - tentando atualização incremental")
+                    self._apply_incremental_update(changes)
+                if changes['added']:
+                    # Arquivos novos - acrescentar os vetores sem reconstruir
+                    self._apply_additions(changes['added'])
+                if not changes['modified'] and not changes['added'] and self.verbose:
                     self.log_verbose("info", "Nenhuma alteração detectada")
             
+            # Gravação fora do orçamento do ciclo e espaçada durante a ingestão (ver _save_index_if_due)
+            self._save_index_if_due(force=rebuilt)
+            
+            if changes['added'] or changes['removed'] or changes['modified']:
+                self._bump_index_epoch()
+            
             self.last_update = datetime.now()
             
             # Sincronizar metadados de documentos com o banco de dados após atualização do índice
@@ -876,52 +1178,446 @@ class IndexManager:
             self.log_always("error", f"Erro ao atualizar índice: {e}")
         finally:
             self.is_updating = False
+            self._update_lock.release()
     
-    def _apply_changes_and_rebuild(self, changes):
-        """Aplicar alterações de arquivos e reconstruir o índice inteiro"""
+    def _read_file_cached(self, file_path: str, fingerprint: str = None) -> str:
+        """Ler o texto do arquivo, usando o cache de texto extraído para os formatos de extração cara
+        
+        fingerprint: impressão já calculada do arquivo (reaproveitada como chave se for exata)
+        """
+        if self.text_cache is None or not file_path.lower().endswith(CACHED_EXTENSIONS):
+            return read_file(file_path)
+        if not is_exact(fingerprint):
+            try:
+                fingerprint = file_fingerprint(file_path, self.fingerprint_algorithm)
+            except OSError:
+                return read_file(file_path)
+        text = self.text_cache.get(fingerprint)
+        if text is not None:
+            self.log_verbose("info", f"Texto de {os.path.basename(file_path)} obtido do cache (bytes inalterados)")
+            return text
+        text = read_file(file_path)
+        if text.strip():
+            try:
+                self.text_cache.put(fingerprint, text)
+            except OSError as e:
+                self.log_always("warning", f"Erro ao gravar cache de texto de {file_path}: {e}")
+        return text
+    
+    def _ensure_file_fingerprint_column(self):
+        """Adicionar a coluna raw_fingerprint a file_metadata (impressão dos bytes brutos do arquivo)"""
+        from sqlalchemy import text
+        
+        def setup(session):
+            columns = [row[1] for row in session.execute(text("PRAGMA table_info(file_metadata)"))]
+            if not columns:
+                return False  # Tabela ainda não criada pela aplicação
+            if "raw_fingerprint" not in columns:
+                session.execute(text("ALTER TABLE file_metadata ADD COLUMN raw_fingerprint TEXT"))
+                self.log_always("info", "Coluna raw_fingerprint adicionada a file_metadata")
+            return True
+        
+        self.file_fingerprint_available = bool(self._run_sql(setup, commit=True, default=False))
+    
+    def _fingerprint_file(self, file_path: str) -> Optional[str]:
+        """Impressão dos bytes do arquivo com o algoritmo e a amostragem configurados (None se ilegível)"""
         try:
-            # Criar novas listas em vez de modificar as existentes para evitar problemas de índice
-            new_chunk_hashes = []
-            new_chunk_ids = []
-            
-            # Começar com fragmentos existentes que não serão modificados ou removidos
-            files_to_remove = set(changes['removed'] + [fp for fp, _ in changes['modified']])
+            return file_fingerprint(file_path, self.fingerprint_algorithm, self.fingerprint_sample_threshold)
+        except OSError as e:
+            self.log_verbose("warning", f"Não foi possível calcular a impressão de {file_path}: {e}")
+            return None
+    
+    def _get_file_fingerprint(self, file_path: str) -> Optional[str]:
+        """Impressão dos bytes guardada na última indexação do arquivo"""
+        if not self.file_fingerprint_available:
+            return None
+        from sqlalchemy import text
+        return self._run_sql(lambda session: session.execute(
+            text("SELECT raw_fingerprint FROM file_metadata WHERE file_path = :file_path"), {"file_path": file_path}
+        ).scalar())
+    
+    def _set_file_fingerprint(self, file_path: str, raw_fingerprint: str):
+        """Guardar a impressão dos bytes no registro de file_metadata do arquivo"""
+        if not self.file_fingerprint_available:
+            return
+        from sqlalchemy import text
+        self._run_sql(lambda session: session.execute(
+            text("UPDATE file_metadata SET raw_fingerprint = :raw_fingerprint WHERE file_path = :file_path"),
+            {"file_path": file_path, "raw_fingerprint": raw_fingerprint}
+        ), commit=True)
+    
+    def _ensure_file_failures(self):
+        """Criar a tabela index_file_failures e carregar os caminhos registrados"""
+        self.file_failures_available = bool(self._run_sql(
+            lambda session: ensure_failures_table(session) or True, commit=True, default=False
+        ))
+        self._load_file_failures()
+    
+    def _load_file_failures(self) -> Dict[str, tuple]:
+        """Registros de arquivos vazios/ilegíveis: {caminho: (mtime, tamanho, próxima tentativa)}"""
+        if not self.file_failures_available:
+            return {}
+        failures = self._run_sql(load_failures, default={})
+        self._failed_files = set(failures)
+        return failures
+    
+    def _skip_failed_file(self, file_path: str, failures: Dict[str, tuple]) -> bool:
+        """Se o arquivo registrado como vazio/ilegível deve continuar sendo ignorado"""
+        entry = failures.get(file_path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        return should_skip(entry, stat.st_mtime, stat.st_size)
+    
+    def _record_file_failure(self, file_path: str, reason: str = None, error: str = None, mtime: float = None, size: int = None):
+        """Registrar que o arquivo não produziu texto (ou falhou); reason padrão: empty_file ou no_text pelo tamanho"""
+        if not self.file_failures_available:
+            return
+        if mtime is None or size is None:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return
+            mtime, size = stat.st_mtime, stat.st_size
+        if reason is None:
+            reason = REASON_EMPTY_FILE if size == 0 else REASON_NO_TEXT
+        row = self._run_sql(lambda session: record_failure(
+            session, file_path, mtime, size, reason, error,
+            self.failed_file_retry_base_sec, self.failed_file_retry_max_sec
+        ), commit=True)
+        if row:
+            self._failed_files.add(file_path)
+            self.log_verbose("warning", f"Arquivo {os.path.basename(file_path)} registrado como '{reason}' (tentativa {row['attempts']}, próxima em {row['next_attempt_at']:%Y-%m-%d %H:%M} UTC)")
+    
+    def _clear_file_failure(self, file_path: str):
+        """Remover o registro de falha de um arquivo que voltou a ser lido com sucesso"""
+        if file_path in self._failed_files:
+            self._run_sql(lambda session: clear_failure(session, file_path), commit=True)
+            self._failed_files.discard(file_path)
+    
+    def get_failed_files(self) -> List[Dict]:
+        """Arquivos vazios ou ilegíveis ignorados pela indexação, com motivo e próxima tentativa (administração)"""
+        if not self.file_failures_available:
+            return []
+        return self._run_sql(list_failures, default=[])
+    
+    def retry_failed_files(self, file_path: str = None):
+        """Esquecer as falhas registradas (de um arquivo ou de todos) para que sejam relidos no próximo ciclo"""
+        if not self.file_failures_available:
+            return
+        from sqlalchemy import text
+        if file_path:
+            self._run_sql(lambda session: clear_failure(session, file_path), commit=True)
+            self._failed_files.discard(file_path)
+        else:
+            self._run_sql(lambda session: session.execute(text("DELETE FROM index_file_failures")), commit=True)
+            self._failed_files = set()
+    
+    def _scan_for_changes(self) -> List[str]:
+        """Percorrer o vault só com os.stat: enfileirar arquivos novos ou alterados e retornar os removidos"""
+        indexed_files = set(self._get_all_indexed_files())
+        failures = self._load_file_failures()
+        current_files = set()
+        
+        for file_path in self._iter_indexable_files():
+            current_files.add(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError as e:
+                self.log_always("error", f"Erro ao processar arquivo {file_path}: {e}")
+                continue
             
-            # Remover fragmentos antigos do banco antes de adicionar novos
-            for file_path in files_to_remove:
-                self._remove_chunks_for_file(file_path)
+            # Vazio ou ilegível e ainda igual ao da última tentativa: não reler antes da hora
+            if should_skip(failures.get(file_path), stat.st_mtime, stat.st_size):
+                continue
             
-            # Adicionar novos fragmentos de arquivos adicionados
-            for file_path, chunks in changes['added']:
-                for chunk_text, chunk_meta in chunks:
-                    chunk_hash = self.hash_text(chunk_text)
-                    chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash)
-                    if chunk_id is not None:
-                        new_chunk_hashes.append(chunk_hash)
-                        new_chunk_ids.append(chunk_id)
+            if file_path in indexed_files:
+                # Verificação rápida: se a data de modificação e tamanho não mudaram, não há o que fazer
+                stored_metadata = self._get_file_metadata_from_db(file_path)
+                if (stored_metadata.get('mtime') == stat.st_mtime and
+                    stored_metadata.get('size') == stat.st_size):
+                    continue
+            self.work_queue.push(file_path, stat.st_mtime, stat.st_size)
+        
+        if failures and self._run_sql(lambda session: prune_failures(session, current_files, failures), commit=True):
+            self._failed_files &= current_files
+        
+        # Arquivos no banco que não estão mais em disco
+        removed = [file_path for file_path in indexed_files if file_path not in current_files]
+        for file_path in removed:
+            self.work_queue.discard(file_path)
+            # Limpar metadados do banco para arquivo removido
+            self._cleanup_file_metadata_from_db(file_path)
+            if self.verbose:
+                self.log_verbose("info", f"Removendo: {os.path.basename(file_path)}")
+        return removed
+    
+    def _process_work_queue(self, removed: List[str], deadline: float = None) -> Dict:
+        """Ler e classificar os arquivos pendentes, por prioridade, até o prazo (time.monotonic; None = sem limite)
+        
+        Com a tabela de ocorrências, as alterações são aplicadas dentro do mesmo prazo: remoções primeiro, e
+        arquivos novos ou modificados embedados em lotes de index_batch_size fragmentos à medida que são
+        classificados. O que não couber no prazo continua na fila (passa do prazo no máximo um lote).
+        Sem ela, apenas classifica; update_index aplica as alterações depois.
+        """
+        changes = {
+            'added': [],
+            'modified': [],
+            'removed': list(removed),
+            'unchanged': []
+        }
+        apply_now = self.chunk_occurrences_available
+        if apply_now and changes['removed']:
+            self._apply_removals(changes['removed'])
+        
+        batch = {'added': [], 'modified': [], 'removed': [], 'unchanged': changes['unchanged']}
+        
+        def flush():
+            if apply_now:
+                self._apply_file_changes(batch['added'], batch['modified'])
+            changes['added'].extend(batch['added'])
+            changes['modified'].extend(batch['modified'])
+            batch['added'] = []
+            batch['modified'] = []
+        
+        while deadline is None or time.monotonic() < deadline:
+            item = self.work_queue.pop()
+            if item is None:
+                break
+            file_path, file_mtime, file_size = item
+            try:
+                self._classify_file_change(file_path, file_mtime, file_size, batch)
+            except Exception as e:
+                self.log_always("error", f"Erro ao processar arquivo {file_path}: {e}")
+                self._record_file_failure(file_path, REASON_ERROR, str(e), file_mtime, file_size)
+            if sum(len(chunks) for _, chunks in batch['added'] + batch['modified']) >= self.index_batch_size:
+                flush()
+        flush()
+        
+        if len(self.work_queue):
+            self.log_verbose("info", f"Orçamento de tempo esgotado; {len(self.work_queue)} arquivos continuam na fila de indexação")
+        return changes
+    
+    def _classify_file_change(self, file_path: str, file_mtime: float, file_size: int, changes: Dict):
+        """Ler um arquivo da fila e registrá-lo em changes como adicionado, modificado ou inalterado
+        
+        Verificação primária: impressão dos bytes brutos igual à da última indexação → inalterado, sem
+        extrair o texto. Só quando os bytes mudaram o texto é extraído e o hash do texto é comparado.
+        """
+        fingerprint = self._fingerprint_file(file_path)
+        file_exists = self._file_exists_in_index(file_path)
+        stored_metadata = self._get_file_metadata_from_db(file_path) if file_exists else {}
+        stored_hash = stored_metadata.get('hash')
+        
+        if file_exists and fingerprint and stored_hash and fingerprint == self._get_file_fingerprint(file_path):
+            # Mesmos bytes (ex.: arquivo apenas tocado): atualizar mtime/tamanho e seguir
+            self._save_file_metadata_to_db(file_path, file_mtime, file_size, stored_hash, fingerprint)
+            changes['unchanged'].append(file_path)
+            if self.verbose:
+                self.log_verbose("info", f"  Arquivo {os.path.basename(file_path)} inalterado (bytes idênticos)")
+            return
+        
+        text = self._read_file_cached(file_path, fingerprint)
+        if not text.strip():
+            if self.verbose:
+                self.log_verbose("warning", f"Arquivo está vazio ou falhou ao ler: {file_path}")
+            self._record_file_failure(file_path, mtime=file_mtime, size=file_size)
+            return
+        
+        if self.verbose:
+            self.log_verbose("info", f"Arquivo lido com sucesso: {file_path} ({len(text)} caracteres)")
+        self._clear_file_failure(file_path)
+        
+        full_file_hash = self.hash_text(text)
+        
+        if not file_exists:
+            # Novo arquivo - adicionar todos os fragmentos
+            chunks = self.chunk_text(text, file_path)
+            changes['added'].append((file_path, chunks))
+            self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash, fingerprint)
+            if self.verbose:
+                self.log_verbose("info", f"Adicionando: {os.path.basename(file_path)} ({len(chunks)} fragmentos)")
+            return
+        
+        # Verificação secundária: hash do texto extraído
+        if stored_hash is None:
+            # Primeira vez vendo este arquivo, salvar metadados e assumir inalterado
+            if self.verbose:
+                self.log_verbose("info", f"  Primeira vez processando {os.path.basename(file_path)}")
+            self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash, fingerprint)
+            changes['unchanged'].append(file_path)
+        elif stored_hash == full_file_hash:
+            # Hash do texto corresponde (bytes mudaram, texto não) - atualizar metadados
+            self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash, fingerprint)
+            changes['unchanged'].append(file_path)
+            if self.verbose:
+                self.log_verbose("info", f"  Arquivo {os.path.basename(file_path)} inalterado (hash corresponde)")
+        else:
+            # Hash do arquivo mudou, o conteúdo realmente mudou
+            chunks = self.chunk_text(text, file_path)
+            changes['modified'].append((file_path, chunks))
+            # Atualizar metadados armazenados
+            self._save_file_metadata_to_db(file_path, file_mtime, file_size, full_file_hash, fingerprint)
+            if self.verbose:
+                self.log_verbose("info", f"Modificando: {os.path.basename(file_path)} ({len(chunks)} fragmentos) - hash alterado")
+    
+    def _apply_additions(self, added: List[Tuple[str, List[Tuple[str, Dict]]]]):
+        """Indexar arquivos novos acrescentando os vetores ao índice em lotes, sem reconstrução"""
+        self._apply_file_changes(added)
+        self._index_dirty = True
+    
+    def _apply_file_changes(self, added: List[Tuple[str, List[Tuple[str, Dict]]]],
+                            modified: List[Tuple[str, List[Tuple[str, Dict]]]] = ()) -> int:
+        """Salvar os fragmentos de arquivos novos e modificados e acrescentar os vetores novos ao índice
+        
+        Nos modificados, os fragmentos antigos sem outras referências são liberados e seus vetores marcados
+        como obsoletos (_mark_stale_vectors), sem reconstruir o índice. Retorna o número de vetores acrescentados.
+        """
+        queued_ids = set(self.chunk_ids)  # Conteúdo já indexado (compartilhado com outro arquivo) não é repetido
+        pending = []
+        added_vectors = 0
+        replaced_ids = set()
+        failed_files = set()
+        modified_paths = {file_path for file_path, _ in modified}
+        for file_path, chunks in list(modified) + list(added):
+            is_modified = file_path in modified_paths
+            previous_ids = self._file_chunk_ids(file_path) if is_modified else set()
+            self.stats.set_file(file_path, len(chunks))
+            for position, (chunk_text, chunk_meta) in enumerate(chunks):
+                chunk_hash = self.hash_text(chunk_text)
+                chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash, position)
+                if chunk_id is None:
+                    self.log_always("error", f"Falha ao salvar fragmento para {os.path.basename(file_path)}")
+                    self.stats.add_chunks(file_path, -1)
+                    continue
+                if chunk_id in queued_ids:
+                    continue
+                queued_ids.add(chunk_id)
+                pending.append((chunk_id, chunk_hash, chunk_text, file_path))
+                if len(pending) >= self.index_batch_size:
+                    added_vectors += self._embed_and_add_batch(pending, "update", failed_files)[0]
+                    pending = []
+            if is_modified:
+                # Liberar os fragmentos antigos do arquivo que deixaram de ser referenciados
+                self._release_chunk_occurrences(file_path, len(chunks), previous_ids)
+                replaced_ids.update(previous_ids)
+        if pending:
+            added_vectors += self._embed_and_add_batch(pending, "update", failed_files)[0]
+        for file_path in failed_files:
+            replaced_ids.update(self._discard_unembedded_file(file_path))
+        stale = self._mark_stale_vectors(replaced_ids)
+        
+        if added or modified:
+            self.log_verbose("success", f"{len(added)} arquivos novos e {len(modified)} modificados indexados ({added_vectors} vetores, {stale} obsoletos)")
+        return added_vectors
+    
+    def _discard_unembedded_file(self, file_path: str) -> set:
+        """Desfazer a indexação de um arquivo com fragmentos sem embedding (ex.: API fora do ar)
+        
+        Os metadados (hash, mtime/tamanho, impressão) já foram gravados na classificação; sem desfazer, a
+        próxima varredura o daria como inalterado e ele ficaria sem vetores. Remove os fragmentos e os
+        metadados e registra a falha: o arquivo volta à fila após o intervalo de espera. Retorna os ids
+        dos fragmentos que o arquivo referenciava (para marcar vetores obsoletos).
+        """
+        chunk_ids = self._file_chunk_ids(file_path)
+        self._remove_chunks_for_file(file_path)
+        self._cleanup_file_metadata_from_db(file_path)
+        self._record_file_failure(file_path, REASON_ERROR, "Falha ao criar embeddings dos fragmentos")
+        self.log_always("warning", f"Embeddings de {os.path.basename(file_path)} falharam; arquivo volta à fila de indexação após o intervalo de espera")
+        return chunk_ids
+    
+    def _apply_removals(self, removed: List[str]):
+        """Remover os fragmentos de arquivos apagados e marcar seus vetores como obsoletos, sem reconstruir o índice"""
+        removed_ids = set()
+        for file_path in removed:
+            removed_ids.update(self._file_chunk_ids(file_path))
+            self._remove_chunks_for_file(file_path)
+        stale = self._mark_stale_vectors(removed_ids)
+        self.log_verbose("info", f"{len(removed)} arquivos removidos ({stale} vetores obsoletos até a próxima reconstrução)")
+    
+    def _mark_stale_vectors(self, candidate_ids: set) -> int:
+        """Marcar como obsoletos os vetores dos fragmentos candidatos que não existem mais no banco
+        
+        O FAISS não remove vetores de forma barata: as posições recebem STALE_CHUNK_ID e deixam de aparecer
+        nas buscas; rebuild_index as descarta. Retorna o número de vetores marcados.
+        """
+        if not candidate_ids:
+            return 0
+        from sqlalchemy import text
+        
+        def existing(session):
+            ids = list(candidate_ids)
+            found = set()
+            for start in range(0, len(ids), 500):
+                group = ids[start:start + 500]
+                placeholders = ", ".join(f":id{i}" for i in range(len(group)))
+                found.update(row[0] for row in session.execute(
+                    text(f"SELECT id FROM text_chunks WHERE id IN ({placeholders})"),
+                    {f"id{i}": chunk_id for i, chunk_id in enumerate(group)}
+                ))
+            return found
+        
+        found = self._run_sql(existing, default=None)
+        if found is None:
+            return 0
+        gone = [chunk_id for chunk_id in candidate_ids if chunk_id not in found and chunk_id in self._chunk_positions]
+        if not gone:
+            return 0
+        
+        marked = 0
+        with self.index_lock.write():
+            for chunk_id in gone:
+                for position in self._chunk_positions.pop(chunk_id, ()):
+                    self.chunk_ids[position] = STALE_CHUNK_ID
+                    marked += 1
+            self._stale_vectors += marked
+            self._bump_index_epoch()
+        return marked
+    
+    def _apply_changes_and_rebuild(self, changes):
+        """Aplicar alterações de arquivos e reconstruir o índice inteiro"""
+        try:
+            # Criar novas listas em vez de modificar as existentes para evitar problemas de índice
+            new_chunk_hashes = []
+            new_chunk_ids = []
+            
+            # Começar com fragmentos existentes que não serão modificados ou removidos
+            files_to_remove = set(changes['removed'] + [fp for fp, _ in changes['modified']])
+            
+            # Remover fragmentos antigos do banco antes de adicionar novos
+            for file_path in files_to_remove:
+                self._remove_chunks_for_file(file_path)
+            
+            # Adicionar novos fragmentos de arquivos adicionados
+            for file_path, chunks in changes['added']:
+                for position, (chunk_text, chunk_meta) in enumerate(chunks):
+                    chunk_hash = self.hash_text(chunk_text)
+                    chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash, position)
+                    if chunk_id is not None:
+                        new_chunk_hashes.append(chunk_hash)
+                        new_chunk_ids.append(chunk_id)
                     else:
                         self.log_always("error", f"Falha ao salvar fragmento para {os.path.basename(file_path)} durante reconstrução")
+                self.stats.set_file(file_path, len(chunks))
             
             # Adicionar novos fragmentos de arquivos modificados
             for file_path, chunks in changes['modified']:
-                for chunk_text, chunk_meta in chunks:
+                for position, (chunk_text, chunk_meta) in enumerate(chunks):
                     chunk_hash = self.hash_text(chunk_text)
-                    chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash)
+                    chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash, position)
                     if chunk_id is not None:
                         new_chunk_hashes.append(chunk_hash)
                         new_chunk_ids.append(chunk_id)
                     else:
                         self.log_always("error", f"Falha ao salvar fragmento para {os.path.basename(file_path)} durante reconstrução")
+                self.stats.set_file(file_path, len(chunks))
             
-            # Substituir as listas antigas pelas novas
-            self.chunk_hashes = new_chunk_hashes
-            self.chunk_ids = new_chunk_ids
-            
-            # Garantir consistência
-            self._ensure_list_consistency()
-            
+            # As listas e o índice atuais continuam servindo buscas; rebuild_index publica os novos de uma vez
             if self.verbose:
-                self.log_verbose("info", f"Estruturas de dados reconstruídas: {len(self.chunk_hashes)} fragmentos")
+                self.log_verbose("info", f"Fragmentos novos ou alterados salvos: {len(new_chunk_ids)}")
             
             # Reconstruir o índice inteiro
             self.rebuild_index()
@@ -940,21 +1636,21 @@ class IndexManager:
         
         for file_path, chunks in changes['modified']:
             try:
+                previous_ids = self._file_chunk_ids(file_path) if self.chunk_occurrences_available else set()
                 # Adicionar novos fragmentos
-                for chunk_text, chunk_meta in chunks:
+                for position, (chunk_text, chunk_meta) in enumerate(chunks):
                     chunk_hash = self.hash_text(chunk_text)
-                    chunk_id = self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash)
-                    if chunk_id is not None:
-                        self.chunk_hashes.append(chunk_hash)
-                        self.chunk_ids.append(chunk_id)
+                    self._save_chunk_to_db(chunk_text, file_path, chunk_meta, chunk_hash, position)
+                if self.chunk_occurrences_available:
+                    # Liberar os fragmentos antigos do arquivo que deixaram de ser referenciados
+                    self._release_chunk_occurrences(file_path, len(chunks), previous_ids)
+                self.stats.set_file(file_path, len(chunks))
                 
                 updated_count += 1
             except Exception as e:
                 self.log_always("error", f"Erro ao atualizar {os.path.basename(file_path)}: {e}")
         
         if updated_count > 0:
-            # Garantir consistência após todas as atualizações
-            self._ensure_list_consistency()
             # Precisamos reconstruir porque o FAISS não atualiza vetores individuais
             self.log_verbose("info", f"Reconstruindo índice para {updated_count} arquivos modificados")
             self.rebuild_index()
@@ -967,11 +1663,7 @@ class IndexManager:
         """Método de recuperação quando a reconstrução normal falha"""
         try:
             self.log_always("info", "Iniciando recuperação de reconstrução completa...")
-            # Limpar todas as estruturas de dados
-            self.chunk_hashes = []
-            self.chunk_ids = []
-            
-            # Recriar índice do zero
+            # Recriar índice do zero (create_new_index limpa as estruturas de dados)
             self.create_new_index()
             self.log_always("success", "Recuperação de reconstrução completa concluída")
         except Exception as e:
@@ -984,129 +1676,1367 @@ class IndexManager:
                 self.log_always("error", f"Falha ao carregar índice salvo: {load_error}")
                 self.log_always("error", "Gerenciador de índice está em estado inconsistente. Intervenção manual pode ser necessária.")
     
-    def rebuild_index(self):
-        """Reconstruir todo o índice FAISS a partir de todos os fragmentos no banco"""
-        self.log_always("info", "Reconstruindo índice FAISS do banco de dados...")
+    def rebuild_index(self):
+        """Reconstruir todo o índice FAISS a partir de todos os fragmentos no banco
+        
+        O novo índice é montado à parte e publicado de uma vez: as buscas continuam usando o índice
+        atual até a troca. Embeddings já armazenados em text_chunks são reaproveitados e os demais
+        são criados em lotes. Com shards, apenas os shards cujos fragmentos mudaram são remontados.
+        """
+        self.log_always("info", "Reconstruindo índice FAISS do banco de dados...")
+        
+        # Obter todos os fragmentos do banco de dados em vez de depender de self.chunk_hashes
+        all_chunks = self._get_all_chunks_from_db()
+        
+        if not all_chunks:
+            self.log_always("warning", "Nenhum fragmento encontrado no banco de dados para reconstrução")
+            return
+        
+        self.log_verbose("info", f"Encontrados {len(all_chunks)} fragmentos no banco de dados, reconstruindo índice...")
+        
+        # Quase duplicados não entram no índice; grupos que perderam o representante elegem outro
+        self._repair_near_duplicate_clusters()
+        members = self._near_duplicate_members([chunk[0] for chunk in all_chunks])
+        
+        valid_chunks = []
+        for chunk_id, chunk_text, chunk_meta in all_chunks:
+            if chunk_id in members:
+                continue
+            if chunk_text is not None:
+                valid_chunks.append((chunk_id, chunk_text, chunk_meta))
+            else:
+                self.log_always("error", f"Falha ao recuperar fragmento {chunk_id} para reconstrução")
+        
+        if self.shard_strategy:
+            self._rebuild_shards(valid_chunks)
+            return
+        
+        embeddings = self._embeddings_for_rebuild(valid_chunks)
+        
+        # Montar as novas listas e o novo índice fora das estruturas em uso
+        new_chunk_hashes = []
+        new_chunk_ids = []
+        rows = []
+        for chunk_id, chunk_text, chunk_meta in valid_chunks:
+            vectors = embeddings.get(chunk_id)
+            if vectors is None:
+                self.log_always("error", f"Falha ao criar embedding do fragmento {chunk_id} durante reconstrução")
+                continue
+            # Gerar hash para este fragmento; uma entrada por vetor (várias no modo "multi")
+            chunk_hash = self.hash_text(chunk_text)
+            for vector in vectors:
+                new_chunk_hashes.append(chunk_hash)
+                new_chunk_ids.append(chunk_id)
+                rows.append(vector)
+        
+        if rows:
+            new_index = faiss.IndexFlatL2(len(rows[0]))
+            new_index.add(np.vstack(rows).astype(np.float32))
+            self._publish_index(new_index, new_chunk_ids, new_chunk_hashes)
+            self.log_always("success", f"Índice FAISS reconstruído com {len(rows)} fragmentos")
+        else:
+            self.log_always("warning", "Nenhum embedding criado durante reconstrução")
+    
+    def _embeddings_for_rebuild(self, chunks: List[Tuple[int, str, Dict]]) -> Dict[int, np.ndarray]:
+        """Embeddings dos fragmentos: reaproveitar os armazenados e criar os que faltam em lotes"""
+        embeddings = self._get_chunk_embeddings_from_db([chunk_id for chunk_id, _, _ in chunks])
+        missing = [item for item in chunks if item[0] not in embeddings]
+        if self.verbose:
+            self.log_verbose("info", f"{len(embeddings)} embeddings reaproveitados, {len(missing)} a criar")
+        for start in range(0, len(missing), self.index_batch_size):
+            batch = missing[start:start + self.index_batch_size]
+            vectors_per_chunk = self.embed_texts(
+                [chunk_text for _, chunk_text, _ in batch],
+                [chunk_meta.get('file_path') for _, _, chunk_meta in batch],
+                "rebuild"
+            )
+            new_embeddings = {item[0]: vectors for item, vectors in zip(batch, vectors_per_chunk) if vectors is not None}
+            if new_embeddings:
+                self._save_chunk_embeddings_to_db(new_embeddings)
+                embeddings.update(new_embeddings)
+        return embeddings
+    
+    def _rebuild_shards(self, valid_chunks: List[Tuple[int, str, Dict]]):
+        """Reconstruir apenas os shards cujo conjunto de fragmentos mudou e publicar o índice recomposto"""
+        current = self.index if self._index_layout_matches(self.index) and isinstance(self.index, ShardedIndex) else None
+        
+        groups = {}
+        for item in valid_chunks:
+            groups.setdefault(self._shard_key(item[0], item[2].get('file_path')), []).append(item)
+        
+        # Um shard muda quando seus pares (id, hash) no banco diferem dos que estão no índice
+        changed = set()
+        for key, items in groups.items():
+            if current is None or key not in current.shard_positions:
+                changed.add(key)
+                continue
+            indexed = {(self.chunk_ids[position], self.chunk_hashes[position]) for position in current.shard_positions[key]}
+            if indexed != {(chunk_id, self.hash_text(chunk_text)) for chunk_id, chunk_text, _ in items}:
+                changed.add(key)
+        removed = set(current.shard_positions) - set(groups) if current is not None else set()
+        
+        if not changed and not removed:
+            self.log_verbose("info", "Nenhum shard alterado")
+            return
+        
+        embeddings = self._embeddings_for_rebuild([item for key in changed for item in groups[key]])
+        
+        # Recompor as listas na ordem dos shards; shards inalterados reaproveitam o índice em uso
+        new_index = None
+        new_chunk_ids = []
+        new_chunk_hashes = []
+        for key in sorted(groups):
+            if key in changed:
+                shard_ids = []
+                shard_hashes = []
+                rows = []
+                for chunk_id, chunk_text, chunk_meta in groups[key]:
+                    vectors = embeddings.get(chunk_id)
+                    if vectors is None:
+                        self.log_always("error", f"Falha ao criar embedding do fragmento {chunk_id} durante reconstrução")
+                        continue
+                    chunk_hash = self.hash_text(chunk_text)
+                    for vector in vectors:
+                        shard_ids.append(chunk_id)
+                        shard_hashes.append(chunk_hash)
+                        rows.append(vector)
+                if not rows:
+                    continue
+                shard_index = faiss.IndexFlatL2(len(rows[0]))
+                shard_index.add(np.vstack(rows).astype(np.float32))
+                dirty = True
+            else:
+                positions = current.shard_positions[key]
+                shard_ids = [self.chunk_ids[position] for position in positions]
+                shard_hashes = [self.chunk_hashes[position] for position in positions]
+                shard_index = current.shards[key]
+                dirty = key in current.dirty
+            
+            if new_index is None:
+                new_index = self._new_index(shard_index.d)
+            start = len(new_chunk_ids)
+            new_index.attach_shard(key, shard_index, range(start, start + len(shard_ids)), dirty=dirty)
+            new_chunk_ids.extend(shard_ids)
+            new_chunk_hashes.extend(shard_hashes)
+        
+        if new_index is None:
+            self.log_always("warning", "Nenhum embedding criado durante reconstrução")
+            return
+        self._publish_index(new_index, new_chunk_ids, new_chunk_hashes)
+        self.log_always("success", f"Índice FAISS reconstruído com {len(new_chunk_ids)} fragmentos ({len(changed)} shards regravados, {len(removed)} removidos)")
+    
+    def _new_index(self, d: int):
+        """Criar índice vazio conforme a configuração: IndexFlatL2 único ou particionado em shards"""
+        if self.shard_strategy:
+            return ShardedIndex(d, self.shard_strategy, self.num_shards, self.shard_search_workers)
+        return faiss.IndexFlatL2(d)
+    
+    def _shard_key(self, chunk_id: int, file_path: Optional[str]) -> str:
+        """Shard de um fragmento conforme a estratégia configurada"""
+        return shard_key(self.shard_strategy, self.num_shards, chunk_id, file_path, self.vault_path)
+    
+    def _index_layout_matches(self, index) -> bool:
+        """Verificar se o índice carregado segue a configuração de shards atual"""
+        if index is None:
+            return True
+        if not isinstance(index, ShardedIndex):
+            return not self.shard_strategy
+        if index.strategy != self.shard_strategy:
+            return False
+        return index.strategy != "hash" or index.num_shards == self.num_shards
+    
+    def _publish_index(self, index, chunk_ids: List[int], chunk_hashes: List[str]):
+        """Trocar índice e listas de uma vez, sob a trava de escrita, para que buscas vejam um estado consistente"""
+        with self.index_lock.write():
+            self.index = index
+            self.chunk_ids = chunk_ids
+            self.chunk_hashes = chunk_hashes
+            self._rebuild_chunk_positions()
+            self._bump_index_epoch()
+    
+    def _rebuild_chunk_positions(self):
+        """Recalcular o mapa ID do fragmento -> posições no índice a partir de chunk_ids"""
+        positions = {}
+        stale = 0
+        for position, chunk_id in enumerate(self.chunk_ids):
+            if chunk_id == STALE_CHUNK_ID:
+                stale += 1
+                continue
+            positions.setdefault(chunk_id, []).append(position)
+        self._chunk_positions = positions
+        self._stale_vectors = stale
+    
+    def _bump_index_epoch(self):
+        """Incrementar a época do índice, invalidando os resultados de busca em cache"""
+        self.index_epoch += 1
+        self.search_cache.clear()
+    
+    def save_index(self):
+        """Salvar índice em arquivo"""
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with self.index_lock.read():
+            index = self.index
+            if isinstance(index, ShardedIndex):
+                # Apenas os shards alterados são regravados; o arquivo principal guarda ids e a composição
+                index.save_shards(self.shard_dir)
+                index = index.manifest()
+            elif os.path.isdir(self.shard_dir):
+                shutil.rmtree(self.shard_dir, ignore_errors=True)
+            data = {
+                "index": index,
+                "chunk_hashes": self.chunk_hashes, # Salvar no arquivo de índice
+                "chunk_ids": self.chunk_ids, # Salvar no arquivo de índice
+                "last_update": self.last_update,
+                "stats": self.stats.to_dict()
+            }
+            serialized = pickle.dumps(data)
+        with open(self.index_path, "wb") as f:
+            f.write(serialized)
+        self._index_dirty = False
+        self._last_index_save = time.monotonic()
+    
+    def _save_index_if_due(self, force: bool = False) -> bool:
+        """Gravar o índice alterado se a fila esvaziou ou se passou index_save_interval_sec da última gravação
+        
+        Serializar o índice inteiro a cada ciclo consumiria boa parte do orçamento de uma ingestão em massa.
+        Uma queda antes da gravação perde no máximo os vetores desse intervalo. Retorna se gravou.
+        """
+        if not self._index_dirty:
+            return False
+        if not (force or not len(self.work_queue) or time.monotonic() - self._last_index_save >= self.index_save_interval_sec):
+            return False
+        self.save_index()
+        return True
+    
+    def search(self, query: str, k: int = 3, mode: str = None, search_terms: List[str] = None, filters: Dict = None) -> List[Dict]:
+        """Buscar documentos similares e retornar informações dos fragmentos
+        
+        mode: "vector" (FAISS) ou "hybrid" (FAISS + BM25 do FTS5, combinados por reciprocal-rank fusion);
+        o padrão é SEARCH_CONFIG["search_mode"]. search_terms são termos exatos (CNPJ, frases entre aspas)
+        buscados como frases no modo híbrido.
+        filters: restringe a busca a um subconjunto de arquivos, com as chaves opcionais
+        "folder" (pasta relativa ao vault ou absoluta), "file_types" (ex.: ["pdf", "docx"]),
+        "modified_after" (datetime ou ISO) e "file_paths" (lista de arquivos).
+        """
+        mode = mode or self.search_mode
+        if self.index is None or not self.chunk_hashes:
+            return []
+        
+        # Consultas repetidas (continuações, regenerações) são servidas do cache enquanto o índice não mudar
+        cache_key = make_cache_key(query, k, mode, search_terms, filters, self.index_epoch)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            if self.verbose:
+                self.log_verbose("info", f"Resultados da busca servidos do cache ({len(cached)} fragmentos)")
+            return cached
+        
+        results = self._search_uncached(query, k, mode, search_terms, filters)
+        if results:
+            self.search_cache.put(cache_key, results)
+        return results
+    
+    def _search_uncached(self, query: str, k: int, mode: str, search_terms: List[str] = None, filters: Dict = None) -> List[Dict]:
+        """Executar a busca (embedding, FAISS e leitura dos fragmentos) sem consultar o cache"""
+        # Resolver filtros para o conjunto de fragmentos permitidos antes de gastar um embedding
+        allowed_chunk_ids = self._resolve_filter_chunk_ids(filters) if filters else None
+        if allowed_chunk_ids is not None and not allowed_chunk_ids:
+            return []
+        
+        query_emb = self.embed_text(query)
+        if query_emb is None:
+            return []
+        
+        return self._search_with_embedding(query, query_emb, k, mode, search_terms, allowed_chunk_ids)
+    
+    async def asearch(self, query: str, k: int = 3, mode: str = None, search_terms: List[str] = None, filters: Dict = None) -> List[Dict]:
+        """Versão assíncrona de search: o embedding usa AsyncOpenAI e o trabalho de FAISS/banco roda em threads
+        
+        Não bloqueia o event loop, então um único processo pode manter muitas buscas em andamento.
+        """
+        mode = mode or self.search_mode
+        if self.index is None or not self.chunk_hashes:
+            return []
+        
+        cache_key = make_cache_key(query, k, mode, search_terms, filters, self.index_epoch)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        allowed_chunk_ids = await asyncio.to_thread(self._resolve_filter_chunk_ids, filters) if filters else None
+        if allowed_chunk_ids is not None and not allowed_chunk_ids:
+            return []
+        
+        query_emb = await self._aembed_query(query)
+        if query_emb is None:
+            return []
+        
+        results = await asyncio.to_thread(self._search_with_embedding, query, query_emb, k, mode, search_terms, allowed_chunk_ids)
+        if results:
+            self.search_cache.put(cache_key, results)
+        return results
+    
+    async def _aembed_query(self, query: str) -> Optional[np.ndarray]:
+        """Criar embedding da consulta com o cliente assíncrono, respeitando embedding_oversize_mode"""
+        try:
+            if self.embedding_oversize_mode == "truncate":
+                max_chars = 6000  # Estimativa conservadora para 8k tokens
+                pieces = [query[:max_chars]]
+            else:
+                pieces = split_for_embedding(query, self.max_embedding_tokens)
+            
+            vectors, _ = await arequest_embeddings(get_async_client(OPENAI_API_KEY), EMBEDDING_MODEL, pieces)
+            if len(vectors) == 1:
+                return vectors[0]
+            return pool_embeddings(vectors, [count_tokens(piece) for piece in pieces])
+        except Exception as e:
+            self.log_always("error", f"Erro ao criar embedding assíncrono da consulta: {e}")
+            return None
+    
+    def _search_with_embedding(self, query: str, query_emb: np.ndarray, k: int, mode: str,
+                               search_terms: List[str] = None, allowed_chunk_ids: set = None) -> List[Dict]:
+        """Buscar no índice a partir do embedding da consulta já calculado"""
+        with self.index_lock.read():
+            return self._search_snapshot(query, query_emb, k, mode, search_terms, allowed_chunk_ids)
+    
+    def _search_snapshot(self, query: str, query_emb: np.ndarray, k: int, mode: str,
+                         search_terms: List[str] = None, allowed_chunk_ids: set = None) -> List[Dict]:
+        """Executar a busca sobre o índice atual (chamado com a trava de leitura adquirida)"""
+        if self.index is None or not self.chunk_ids:
+            return []
+        
+        # Garantir consistência das listas antes de buscar
+        if not self._ensure_list_consistency():
+            self.log_always("warning", "Problemas de consistência de lista detectados durante busca")
+        
+        try:
+            if mode == "hybrid" and self.lexical_index_available:
+                return self._hybrid_search(query, query_emb, k, search_terms, allowed_chunk_ids)
+            
+            if self.enable_diversity_rerank and k > 1:
+                # Uma única consulta ao FAISS com folga; o MMR escolhe um top-k diverso entre os candidatos
+                candidates = self._vector_candidates(query_emb, k * self.search_multiplier, allowed_chunk_ids)
+            else:
+                candidates = self._vector_candidates(query_emb, k, allowed_chunk_ids)
+            # Fragmentos lidos do banco uma única vez, usados pelo MMR e na montagem dos resultados
+            chunks = self._get_chunks_from_db([chunk_id for chunk_id, _, _ in candidates])
+            if self.enable_diversity_rerank and k > 1:
+                vector_hits = self._diversify(query_emb, candidates, k, chunks)
+            else:
+                vector_hits = candidates
+            return self._build_results([(chunk_id, {'similarity_score': distance}) for chunk_id, distance, _ in vector_hits], chunks)
+        except Exception as e:
+            self.log_always("error", f"Erro ao buscar no índice: {e}")
+            return []
+    
+    def search_many(self, queries: List[str], k: int = 3, filters: Dict = None) -> List[List[Dict]]:
+        """Buscar várias consultas de uma vez (busca vetorial); retorna uma lista de resultados por consulta
+        
+        Todas as consultas são embedadas em uma única requisição, buscadas com uma única chamada ao FAISS
+        sobre a matriz de consultas, e os fragmentos encontrados são lidos do banco em uma única consulta.
+        """
+        if not queries:
+            return []
+        if self.index is None or not self.chunk_hashes:
+            return [[] for _ in queries]
+        
+        # Consultas já em cache não são recalculadas
+        results = [None] * len(queries)
+        cache_keys = [make_cache_key(query, k, "vector", None, filters, self.index_epoch) for query in queries]
+        for i, cache_key in enumerate(cache_keys):
+            results[i] = self.search_cache.get(cache_key)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
+        allowed_chunk_ids = self._resolve_filter_chunk_ids(filters) if filters else None
+        if allowed_chunk_ids is not None and not allowed_chunk_ids:
+            return [result if result is not None else [] for result in results]
+        
+        try:
+            # Uma requisição de embedding para todas as consultas pendentes
+            embeddings = self.embed_texts([queries[i] for i in pending], operation="search")
+            embedded = [(i, emb) for i, emb in zip(pending, embeddings) if emb is not None]
+            if not embedded:
+                return [result if result is not None else [] for result in results]
+            query_matrix = np.vstack([
+                emb[0] if len(emb) == 1 else pool_embeddings(list(emb), [1] * len(emb))
+                for _, emb in embedded
+            ]).astype(np.float32)
+            
+            with self.index_lock.read():
+                # Uma chamada ao FAISS para a matriz de consultas
+                pool_size = k * self.search_multiplier if self.enable_diversity_rerank and k > 1 else k
+                all_candidates = self._vector_candidates_batch(query_matrix, pool_size, allowed_chunk_ids)
+                
+                # Uma leitura no banco para a união dos fragmentos encontrados
+                chunks = self._get_chunks_from_db(list({chunk_id for candidates in all_candidates for chunk_id, _, _ in candidates}))
+                
+                for (i, _), query_emb, candidates in zip(embedded, query_matrix, all_candidates):
+                    if pool_size > k:
+                        candidates = self._diversify(query_emb, candidates, k, chunks)
+                    results[i] = self._build_results([(chunk_id, {'similarity_score': distance}) for chunk_id, distance, _ in candidates], chunks)
+                    if results[i]:
+                        self.search_cache.put(cache_keys[i], results[i])
+        except Exception as e:
+            self.log_always("error", f"Erro na busca em lote: {e}")
+        
+        return [result if result is not None else [] for result in results]
+    
+    def _vector_candidates(self, query_emb: np.ndarray, n: int, allowed_chunk_ids: set = None) -> List[Tuple[int, float, int]]:
+        """Buscar os n vizinhos mais próximos no FAISS; retorna [(chunk_id, distância, posição)] sem repetir fragmentos
+        
+        Com allowed_chunk_ids, a busca considera apenas os vetores desses fragmentos: subconjuntos pequenos
+        são comparados diretamente; os grandes usam um IDSelector do FAISS.
+        """
+        return self._vector_candidates_batch(np.array([query_emb], dtype=np.float32), n, allowed_chunk_ids)[0]
+    
+    def _vector_candidates_batch(self, query_matrix: np.ndarray, n: int, allowed_chunk_ids: set = None) -> List[List[Tuple[int, float, int]]]:
+        """Versão em lote de _vector_candidates: uma única busca no FAISS para todas as linhas da matriz de consultas"""
+        query_matrix = np.asarray(query_matrix, dtype=np.float32)
+        if allowed_chunk_ids is None:
+            # Com vetores obsoletos, buscar com folga (2n) e ampliar só se faltarem resultados válidos
+            fetch = min(n * 2 if self._stale_vectors else n, self.index.ntotal)
+            while True:
+                D, I = self.index.search(query_matrix, max(fetch, 1))
+                all_candidates, short = self._collect_candidates(D, I, n)
+                if not short or fetch >= self.index.ntotal:
+                    return all_candidates
+                fetch = min(fetch * 4, self.index.ntotal)
+        else:
+            # Posições dos fragmentos permitidos pelo mapa em memória, sem percorrer chunk_ids inteiro
+            positions = np.array(sorted(
+                position for chunk_id in allowed_chunk_ids for position in self._chunk_positions.get(chunk_id, ())
+            ), dtype=np.int64)
+            if len(positions) == 0:
+                return [[] for _ in range(len(query_matrix))]
+            D, I = self._search_positions(query_matrix, n, positions)
+        return self._collect_candidates(D, I, n)[0]
+    
+    def _collect_candidates(self, D: np.ndarray, I: np.ndarray, n: int) -> Tuple[List[List[Tuple[int, float, int]]], bool]:
+        """Converter (D, I) do FAISS em [(chunk_id, distância, posição)] por consulta, ignorando vetores obsoletos
+        
+        Retorna também se alguma consulta ficou com menos de n resultados por causa de vetores obsoletos.
+        """
+        all_candidates = []
+        short = False
+        for row_distances, row_indices in zip(D, I):
+            candidates = []
+            seen_chunk_ids = set()
+            stale_hits = 0
+            for distance, idx in zip(row_distances, row_indices):
+                if 0 <= idx < len(self.chunk_ids):
+                    chunk_id = self.chunk_ids[idx] # Obter o ID do fragmento da lista
+                    if chunk_id == STALE_CHUNK_ID:
+                        stale_hits += 1
+                        continue
+                    # No modo "multi" um fragmento pode ter vários vetores; manter só o melhor
+                    if chunk_id in seen_chunk_ids:
+                        continue
+                    seen_chunk_ids.add(chunk_id)
+                    candidates.append((chunk_id, float(distance), int(idx)))
+            if stale_hits and len(candidates) < n:
+                short = True
+            all_candidates.append(candidates[:n])
+        return all_candidates, short
+    
+    def _search_positions(self, query_matrix: np.ndarray, n: int, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Buscar apenas entre as posições informadas do índice; retorna (D, I) como index.search"""
+        if len(positions) > self.filtered_search_subset_limit and isinstance(self.index, ShardedIndex):
+            return self.index.search_positions(query_matrix, n, positions)
+        if len(positions) > self.filtered_search_subset_limit and hasattr(faiss, "SearchParameters"):
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(positions.astype(np.int64)))
+            return self.index.search(query_matrix, n, params=params)
+        
+        # Subconjunto pequeno: reconstruir os vetores e calcular as distâncias L2 (ao quadrado) diretamente
+        if hasattr(self.index, "reconstruct_batch"):
+            vectors = self.index.reconstruct_batch(positions.astype(np.int64))
+        else:
+            vectors = np.vstack([self.index.reconstruct(int(position)) for position in positions])
+        distances = (
+            np.sum(query_matrix ** 2, axis=1)[:, None]
+            + np.sum(vectors ** 2, axis=1)[None, :]
+            - 2 * query_matrix @ vectors.T
+        )
+        order = np.argsort(distances, axis=1)[:, :n]
+        return np.take_along_axis(distances, order, axis=1), positions[order]
+    
+    def _resolve_filter_chunk_ids(self, filters: Dict) -> Optional[set]:
+        """Converter filtros de busca no conjunto de IDs de fragmentos permitidos (None se não for possível)"""
+        from sqlalchemy import text
+        
+        conditions = []
+        params = {}
+        join_metadata = False
+        
+        folder = filters.get("folder")
+        if folder and folder != "Root":
+            folder_path = folder if os.path.isabs(folder) else os.path.join(self.vault_path, folder)
+            prefix = os.path.join(os.path.normpath(folder_path), "")
+            conditions.append("substr(tc.file_path, 1, :prefix_length) = :prefix")
+            params.update(prefix=prefix, prefix_length=len(prefix))
+        
+        file_types = filters.get("file_types")
+        if file_types:
+            type_conditions = []
+            for i, file_type in enumerate(file_types):
+                params[f"ext{i}"] = "." + file_type.lower().lstrip(".")
+                type_conditions.append(f"lower(tc.file_path) LIKE '%' || :ext{i}")
+            conditions.append("(" + " OR ".join(type_conditions) + ")")
+        
+        file_paths = filters.get("file_paths")
+        if file_paths:
+            placeholders = []
+            for i, file_path in enumerate(file_paths):
+                params[f"path{i}"] = file_path if os.path.isabs(file_path) else os.path.join(self.vault_path, file_path)
+                placeholders.append(f":path{i}")
+            conditions.append(f"tc.file_path IN ({', '.join(placeholders)})")
+        
+        modified_after = filters.get("modified_after")
+        if modified_after:
+            if isinstance(modified_after, str):
+                modified_after = datetime.fromisoformat(modified_after)
+            join_metadata = True
+            conditions.append("dm.last_modified >= :modified_after")
+            params["modified_after"] = modified_after
+        
+        if not conditions:
+            return None
+        
+        if self.chunk_occurrences_available:
+            # Filtrar pelos arquivos em que o conteúdo aparece, não só pelo arquivo ao qual está atribuído
+            sql = "SELECT DISTINCT tc.chunk_id FROM chunk_occurrences tc"
+        else:
+            sql = "SELECT tc.id FROM text_chunks tc"
+        if join_metadata:
+            sql += " JOIN document_metadata dm ON dm.file_path = tc.file_path"
+        sql += " WHERE " + " AND ".join(conditions)
+        
+        if self.near_duplicate_index_available:
+            # Quase duplicados que atendem ao filtro estão no índice pelo representante
+            sql += f"""
+                UNION SELECT representative_id FROM chunk_near_duplicates
+                WHERE representative_id != chunk_id AND chunk_id IN ({sql})
+            """
+        
+        rows = self._run_sql(lambda session: session.execute(text(sql), params).fetchall())
+        if rows is None:
+            self.log_always("warning", "Não foi possível aplicar os filtros de busca; buscando em todo o índice")
+            return None
+        return {row[0] for row in rows}
+    
+    def _build_results(self, hits: List[Tuple[int, Dict]], chunks: Dict[int, Tuple[str, Dict]] = None) -> List[Dict]:
+        """Montar os resultados da busca a partir de [(chunk_id, campos de pontuação)]
+        
+        chunks: fragmentos já carregados em lote (ver _get_chunks_from_db); sem ele, cada fragmento é lido do banco.
+        Fragmentos com quase duplicados fora do índice recebem a lista deles em 'near_duplicates', e
+        conteúdos presentes em mais de um arquivo recebem todos os arquivos em 'occurrences'.
+        """
+        near_duplicates = self._near_duplicates_of([chunk_id for chunk_id, _ in hits])
+        occurrences = self._chunk_occurrences_of([chunk_id for chunk_id, _ in hits])
+        results = []
+        for chunk_id, scores in hits:
+            if chunks is not None:
+                chunk_text, chunk_meta = chunks.get(chunk_id, (None, {}))
+            else:
+                chunk_text, chunk_meta = self._get_chunk_from_db(chunk_id) # Obter texto e metadados do fragmento do banco de dados
+            if chunk_text is not None:
+                result = {
+                    'text': chunk_text,
+                    'file_path': chunk_meta.get('file_path'),
+                    'chunk_info': chunk_meta
+                }
+                if chunk_id in near_duplicates:
+                    result['near_duplicates'] = near_duplicates[chunk_id]
+                if len(occurrences.get(chunk_id, ())) > 1:
+                    result['occurrences'] = occurrences[chunk_id]
+                result.update(scores)
+                results.append(result)
+            else:
+                self.log_always("error", f"ID do fragmento {chunk_id} não encontrado no BD durante busca")
+        return results
+    
+    def _hybrid_search(self, query: str, query_emb: np.ndarray, k: int, search_terms: List[str] = None, allowed_chunk_ids: set = None) -> List[Dict]:
+        """Combinar rankings do FAISS e do BM25 com reciprocal-rank fusion (score = Σ 1 / (rrf_k + posição))"""
+        pool_size = max(k * self.search_multiplier, k)
+        vector_hits = self._vector_candidates(query_emb, pool_size, allowed_chunk_ids)
+        lexical_hits = self._lexical_search(query, pool_size, search_terms)
+        if allowed_chunk_ids is not None:
+            lexical_hits = [hit for hit in lexical_hits if hit[0] in allowed_chunk_ids]
+        
+        fused = {}
+        for rank, (chunk_id, _, _) in enumerate(vector_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, (chunk_id, _) in enumerate(lexical_hits):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        
+        ranked_ids = sorted(fused, key=fused.get, reverse=True)
+        top_ids = self._apply_file_cap(ranked_ids, k) if self.enable_diversity_rerank else ranked_ids[:k]
+        
+        # Fragmentos encontrados só pela busca léxica também recebem a distância vetorial
+        distances = {chunk_id: distance for chunk_id, distance, _ in vector_hits}
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in distances]
+        if missing:
+            distances.update(self._chunk_distances(query_emb, missing))
+        lexical_ranks = {chunk_id: rank + 1 for rank, (chunk_id, _) in enumerate(lexical_hits)}
+        
+        return self._build_results([
+            (chunk_id, {
+                'similarity_score': distances.get(chunk_id),
+                'hybrid_score': fused[chunk_id],
+                'lexical_rank': lexical_ranks.get(chunk_id)
+            })
+            for chunk_id in top_ids
+        ])
+    
+    def _diversify(self, query_emb: np.ndarray, candidates: List[Tuple[int, float, int]], k: int,
+                   chunks: Dict[int, Tuple[str, Dict]] = None) -> List[Tuple[int, float, int]]:
+        """Reordenar candidatos por MMR (Maximal Marginal Relevance) com limite de fragmentos por arquivo
+        
+        A cada passo escolhe o candidato que maximiza
+        mmr_lambda * similaridade(consulta) - (1 - mmr_lambda) * maior similaridade com os já escolhidos,
+        pulando arquivos que já atingiram max_chunks_per_file. Se o limite deixar menos de k resultados,
+        completa com os candidatos restantes mais relevantes.
+        """
+        if len(candidates) <= 1:
+            return candidates[:k]
+        
+        if chunks is None:
+            chunks = self._get_chunks_from_db([chunk_id for chunk_id, _, _ in candidates])
+        file_paths = [chunks.get(chunk_id, (None, {}))[1].get('file_path') for chunk_id, _, _ in candidates]
+        
+        # Similaridade de cosseno sobre os vetores já recuperados
+        vectors = np.vstack([self.index.reconstruct(position) for _, _, position in candidates])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = np.asarray(query_emb, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-12)
+        relevance = vectors @ query
+        similarity = vectors @ vectors.T
+        
+        selected = []
+        per_file = {}
+        max_similarity = np.full(len(candidates), -np.inf)
+        remaining = set(range(len(candidates)))
+        while remaining and len(selected) < k:
+            allowed = [i for i in remaining if per_file.get(file_paths[i], 0) < self.max_chunks_per_file]
+            if not allowed:
+                break
+            if selected:
+                scores = {i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max_similarity[i] for i in allowed}
+            else:
+                scores = {i: relevance[i] for i in allowed}
+            best = max(allowed, key=scores.get)
+            selected.append(best)
+            remaining.discard(best)
+            per_file[file_paths[best]] = per_file.get(file_paths[best], 0) + 1
+            max_similarity = np.maximum(max_similarity, similarity[best])
+        
+        # Poucos arquivos distintos: completar com os mais relevantes
+        for i in sorted(remaining, key=lambda i: -relevance[i])[:k - len(selected)]:
+            selected.append(i)
+        
+        return [candidates[i] for i in selected]
+    
+    def _apply_file_cap(self, ranked_ids: List[int], k: int) -> List[int]:
+        """Manter a ordem do ranking limitando a max_chunks_per_file fragmentos por arquivo"""
+        pool = ranked_ids[:k * self.search_multiplier]
+        chunks = self._get_chunks_from_db(pool)
+        selected = []
+        overflow = []
+        per_file = {}
+        for chunk_id in pool:
+            file_path = chunks.get(chunk_id, (None, {}))[1].get('file_path')
+            if per_file.get(file_path, 0) < self.max_chunks_per_file:
+                per_file[file_path] = per_file.get(file_path, 0) + 1
+                selected.append(chunk_id)
+            else:
+                overflow.append(chunk_id)
+            if len(selected) == k:
+                break
+        return selected + overflow[:k - len(selected)]
+    
+    def _chunk_distances(self, query_emb: np.ndarray, chunk_ids: List[int]) -> Dict[int, float]:
+        """Distância L2 (ao quadrado, como o FAISS) entre a consulta e o melhor vetor de cada fragmento"""
+        owners, positions = [], []
+        for chunk_id in set(chunk_ids):
+            for position in self._chunk_positions.get(chunk_id, ()):
+                owners.append(chunk_id)
+                positions.append(position)
+        if not positions:
+            return {}
+        
+        positions = np.asarray(positions, dtype=np.int64)
+        if hasattr(self.index, "reconstruct_batch"):
+            vectors = self.index.reconstruct_batch(positions)
+        else:
+            vectors = np.vstack([self.index.reconstruct(int(position)) for position in positions])
+        all_distances = np.sum((vectors - query_emb.reshape(1, -1)) ** 2, axis=1)
+        
+        distances = {}
+        for chunk_id, distance in zip(owners, all_distances.tolist()):
+            if chunk_id not in distances or distance < distances[chunk_id]:
+                distances[chunk_id] = distance
+        return distances
+    
+    def _run_sql(self, fn, commit: bool = False, default=None):
+        """Executar fn(session) na sessão do Flask ou, sem contexto Flask, em uma sessão autônoma"""
+        try:
+            from database import db
+            from flask import current_app
+            
+            try:
+                app = current_app._get_current_object()
+                result = fn(db.session)
+                if commit:
+                    db.session.commit()
+                return result
+                
+            except RuntimeError:
+                from sqlalchemy import create_engine
+                from sqlalchemy.orm import sessionmaker
+                
+                # Obter caminho absoluto para arquivo de banco de dados
+                db_path = os.path.abspath('instance/app.db')
+                if not os.path.exists(db_path):
+                    if self.verbose:
+                        self.log_always("warning", f"Arquivo de banco de dados não encontrado em: {db_path}")
+                    return default
+                
+                # Reaproveitar o engine (e seu pool de conexões) entre chamadas
+                if self._standalone_engine is None:
+                    self._standalone_engine = create_engine(f'sqlite:///{db_path}')
+                session = sessionmaker(bind=self._standalone_engine)()
+                try:
+                    result = fn(session)
+                    if commit:
+                        session.commit()
+                    return result
+                finally:
+                    session.close()
+                    
+        except Exception as e:
+            self.log_always("error", f"Erro ao executar consulta no banco de dados: {e}")
+            return default
+    
+    def _ensure_usage_rollups(self):
+        """Criar os agregados de uso de embeddings (preenchidos com o histórico na primeira vez)"""
+        created = self._run_sql(ensure_rollup_tables, commit=True, default=None)
+        self.usage_rollups_available = created is not None
+        if created:
+            self.log_always("info", "Agregados de uso de embeddings criados a partir do histórico")
+    
+    def compact_usage_history(self, force: bool = False) -> int:
+        """Remover linhas brutas de uso mais antigas que usage_raw_retention_days (no máximo uma vez por dia)
+        
+        Os totais continuam nos agregados diário/mensal. Retorna o número de linhas removidas.
+        """
+        if not self.usage_rollups_available or not self.usage_raw_retention_days:
+            return 0
+        if not force and self._last_usage_compaction and datetime.now() - self._last_usage_compaction < timedelta(days=1):
+            return 0
+        removed = self._run_sql(lambda session: compact_usage(session, self.usage_raw_retention_days), commit=True, default=0)
+        self._last_usage_compaction = datetime.now()
+        if removed:
+            self.log_verbose("info", f"Removidas {removed} linhas de uso de embeddings com mais de {self.usage_raw_retention_days} dias")
+        return removed
+    
+    def refresh_recent_usage(self, force: bool = False) -> Optional[int]:
+        """Reler o uso de tokens dos últimos 30 dias (no máximo a cada recent_usage_refresh_sec)
+        
+        add_tokens soma os usos novos ao total em memória; só a releitura faz os usos antigos saírem
+        da janela. Retorna o total relido, ou None se não houve releitura.
+        """
+        if not self.enable_usage_tracking:
+            return None
+        if (not force and self._last_recent_usage_refresh
+                and (datetime.now() - self._last_recent_usage_refresh).total_seconds() < self.recent_usage_refresh_sec):
+            return None
+        from sqlalchemy import text
+        
+        def read(session):
+            if self.usage_rollups_available:
+                return recent_tokens(session)
+            return session.execute(
+                text("SELECT SUM(tokens_used) FROM index_embedding_usage WHERE created_at >= :since"),
+                {"since": datetime.utcnow() - timedelta(days=30)}
+            ).scalar() or 0
+        
+        recent = self._run_sql(read, default=None)
+        self._last_recent_usage_refresh = datetime.now()
+        if recent is not None:
+            self.stats.set_recent_tokens(recent)
+        return recent
+    
+    def _ensure_lexical_index(self):
+        """Criar a tabela FTS5 text_chunks_fts (conteúdo externo em text_chunks) e os gatilhos de sincronização"""
+        from sqlalchemy import text
+        
+        def setup(session):
+            exists = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'text_chunks_fts'")
+            ).fetchone()
+            session.execute(text("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS text_chunks_fts USING fts5(
+                    chunk_text, content='text_chunks', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            """))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS text_chunks_fts_insert AFTER INSERT ON text_chunks BEGIN
+                    INSERT INTO text_chunks_fts(rowid, chunk_text) VALUES (new.id, new.chunk_text);
+                END
+            """))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS text_chunks_fts_delete AFTER DELETE ON text_chunks BEGIN
+                    INSERT INTO text_chunks_fts(text_chunks_fts, rowid, chunk_text) VALUES ('delete', old.id, old.chunk_text);
+                END
+            """))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS text_chunks_fts_update AFTER UPDATE OF chunk_text ON text_chunks BEGIN
+                    INSERT INTO text_chunks_fts(text_chunks_fts, rowid, chunk_text) VALUES ('delete', old.id, old.chunk_text);
+                    INSERT INTO text_chunks_fts(rowid, chunk_text) VALUES (new.id, new.chunk_text);
+                END
+            """))
+            if not exists:
+                # Tabela nova: indexar os fragmentos já existentes
+                session.execute(text("INSERT INTO text_chunks_fts(text_chunks_fts) VALUES ('rebuild')"))
+                self.log_always("info", "Índice léxico FTS5 criado a partir de text_chunks")
+            return True
+        
+        self.lexical_index_available = bool(self._run_sql(setup, commit=True, default=False))
+        if not self.lexical_index_available:
+            self.log_always("warning", "Índice léxico FTS5 indisponível; a busca híbrida usará apenas o FAISS")
+    
+    def _ensure_identifier_index(self):
+        """Criar a tabela chunk_identifiers (CNPJ/CPF normalizados → fragmento) usada pela busca exata"""
+        from sqlalchemy import text
+        
+        def setup(session):
+            exists = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_identifiers'")
+            ).fetchone()
+            session.execute(text("""
+                CREATE TABLE IF NOT EXISTS chunk_identifiers (
+                    value TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    chunk_id INTEGER NOT NULL,
+                    PRIMARY KEY (value, kind, chunk_id)
+                ) WITHOUT ROWID
+            """))
+            session.execute(text("CREATE INDEX IF NOT EXISTS idx_chunk_identifiers_chunk_id ON chunk_identifiers (chunk_id)"))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS chunk_identifiers_delete AFTER DELETE ON text_chunks BEGIN
+                    DELETE FROM chunk_identifiers WHERE chunk_id = old.id;
+                END
+            """))
+            if not exists:
+                # Tabela nova: extrair os identificadores dos fragmentos já existentes
+                rows = []
+                for chunk_id, chunk_text in session.execute(text("SELECT id, chunk_text FROM text_chunks")):
+                    rows.extend({"value": value, "kind": kind, "chunk_id": chunk_id} for kind, value in extract_identifiers(chunk_text or ""))
+                if rows:
+                    session.execute(text("INSERT OR IGNORE INTO chunk_identifiers (value, kind, chunk_id) VALUES (:value, :kind, :chunk_id)"), rows)
+                self.log_always("info", f"Índice de identificadores criado com {len(rows)} entradas")
+            return True
+        
+        self.identifier_index_available = bool(self._run_sql(setup, commit=True, default=False))
+    
+    def _index_chunk_identifiers(self, chunk_id: int, text_content: str):
+        """Registrar os CNPJs/CPFs de um fragmento recém-salvo no índice de identificadores"""
+        if not self.identifier_index_available:
+            return
+        identifiers = extract_identifiers(text_content)
+        if not identifiers:
+            return
+        
+        from sqlalchemy import text
+        self._run_sql(lambda session: session.execute(
+            text("INSERT OR IGNORE INTO chunk_identifiers (value, kind, chunk_id) VALUES (:value, :kind, :chunk_id)"),
+            [{"value": value, "kind": kind, "chunk_id": chunk_id} for kind, value in identifiers]
+        ), commit=True)
+    
+    def _ensure_chunk_occurrences(self):
+        """Criar a tabela chunk_occurrences: (arquivo, posição) → fragmento, com contagem de referências
         
-        # Obter todos os fragmentos do banco de dados em vez de depender de self.chunk_hashes
-        all_chunks = self._get_all_chunks_from_db()
+        text_chunks guarda cada conteúdo uma única vez (pelo hash), com texto e embedding; as ocorrências
+        registram em quais arquivos e posições ele aparece. Um fragmento só é excluído quando o último
+        arquivo que o referencia é removido.
+        """
+        from sqlalchemy import text
         
-        if not all_chunks:
-            self.log_always("warning", "Nenhum fragmento encontrado no banco de dados para reconstrução")
+        def setup(session):
+            exists = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_occurrences'")
+            ).fetchone()
+            session.execute(text("""
+                CREATE TABLE IF NOT EXISTS chunk_occurrences (
+                    file_path TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    chunk_id INTEGER NOT NULL,
+                    PRIMARY KEY (file_path, position)
+                ) WITHOUT ROWID
+            """))
+            session.execute(text("CREATE INDEX IF NOT EXISTS idx_chunk_occurrences_chunk_id ON chunk_occurrences (chunk_id)"))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS chunk_occurrences_delete AFTER DELETE ON text_chunks BEGIN
+                    DELETE FROM chunk_occurrences WHERE chunk_id = old.id;
+                END
+            """))
+            if not exists:
+                # Tabela nova: uma ocorrência por fragmento existente, no arquivo em que foi salvo
+                result = session.execute(text("""
+                    INSERT OR IGNORE INTO chunk_occurrences (file_path, position, chunk_id)
+                    SELECT file_path, ROW_NUMBER() OVER (PARTITION BY file_path ORDER BY id) - 1, id
+                    FROM text_chunks WHERE file_path IS NOT NULL
+                """))
+                self.log_always("info", f"Tabela de ocorrências criada com {result.rowcount or 0} entradas")
+            return True
+        
+        self.chunk_occurrences_available = bool(self._run_sql(setup, commit=True, default=False))
+    
+    def _record_chunk_occurrence(self, chunk_id: int, file_path: str, position: int):
+        """Registrar que o fragmento aparece no arquivo na posição informada (substitui a ocorrência anterior)"""
+        if not self.chunk_occurrences_available:
             return
+        from sqlalchemy import text
+        self._run_sql(lambda session: session.execute(
+            text("INSERT OR REPLACE INTO chunk_occurrences (file_path, position, chunk_id) VALUES (:file_path, :position, :chunk_id)"),
+            {"file_path": file_path, "position": position, "chunk_id": chunk_id}
+        ), commit=True)
+    
+    def _chunk_occurrences_of(self, chunk_ids) -> Dict[int, List[Dict]]:
+        """Ocorrências de cada fragmento: {chunk_id: [{'file_path', 'position'}]}"""
+        if not self.chunk_occurrences_available or not chunk_ids:
+            return {}
+        from sqlalchemy import text
+        chunk_ids = list(chunk_ids)
+        placeholders = ", ".join(f":id{i}" for i in range(len(chunk_ids)))
+        rows = self._run_sql(lambda session: session.execute(text(f"""
+            SELECT chunk_id, file_path, position FROM chunk_occurrences
+            WHERE chunk_id IN ({placeholders}) ORDER BY file_path, position
+        """), {f"id{i}": chunk_id for i, chunk_id in enumerate(chunk_ids)}).fetchall(), default=[])
+        occurrences = {}
+        for chunk_id, file_path, position in rows:
+            occurrences.setdefault(chunk_id, []).append({"file_path": file_path, "position": position})
+        return occurrences
+    
+    def _file_chunk_ids(self, file_path: str) -> set:
+        """Ids dos fragmentos referenciados por um arquivo"""
+        from sqlalchemy import text
+        return {row[0] for row in self._run_sql(lambda session: session.execute(
+            text("SELECT chunk_id FROM chunk_occurrences WHERE file_path = :file_path UNION SELECT id FROM text_chunks WHERE file_path = :file_path"),
+            {"file_path": file_path}
+        ).fetchall(), default=[])}
+    
+    def _release_chunk_occurrences(self, file_path: str, from_position: int = 0, candidate_ids: set = None) -> int:
+        """Remover as ocorrências do arquivo a partir de from_position e liberar os fragmentos sem referências
         
-        self.log_verbose("info", f"Encontrados {len(all_chunks)} fragmentos no banco de dados, reconstruindo índice...")
+        candidate_ids: fragmentos que o arquivo referenciava antes de ser salvo de novo (os substituídos
+        também podem ter ficado sem referências). Fragmentos ainda usados por outros arquivos passam a ser
+        atribuídos a um deles. Retorna o número de fragmentos excluídos.
+        """
+        from sqlalchemy import text
+        
+        def release(session):
+            params = {"file_path": file_path, "from_position": from_position}
+            released = {row[0] for row in session.execute(text(
+                "SELECT chunk_id FROM chunk_occurrences WHERE file_path = :file_path AND position >= :from_position"
+            ), params)}
+            released.update(candidate_ids or ())
+            if from_position == 0:
+                # Fragmentos salvos antes da tabela de ocorrências
+                released.update(row[0] for row in session.execute(text("SELECT id FROM text_chunks WHERE file_path = :file_path"), params))
+            session.execute(text("DELETE FROM chunk_occurrences WHERE file_path = :file_path AND position >= :from_position"), params)
+            
+            deleted = 0
+            released = list(released)
+            for start in range(0, len(released), 500):
+                group = released[start:start + 500]
+                placeholders = ", ".join(f":id{i}" for i in range(len(group)))
+                group_params = dict(params, **{f"id{i}": chunk_id for i, chunk_id in enumerate(group)})
+                # Sem nenhuma ocorrência: excluir (os gatilhos limpam as tabelas auxiliares)
+                deleted += session.execute(text(f"""
+                    DELETE FROM text_chunks
+                    WHERE id IN ({placeholders}) AND id NOT IN (SELECT chunk_id FROM chunk_occurrences)
+                """), group_params).rowcount or 0
+                # Ainda usados por outros arquivos, mas atribuídos a este, que não os referencia mais:
+                # passar a atribuição para outra ocorrência
+                session.execute(text(f"""
+                    UPDATE text_chunks SET
+                        file_path = (SELECT co.file_path FROM chunk_occurrences co WHERE co.chunk_id = text_chunks.id
+                                     ORDER BY co.file_path, co.position LIMIT 1),
+                        chunk_metadata = json_set(chunk_metadata, '$.file_path',
+                                    (SELECT co.file_path FROM chunk_occurrences co WHERE co.chunk_id = text_chunks.id
+                                     ORDER BY co.file_path, co.position LIMIT 1))
+                    WHERE id IN ({placeholders}) AND file_path = :file_path
+                      AND id NOT IN (SELECT chunk_id FROM chunk_occurrences WHERE file_path = :file_path)
+                """), group_params)
+            return deleted
         
-        # Reconstruir listas chunk_hashes e chunk_ids a partir do banco de dados
-        self.chunk_hashes = []
-        self.chunk_ids = []
-        embeddings = []
+        deleted = self._run_sql(release, commit=True, default=0)
+        self.memory_cache.clear()
+        return deleted
+    
+    def _ensure_near_duplicate_index(self):
+        """Criar a tabela chunk_near_duplicates (impressão SimHash e representante de cada fragmento)"""
+        from sqlalchemy import text
         
-        for chunk_id, chunk_text, chunk_meta in all_chunks:
-            if chunk_text is not None:
-                # Gerar hash para este fragmento
-                chunk_hash = self.hash_text(chunk_text)
-                
-                # Adicionar à nossas listas
-                self.chunk_hashes.append(chunk_hash)
-                self.chunk_ids.append(chunk_id)
-                
-                # Criar embedding
-                file_path = chunk_meta.get('file_path')
-                emb = self.embed_text(chunk_text, file_path, "rebuild")
-                if emb is not None:
-                    embeddings.append(emb)
-                else:
-                    self.log_always("error", f"Falha ao criar embedding do fragmento {chunk_id} durante reconstrução")
-            else:
-                self.log_always("error", f"Falha ao recuperar fragmento {chunk_id} para reconstrução")
+        def setup(session):
+            exists = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_near_duplicates'")
+            ).fetchone()
+            session.execute(text("""
+                CREATE TABLE IF NOT EXISTS chunk_near_duplicates (
+                    chunk_id INTEGER PRIMARY KEY,
+                    representative_id INTEGER NOT NULL,
+                    simhash INTEGER NOT NULL,
+                    band0 INTEGER NOT NULL,
+                    band1 INTEGER NOT NULL,
+                    band2 INTEGER NOT NULL,
+                    band3 INTEGER NOT NULL
+                )
+            """))
+            session.execute(text("CREATE INDEX IF NOT EXISTS idx_chunk_near_duplicates_representative ON chunk_near_duplicates (representative_id)"))
+            for band in range(4):
+                session.execute(text(f"CREATE INDEX IF NOT EXISTS idx_chunk_near_duplicates_band{band} ON chunk_near_duplicates (band{band})"))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS chunk_near_duplicates_delete AFTER DELETE ON text_chunks BEGIN
+                    DELETE FROM chunk_near_duplicates WHERE chunk_id = old.id;
+                END
+            """))
+            if not exists:
+                # Tabela nova: agrupar os fragmentos já existentes, na ordem em que foram salvos
+                rows = cluster_near_duplicates(
+                    session.execute(text("SELECT id, chunk_text FROM text_chunks ORDER BY id")),
+                    self.near_duplicate_max_distance
+                )
+                if rows:
+                    session.execute(text(INSERT_ROW_SQL), rows)
+                members = sum(1 for row in rows if row["chunk_id"] != row["representative_id"])
+                self.log_always("info", f"Índice de quase duplicados criado: {len(rows)} fragmentos, {members} duplicados")
+            return True
         
-        if embeddings:
-            dim = len(embeddings[0])
-            self.index = faiss.IndexFlatL2(dim)
-            self.index.add(np.array(embeddings))
-            self.log_always("success", f"Índice FAISS reconstruído com {len(embeddings)} fragmentos")
-        else:
-            self.log_always("warning", "Nenhum embedding criado durante reconstrução")
+        self.near_duplicate_index_available = bool(self._run_sql(setup, commit=True, default=False))
     
-    def save_index(self):
-        """Salvar índice em arquivo"""
-        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
-        data = {
-            "index": self.index,
-            "chunk_hashes": self.chunk_hashes, # Salvar no arquivo de índice
-            "chunk_ids": self.chunk_ids, # Salvar no arquivo de índice
-            "last_update": self.last_update
-        }
-        with open(self.index_path, "wb") as f:
-            pickle.dump(data, f)
+    def _register_near_duplicate(self, chunk_id: int, text_content: str) -> Optional[int]:
+        """Registrar a impressão de um fragmento recém-salvo; retorna o representante, se for quase duplicado"""
+        if not self.near_duplicate_index_available:
+            return None
+        fingerprint = simhash(text_content)
+        if fingerprint is None:
+            return None
+        
+        from sqlalchemy import text
+        row = fingerprint_row(chunk_id, chunk_id, fingerprint)
+        
+        def register(session):
+            # Candidatos: representantes com alguma faixa igual (o LSH garante ao menos uma para distância < 4)
+            candidates = session.execute(text("""
+                SELECT chunk_id, simhash FROM chunk_near_duplicates
+                WHERE chunk_id = representative_id AND chunk_id != :chunk_id
+                  AND (band0 = :band0 OR band1 = :band1 OR band2 = :band2 OR band3 = :band3)
+                ORDER BY chunk_id
+            """), row).fetchall()
+            representative = next(
+                (candidate_id for candidate_id, other in candidates
+                 if hamming(fingerprint, from_signed(other)) <= self.near_duplicate_max_distance),
+                None
+            )
+            session.execute(text(INSERT_ROW_SQL), dict(row, representative_id=representative or chunk_id))
+            return representative
+        
+        return self._run_sql(register, commit=True)
     
-    def search(self, query: str, k: int = 3) -> List[Dict]:
-        """Buscar documentos similares e retornar informações dos fragmentos"""
-        if self.index is None or not self.chunk_hashes:
+    def _near_duplicate_members(self, chunk_ids) -> set:
+        """Ids, entre os informados, de fragmentos quase duplicados de outro (não são embedados nem indexados)"""
+        if not self.near_duplicate_index_available or not chunk_ids:
+            return set()
+        from sqlalchemy import text
+        chunk_ids = list(chunk_ids)
+        members = set()
+        for start in range(0, len(chunk_ids), 500):
+            group = chunk_ids[start:start + 500]
+            placeholders = ", ".join(f":id{i}" for i in range(len(group)))
+            rows = self._run_sql(lambda session: session.execute(
+                text(f"SELECT chunk_id FROM chunk_near_duplicates WHERE chunk_id IN ({placeholders}) AND representative_id != chunk_id"),
+                {f"id{i}": chunk_id for i, chunk_id in enumerate(group)}
+            ).fetchall(), default=[])
+            members.update(row[0] for row in rows)
+        return members
+    
+    def _near_duplicate_pairs(self) -> List[Tuple[int, int]]:
+        """Pares (fragmento, representante) de todos os quase duplicados registrados"""
+        if not self.near_duplicate_index_available:
             return []
+        from sqlalchemy import text
+        return self._run_sql(lambda session: session.execute(text(
+            "SELECT chunk_id, representative_id FROM chunk_near_duplicates WHERE representative_id != chunk_id"
+        )).fetchall(), default=[])
+    
+    def _near_duplicates_of(self, representative_ids) -> Dict[int, List[Dict]]:
+        """Quase duplicados de cada representante: {representante: [{'chunk_id', 'file_path'}]}"""
+        if not self.near_duplicate_index_available or not representative_ids:
+            return {}
+        from sqlalchemy import text
+        representative_ids = list(representative_ids)
+        placeholders = ", ".join(f":id{i}" for i in range(len(representative_ids)))
+        rows = self._run_sql(lambda session: session.execute(text(f"""
+            SELECT d.representative_id, d.chunk_id, c.file_path
+            FROM chunk_near_duplicates d JOIN text_chunks c ON c.id = d.chunk_id
+            WHERE d.representative_id IN ({placeholders}) AND d.chunk_id != d.representative_id
+            ORDER BY d.chunk_id
+        """), {f"id{i}": chunk_id for i, chunk_id in enumerate(representative_ids)}).fetchall(), default=[])
+        duplicates = {}
+        for representative_id, chunk_id, file_path in rows:
+            duplicates.setdefault(representative_id, []).append({"chunk_id": chunk_id, "file_path": file_path})
+        return duplicates
+    
+    def _repair_near_duplicate_clusters(self):
+        """Promover um novo representante nos grupos cujo representante foi removido do banco"""
+        if not self.near_duplicate_index_available:
+            return
+        from sqlalchemy import text
         
-        # Garantir consistência das listas antes de buscar
-        if not self._ensure_list_consistency():
-            self.log_always("warning", "Problemas de consistência de lista detectados durante busca")
+        def repair(session):
+            orphans = session.execute(text("""
+                SELECT representative_id, MIN(chunk_id) FROM chunk_near_duplicates
+                WHERE representative_id NOT IN (SELECT chunk_id FROM chunk_near_duplicates)
+                GROUP BY representative_id
+            """)).fetchall()
+            for old_representative, new_representative in orphans:
+                session.execute(
+                    text("UPDATE chunk_near_duplicates SET representative_id = :new WHERE representative_id = :old"),
+                    {"new": new_representative, "old": old_representative}
+                )
+            return len(orphans)
         
-        query_emb = self.embed_text(query)
-        if query_emb is None:
-            return []
+        repaired = self._run_sql(repair, commit=True, default=0)
+        if repaired:
+            self.log_always("info", f"{repaired} grupos de quase duplicados com novo representante")
+    
+    def exact_term_search(self, exact_terms: List[Dict], allowed_chunk_ids: set = None) -> List[Dict]:
+        """Buscar fragmentos por correspondência exata, sem chamar a API de embedding
         
-        try:
-            D, I = self.index.search(np.array([query_emb]), k)
-            results = []
-            for i, idx in enumerate(I[0]):
-                if idx < len(self.chunk_hashes): 
-                    chunk_id = self.chunk_ids[idx] # Obter o ID do fragmento da lista
-                    chunk_text, chunk_meta = self._get_chunk_from_db(chunk_id) # Obter texto e metadados do fragmento do banco de dados
-                    if chunk_text is not None:
-                        result = {
-                            'text': chunk_text,
-                            'file_path': chunk_meta.get('file_path'),
-                            'chunk_info': chunk_meta,
-                            'similarity_score': float(D[0][i])
-                        }
-                        results.append(result)
-                    else:
-                        self.log_always("error", f"ID do fragmento {idx} não encontrado no BD durante busca")
-            return results
-        except Exception as e:
-            self.log_always("error", f"Erro ao buscar no índice: {e}")
-            return []
+        exact_terms vem de analyze_query_intent: CNPJ/CPF são buscados pelo valor normalizado em
+        chunk_identifiers; frases usam o FTS5 e são confirmadas por comparação em casefold.
+        Retorna todos os fragmentos encontrados (até max_exact_results), com os termos de cada um.
+        allowed_chunk_ids (filtros resolvidos) restringe os fragmentos retornados.
+        """
+        from sqlalchemy import text
+        
+        matched_terms = {}  # chunk_id -> termos encontrados
+        
+        identifiers = [term for term in exact_terms if term.get('type') in ("cnpj", "cpf")]
+        if identifiers and self.identifier_index_available:
+            for term in identifiers:
+                rows = self._run_sql(lambda session: session.execute(
+                    text("SELECT chunk_id FROM chunk_identifiers WHERE value = :value LIMIT :limit"),
+                    {"value": term['normalized'], "limit": self.max_exact_results}
+                ).fetchall(), default=[])
+                for (chunk_id,) in rows:
+                    matched_terms.setdefault(chunk_id, []).append(term['value'])
+        
+        phrase_candidates = {}
+        for term in exact_terms:
+            if term.get('type') == "phrase" and self.lexical_index_available:
+                for chunk_id, _ in self._lexical_search("", self.max_exact_results, [term['value']]):
+                    phrase_candidates.setdefault(chunk_id, []).append(term)
+        
+        if allowed_chunk_ids is not None:
+            matched_terms = {chunk_id: terms for chunk_id, terms in matched_terms.items() if chunk_id in allowed_chunk_ids}
+            phrase_candidates = {chunk_id: terms for chunk_id, terms in phrase_candidates.items() if chunk_id in allowed_chunk_ids}
+        
+        chunks = self._get_chunks_from_db(list(set(matched_terms) | set(phrase_candidates)))
+        
+        # O FTS ignora pontuação e acentos; confirmar a frase exata no texto
+        for chunk_id, terms in phrase_candidates.items():
+            chunk = chunks.get(chunk_id)
+            if chunk is None:
+                continue
+            folded_text = chunk[0].casefold()
+            for term in terms:
+                if term['normalized'] in folded_text:
+                    matched_terms.setdefault(chunk_id, []).append(term['value'])
+        
+        results = []
+        for chunk_id in sorted(matched_terms, key=lambda cid: -len(matched_terms[cid]))[:self.max_exact_results]:
+            if chunk_id not in chunks:
+                continue
+            chunk_text, chunk_meta = chunks[chunk_id]
+            results.append({
+                'text': chunk_text,
+                'file_path': chunk_meta.get('file_path'),
+                'chunk_info': chunk_meta,
+                'similarity_score': 0.0,
+                'match_type': "exact",
+                'matched_terms': matched_terms[chunk_id]
+            })
+        return results
     
-    def get_stats(self) -> Dict:
-        """Obter estatísticas do índice"""
-        # Garantir consistência das listas antes de obter estatísticas
-        self._ensure_list_consistency()
+    def search_for_intent(self, query: str, query_intent: Dict, k: int = 3, filters: Dict = None) -> List[Dict]:
+        """Buscar usando a intenção da consulta: termos exatos vão direto ao índice, sem embedding
+        
+        Para intent_type "comprehensive_term_search" com CNPJ, CPF ou frase entre aspas, retorna todos os
+        fragmentos com correspondência exata (dentro dos filtros, se houver). Sem correspondências (ou sem
+        termos exatos), usa search().
+        """
+        exact_terms = query_intent.get('exact_terms') or []
+        if query_intent.get('intent_type') == "comprehensive_term_search" and exact_terms:
+            allowed_chunk_ids = self._resolve_filter_chunk_ids(filters) if filters else None
+            if allowed_chunk_ids is not None and not allowed_chunk_ids:
+                return []
+            results = self.exact_term_search(exact_terms, allowed_chunk_ids)
+            if results:
+                if self.verbose:
+                    files = {result['file_path'] for result in results}
+                    self.log_verbose("info", f"Busca exata: {len(results)} fragmentos em {len(files)} arquivos, sem embedding")
+                return results
+        return self.search(query, k, search_terms=query_intent.get('search_terms'), filters=filters)
+    
+    def _get_chunks_from_db(self, chunk_ids: List[int]) -> Dict[int, Tuple[str, Dict]]:
+        """Recuperar vários fragmentos em uma consulta; retorna {chunk_id: (texto, metadados)}"""
+        if not chunk_ids:
+            return {}
+        
+        from sqlalchemy import text
         
-            # Obter informações da estrutura de pastas
-        folder_info = self.get_folder_structure()
+        def fetch(session):
+            chunks = {}
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                placeholders = ", ".join(f":id{i}" for i in range(len(batch)))
+                rows = session.execute(
+                    text(f"SELECT id, chunk_text, chunk_metadata FROM text_chunks WHERE id IN ({placeholders})"),
+                    {f"id{i}": chunk_id for i, chunk_id in enumerate(batch)}
+                )
+                for chunk_id, chunk_text, chunk_meta in rows:
+                    if isinstance(chunk_meta, str):
+                        chunk_meta = json.loads(chunk_meta) if chunk_meta else {}
+                    chunks[chunk_id] = (chunk_text, chunk_meta or {})
+            return chunks
+        
+        return self._run_sql(fetch, default={})
+    
+    @staticmethod
+    def _build_fts_query(query: str, phrases: List[str] = None) -> Optional[str]:
+        """Montar expressão MATCH do FTS5: frases exatas e palavras da consulta, unidas por OR"""
+        parts = []
+        for phrase in phrases or []:
+            if re.search(r'\w', phrase):
+                parts.append('"' + phrase.replace('"', '""') + '"')
+        for word in dict.fromkeys(re.findall(r'\w+', query.lower())):
+            if len(word) > 1:
+                parts.append('"' + word + '"')
+        return " OR ".join(parts[:64]) if parts else None
+    
+    def _lexical_search(self, query: str, limit: int, phrases: List[str] = None) -> List[Tuple[int, float]]:
+        """Buscar no FTS5 ordenando por BM25; retorna [(chunk_id, bm25)] (bm25 menor = mais relevante)"""
+        if not self.lexical_index_available:
+            return []
+        match = self._build_fts_query(query, phrases)
+        if match is None:
+            return []
         
-            # Obter estatísticas de uso de embeddings
-        embedding_stats = self.get_embedding_usage_stats()
+        from sqlalchemy import text
+        rows = self._run_sql(lambda session: session.execute(
+            text("""
+                SELECT rowid, bm25(text_chunks_fts) AS score FROM text_chunks_fts
+                WHERE text_chunks_fts MATCH :match ORDER BY score LIMIT :limit
+            """),
+            {"match": match, "limit": limit}
+        ).fetchall(), default=[])
+        return [(row[0], float(row[1])) for row in rows]
+    
+    def get_stats(self) -> Dict:
+        """Obter estatísticas do índice a partir dos contadores incrementais (sem consultar banco ou disco)
         
-            # Contar arquivos únicos do banco de dados
-        unique_files = self._get_unique_file_count()
+        Para recalcular os valores a partir do banco (página de administração), use refresh_stats.
+        """
+        if not self.stats.seeded:
+            # Índice salvo antes das estatísticas incrementais: calcular uma vez
+            return self.refresh_stats()
         
+        snapshot = self.stats.snapshot()
         return {
             "total_chunks": len(self.chunk_hashes),
-            "unique_files": unique_files,
+            "unique_files": snapshot["unique_files"],
             "index_size": self.index.ntotal if self.index else 0,
             "last_update": self.last_update.isoformat() if self.last_update else None,
             "vault_path": self.vault_path,
-            "folder_structure": folder_info,
+            "folder_structure": snapshot["folder_structure"],
             "excluded_paths": list(self.excluded_paths),
-            "embedding_usage": embedding_stats,
+            "embedding_usage": snapshot["embedding_usage"],
+            "stats_refreshed_at": snapshot["refreshed_at"],
             "chunking_info": {
+                "strategy": self.chunking_strategy,
                 "max_chunk_size": self.max_chunk_size,
-                "chunk_overlap": self.chunk_overlap
-            }
+                "chunk_overlap": self.chunk_overlap,
+                "max_chunk_tokens": self.max_chunk_tokens,
+                "chunk_overlap_tokens": self.chunk_overlap_tokens
+            },
+            "search_cache": self.search_cache.get_stats(),
+            "sharding": self.index.get_stats() if isinstance(self.index, ShardedIndex) else None,
+            "pending_files": len(self.work_queue),
+            "failed_files": len(self._failed_files),
+            "parsed_text_cache": self.text_cache.get_stats() if self.text_cache else None
         }
     
+    def boost_indexing(self, path: str, priority: int = 1):
+        """Priorizar a indexação de um arquivo ou pasta (relativo ao vault ou absoluto); priority=0 remove o boost"""
+        full_path = path if os.path.isabs(path) else os.path.join(self.vault_path, path)
+        self.work_queue.boost(full_path, priority)
+        self.log_always("info", f"Prioridade de indexação de {path} definida como {priority}")
+    
+    def get_indexing_queue_status(self) -> Dict:
+        """Arquivos pendentes na fila de indexação, boosts ativos e próximos arquivos"""
+        return self.work_queue.status()
+    
+    def refresh_stats(self) -> Dict:
+        """Recalcular as estatísticas a partir do banco e retornar get_stats (operação cara, para administração)"""
+        from sqlalchemy import text
+        
+        # Com ocorrências, um conteúdo compartilhado conta para cada arquivo em que aparece
+        source = "chunk_occurrences" if self.chunk_occurrences_available else "text_chunks"
+        rows = self._run_sql(lambda session: session.execute(
+            text(f"SELECT file_path, COUNT(*) FROM {source} GROUP BY file_path")
+        ).fetchall(), default=None)
+        if rows is None:
+            self.log_always("warning", "Não foi possível recalcular as estatísticas do índice")
+            if not self.stats.seeded:
+                self.stats.reset()
+            return self.get_stats()
+        
+        def usage(session):
+            if self.usage_rollups_available:
+                summary = usage_summary(session)
+                return [(op["operation"], op["count"], op["total_tokens"]) for op in summary["operations"]], summary["recent_tokens_used"]
+            operations = session.execute(text("""
+                SELECT operation, COUNT(id), SUM(tokens_used) FROM index_embedding_usage GROUP BY operation
+            """)).fetchall()
+            recent = session.execute(
+                text("SELECT SUM(tokens_used) FROM index_embedding_usage WHERE created_at >= :since"),
+                {"since": datetime.utcnow() - timedelta(days=30)}
+            ).scalar()
+            return operations, recent or 0
+        
+        usage_rows = self._run_sql(usage, default=None)
+        operations = None
+        recent_tokens_used = 0
+        if usage_rows is not None:
+            operations = [{"operation": op, "count": count, "total_tokens": total or 0} for op, count, total in usage_rows[0]]
+            recent_tokens_used = usage_rows[1]
+            self._last_recent_usage_refresh = datetime.now()
+        
+        self.stats.seed({file_path: count for file_path, count in rows if file_path}, operations, recent_tokens_used)
+        self.log_verbose("info", f"Estatísticas do índice recalculadas: {len(rows)} arquivos")
+        return self.get_stats()
+    
     def get_embedding_usage_stats(self) -> Dict:
-        """Obter estatísticas sobre o uso de embeddings"""
+        """Obter estatísticas sobre o uso de embeddings (dos agregados diário/mensal, quando disponíveis)"""
+        if self.usage_rollups_available:
+            summary = self._run_sql(usage_summary, default=None)
+            if summary is not None:
+                return summary
+        
         try:
             from database import IndexEmbeddingUsage, db
             from sqlalchemy import func
@@ -1195,6 +3125,7 @@ class IndexManager:
             # Truncar todas as listas para o comprimento mínimo
             self.chunk_hashes = self.chunk_hashes[:min_length]
             self.chunk_ids = self.chunk_ids[:min_length] 
+            self._rebuild_chunk_positions()
             
             return False
         return True
@@ -1362,10 +3293,13 @@ class IndexManager:
             while True:
                 try:
                     self.update_index()
+                    self.compact_usage_history()
+                    self.refresh_recent_usage()
                 except Exception as e:
                     # print(f"Error in auto-update loop: {e}")
                     self.log_always("error", f"Erro no loop de atualização automática: {e}")
-                time.sleep(interval_sec)
+                # Com arquivos ainda na fila, continuar logo em vez de esperar o intervalo completo
+                time.sleep(min(interval_sec, self.busy_update_interval_sec) if len(self.work_queue) else interval_sec)
         
         update_thread = threading.Thread(target=auto_update_loop, daemon=True)
         update_thread.start()
@@ -1374,60 +3308,39 @@ class IndexManager:
                     self.log_verbose("info", f"Atualização automática iniciada com intervalo de {interval_sec}s")
 
     def get_smart_summary(self, text: str, max_length: int = 1000) -> str:
-        """Criar um resumo inteligente do conteúdo, priorizando sentenças importantes"""
-        if len(text) <= max_length:
-            return text
-        
-        # Dividir em sentenças (abordagem simples)
-        sentences = text.replace('\n', ' ').split('. ')
-        
-        # classificar sentenças importantes
-        scored_sentences = []
-        for sentence in sentences:
-            score = 0
-            sentence_lower = sentence.lower()
-            
-            # Aumentar pontuação de sentenças com indicadores importantes
-            if any(word in sentence_lower for word in ['important', 'key', 'critical', 'essential', 'main', 'primary']):
-                score += 3
-            if any(word in sentence_lower for word in ['example', 'instance', 'case', 'scenario']):
-                score += 2
-            if any(word in sentence_lower for word in ['definition', 'concept', 'principle', 'rule']):
-                score += 2
-            if any(word in sentence_lower for word in ['however', 'but', 'although', 'nevertheless']):
-                score += 1  # Contrasting statements often contain important info
-            
-            # Aumentar pontuação de sentenças com números ou datas
-            import re
-            if re.search(r'\d+', sentence):
-                score += 1
-            
-            scored_sentences.append((sentence, score))
-        
-        # Ordenar por pontuação e criar resumo
-        scored_sentences.sort(key=lambda x: x[1], reverse=True)
-        
-        summary = ""
-        for sentence, _ in scored_sentences:
-            if len(summary + sentence + ". ") <= max_length:
-                summary += sentence + ". "
-            else:
-                break
-        
-        if summary and not summary.endswith('.'):
-            summary = summary.rstrip() + '.'
-        
-        return summary.strip() or text[:max_length] + "..."
+        """Criar um resumo inteligente do conteúdo, priorizando sentenças importantes (ver summaries.py)"""
+        return smart_summary(text, max_length)
     
-    def search_with_summaries(self, query: str, k: int = 3, max_chunk_length: int = 1500) -> List[Dict]:
+    def _with_summaries(self, text: str, chunk_meta: Dict) -> Dict:
+        """Cópia dos metadados do fragmento com os resumos nos tamanhos de summary_lengths"""
+        summaries = precompute_summaries(text, self.summary_lengths)
+        if not summaries:
+            return chunk_meta
+        return dict(chunk_meta, summaries=summaries)
+    
+    def search_with_summaries(self, query: str, k: int = 3, max_chunk_length: int = 1500, filters: Dict = None) -> List[Dict]:
         """Buscar e retornar resultados com resumos inteligentes para fragmentos longos"""
-        results = self.search(query, k)
+        results = self.search(query, k, filters=filters)
+        return self._add_summaries(results, max_chunk_length)
+    
+    async def asearch_with_summaries(self, query: str, k: int = 3, max_chunk_length: int = 1500, filters: Dict = None) -> List[Dict]:
+        """Versão assíncrona de search_with_summaries"""
+        results = await self.asearch(query, k, filters=filters)
+        return await asyncio.to_thread(self._add_summaries, results, max_chunk_length)
+    
+    def _add_summaries(self, results: List[Dict], max_chunk_length: int) -> List[Dict]:
+        """Adicionar resumos inteligentes aos resultados com fragmentos longos
         
+        Usa o resumo salvo com o fragmento quando o tamanho está em summary_lengths; outros tamanhos
+        (ou fragmentos salvos antes dos resumos) são calculados na hora.
+        """
         # Adicionar resumos para fragmentos longos
         for result in results:
             text = result['text']
             if len(text) > max_chunk_length:
-                result['summary'] = self.get_smart_summary(text, max_chunk_length)
+                stored = (result.get('chunk_info') or {}).get('summaries') or {}
+                summary = stored.get(str(max_chunk_length))
+                result['summary'] = summary if summary is not None else self.get_smart_summary(text, max_chunk_length)
                 result['is_summarized'] = True
             else:
                 result['summary'] = text
@@ -1435,8 +3348,14 @@ class IndexManager:
         
         return results
 
-    def _save_chunk_to_db(self, text: str, file_path: str, chunk_meta: Dict, chunk_hash: str) -> Optional[int]:
-        """Salvar um fragmento no banco de dados e retornar seu ID."""
+    def _save_chunk_to_db(self, text: str, file_path: str, chunk_meta: Dict, chunk_hash: str, position: int = None) -> Optional[int]:
+        """Salvar um fragmento no banco de dados e retornar seu ID.
+        
+        Conteúdo já salvo (mesmo hash, de qualquer arquivo) é reaproveitado; em ambos os casos a
+        ocorrência (file_path, position) é registrada. position padrão: chunk_meta['chunk_id'].
+        """
+        if position is None:
+            position = chunk_meta.get('chunk_id', 0)
         try:
             from database import TextChunk, db
             from flask import current_app
@@ -1446,9 +3365,11 @@ class IndexManager:
                 
                 existing_chunk = TextChunk.get_by_hash(chunk_hash)
                 if existing_chunk:
+                    self._record_chunk_occurrence(existing_chunk.id, file_path, position)
                     return existing_chunk.id
                 
-                # Criar novo fragmento
+                # Criar novo fragmento, com os resumos pré-calculados
+                chunk_meta = self._with_summaries(text, chunk_meta)
                 new_chunk = TextChunk(
                     chunk_text=text,
                     chunk_hash=chunk_hash,
@@ -1457,6 +3378,9 @@ class IndexManager:
                 )
                 db.session.add(new_chunk)
                 db.session.commit()
+                self._index_chunk_identifiers(new_chunk.id, text)
+                self._register_near_duplicate(new_chunk.id, text)
+                self._record_chunk_occurrence(new_chunk.id, file_path, position)
                 return new_chunk.id
                 
             except RuntimeError:
@@ -1479,10 +3403,13 @@ class IndexManager:
                     # Verificar se o fragmento já existe
                     existing_chunk = session.query(TextChunk).filter_by(chunk_hash=chunk_hash).first()
                     if existing_chunk:
+                        chunk_id = existing_chunk.id
                         session.close()
-                        return existing_chunk.id
+                        self._record_chunk_occurrence(chunk_id, file_path, position)
+                        return chunk_id
                     
-                    # Criar novo fragmento
+                    # Criar novo fragmento, com os resumos pré-calculados
+                    chunk_meta = self._with_summaries(text, chunk_meta)
                     new_chunk = TextChunk(
                         chunk_text=text,
                         chunk_hash=chunk_hash,
@@ -1493,6 +3420,9 @@ class IndexManager:
                     session.commit()
                     chunk_id = new_chunk.id
                     session.close()
+                    self._index_chunk_identifiers(chunk_id, text)
+                    self._register_near_duplicate(chunk_id, text)
+                    self._record_chunk_occurrence(chunk_id, file_path, position)
                     return chunk_id
                     
                 except Exception as e:
@@ -1575,6 +3505,157 @@ class IndexManager:
             self.log_always("error", f"Error retrieving chunk from database: {e}")
             return None, {}
 
+    def _save_chunk_embeddings_to_db(self, embeddings: Dict[int, np.ndarray]):
+        """Armazenar os vetores de cada fragmento em text_chunks.embedding_vector (float32 contíguo)"""
+        try:
+            from database import TextChunk, db
+            from flask import current_app
+            
+            try:
+                app = current_app._get_current_object()
+                
+                for chunk_id, vectors in embeddings.items():
+                    TextChunk.query.filter_by(id=chunk_id).update(
+                        {"embedding_vector": np.asarray(vectors, dtype=np.float32).tobytes()}
+                    )
+                db.session.commit()
+                
+            except RuntimeError:
+                try:
+                    from sqlalchemy import create_engine
+                    from sqlalchemy.orm import sessionmaker
+                    
+                    # Obter caminho absoluto para arquivo de banco de dados
+                    db_path = os.path.abspath('instance/app.db')
+                    if not os.path.exists(db_path):
+                        if self.verbose:
+                            self.log_always("warning", f"Arquivo de banco de dados não encontrado em: {db_path}")
+                        return
+                    
+                    engine = create_engine(f'sqlite:///{db_path}')
+                    Session = sessionmaker(bind=engine)
+                    session = Session()
+                    
+                    for chunk_id, vectors in embeddings.items():
+                        session.query(TextChunk).filter_by(id=chunk_id).update(
+                            {"embedding_vector": np.asarray(vectors, dtype=np.float32).tobytes()}
+                        )
+                    session.commit()
+                    session.close()
+                    
+                except Exception as e:
+                    if self.verbose:
+                        self.log_always("error", f"Erro ao salvar embeddings de fragmentos (autônomo): {e}")
+                    
+        except Exception as e:
+            self.log_always("error", f"Erro ao salvar embeddings de fragmentos no banco de dados: {e}")
+    
+    def _get_chunk_embeddings_from_db(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        """Recuperar vetores armazenados dos fragmentos; retorna {chunk_id: matriz (n x dim)}"""
+        if not chunk_ids:
+            return {}
+        
+        # A dimensão vem do índice; sem índice, só é possível decodificar um vetor por fragmento
+        dim = self.index.d if self.index is not None else None
+        if dim is None and self.embedding_oversize_mode == "multi":
+            return {}
+        
+        def decode(rows):
+            embeddings = {}
+            for chunk_id, blob in rows:
+                if blob:
+                    vectors = np.frombuffer(blob, dtype=np.float32)
+                    embeddings[chunk_id] = vectors.reshape(-1, dim) if dim else vectors.reshape(1, -1)
+            return embeddings
+        
+        try:
+            from database import TextChunk, db
+            from flask import current_app
+            
+            try:
+                app = current_app._get_current_object()
+                rows = []
+                for start in range(0, len(chunk_ids), 500):
+                    rows.extend(db.session.query(TextChunk.id, TextChunk.embedding_vector).filter(TextChunk.id.in_(chunk_ids[start:start + 500])).all())
+                return decode(rows)
+                
+            except RuntimeError:
+                try:
+                    from sqlalchemy import create_engine
+                    from sqlalchemy.orm import sessionmaker
+                    
+                    # Obter caminho absoluto para arquivo de banco de dados
+                    db_path = os.path.abspath('instance/app.db')
+                    if not os.path.exists(db_path):
+                        return {}
+                    
+                    engine = create_engine(f'sqlite:///{db_path}')
+                    Session = sessionmaker(bind=engine)
+                    session = Session()
+                    
+                    rows = []
+                    for start in range(0, len(chunk_ids), 500):
+                        rows.extend(session.query(TextChunk.id, TextChunk.embedding_vector).filter(TextChunk.id.in_(chunk_ids[start:start + 500])).all())
+                    session.close()
+                    return decode(rows)
+                    
+                except Exception as e:
+                    if self.verbose:
+                        self.log_always("error", f"Erro ao recuperar embeddings de fragmentos (autônomo): {e}")
+                    return {}
+                    
+        except Exception as e:
+            self.log_always("error", f"Erro ao recuperar embeddings de fragmentos do banco de dados: {e}")
+            return {}
+    
+    def _cleanup_orphan_chunks(self, keep_ids: set):
+        """Excluir fragmentos que não estão no índice (restos de indexações interrompidas)"""
+        def orphan_ids(all_ids):
+            return [chunk_id for (chunk_id,) in all_ids if chunk_id not in keep_ids]
+        
+        try:
+            from database import TextChunk, db
+            from flask import current_app
+            
+            try:
+                app = current_app._get_current_object()
+                orphans = orphan_ids(db.session.query(TextChunk.id).all())
+                for start in range(0, len(orphans), 500):
+                    TextChunk.query.filter(TextChunk.id.in_(orphans[start:start + 500])).delete(synchronize_session=False)
+                db.session.commit()
+                
+            except RuntimeError:
+                try:
+                    from sqlalchemy import create_engine
+                    from sqlalchemy.orm import sessionmaker
+                    
+                    # Obter caminho absoluto para arquivo de banco de dados
+                    db_path = os.path.abspath('instance/app.db')
+                    if not os.path.exists(db_path):
+                        return
+                    
+                    engine = create_engine(f'sqlite:///{db_path}')
+                    Session = sessionmaker(bind=engine)
+                    session = Session()
+                    
+                    orphans = orphan_ids(session.query(TextChunk.id).all())
+                    for start in range(0, len(orphans), 500):
+                        session.query(TextChunk).filter(TextChunk.id.in_(orphans[start:start + 500])).delete(synchronize_session=False)
+                    session.commit()
+                    session.close()
+                    
+                except Exception as e:
+                    if self.verbose:
+                        self.log_always("error", f"Erro na limpeza autônoma de fragmentos órfãos: {e}")
+                    return
+            
+            if orphans:
+                self.memory_cache.clear()
+                self.log_always("info", f"Removidos {len(orphans)} fragmentos órfãos do banco de dados")
+                
+        except Exception as e:
+            self.log_always("error", f"Erro ao limpar fragmentos órfãos: {e}")
+    
     def _delete_chunk_from_db(self, chunk_id: int):
         """Excluir um fragmento do banco de dados pelo seu ID."""
         try:
@@ -1666,6 +3747,13 @@ class IndexManager:
 
     def _get_unique_file_count(self) -> int:
         """Obter contagem de arquivos únicos do banco de dados"""
+        if self.chunk_occurrences_available:
+            from sqlalchemy import text
+            count = self._run_sql(lambda session: session.execute(
+                text("SELECT COUNT(DISTINCT file_path) FROM chunk_occurrences")
+            ).scalar())
+            if count is not None:
+                return count
         try:
             from database import TextChunk, db
             from flask import current_app
@@ -1706,6 +3794,13 @@ class IndexManager:
 
     def _file_exists_in_index(self, file_path: str) -> bool:
         """Verificar se um arquivo existe no índice consultando o banco de dados"""
+        if self.chunk_occurrences_available:
+            from sqlalchemy import text
+            exists = self._run_sql(lambda session: session.execute(
+                text("SELECT 1 FROM chunk_occurrences WHERE file_path = :file_path LIMIT 1"), {"file_path": file_path}
+            ).fetchone() is not None)
+            if exists is not None:
+                return exists
         try:
             from database import TextChunk, db
             from flask import current_app
@@ -1746,6 +3841,15 @@ class IndexManager:
 
     def _get_chunks_for_file(self, file_path: str) -> List[Dict]:
         """Obter todos os fragmentos de um arquivo específico no banco de dados"""
+        if self.chunk_occurrences_available:
+            from sqlalchemy import text
+            rows = self._run_sql(lambda session: session.execute(text("""
+                SELECT co.chunk_id, tc.chunk_hash FROM chunk_occurrences co
+                JOIN text_chunks tc ON tc.id = co.chunk_id
+                WHERE co.file_path = :file_path ORDER BY co.position
+            """), {"file_path": file_path}).fetchall())
+            if rows is not None:
+                return [{'id': chunk_id, 'hash': chunk_hash} for chunk_id, chunk_hash in rows]
         try:
             from database import TextChunk, db
             from flask import current_app
@@ -1787,6 +3891,13 @@ class IndexManager:
 
     def _get_all_indexed_files(self) -> List[str]:
         """Obter todos os caminhos de arquivos atualmente indexados no banco de dados"""
+        if self.chunk_occurrences_available:
+            from sqlalchemy import text
+            rows = self._run_sql(lambda session: session.execute(
+                text("SELECT DISTINCT file_path FROM chunk_occurrences")
+            ).fetchall())
+            if rows is not None:
+                return [row[0] for row in rows]
         try:
             from database import TextChunk, db
             from flask import current_app
@@ -1868,7 +3979,17 @@ class IndexManager:
             return []
 
     def _remove_chunks_for_file(self, file_path: str):
-        """Remover todos os fragmentos associados a um arquivo específico do banco de dados."""
+        """Remover todos os fragmentos associados a um arquivo específico do banco de dados.
+        
+        Com a tabela de ocorrências, só as ocorrências do arquivo são removidas; o conteúdo é excluído
+        apenas se nenhum outro arquivo o referenciar.
+        """
+        self.stats.remove_file(file_path)
+        if self.chunk_occurrences_available:
+            deleted = self._release_chunk_occurrences(file_path)
+            if self.verbose:
+                self.log_verbose("info", f"Ocorrências removidas para arquivo: {os.path.basename(file_path)} ({deleted} fragmentos excluídos)")
+            return
         try:
             from database import TextChunk, db
             from flask import current_app
@@ -2219,79 +4340,53 @@ class IndexManager:
         return self.cleanup_banned_folder_metadata(folder_path)
 
     def get_document_metadata_stats(self) -> Dict:
-        """Obter estatísticas sobre o cache de metadados de documentos"""
-        try:
-            from database import DocumentMetadata, db
-            from flask import current_app
-            
-            try:
-                app = current_app._get_current_object()
-                
-                total_docs = DocumentMetadata.query.count()
-                indexed_docs = DocumentMetadata.query.filter_by(is_indexed=True).count()
-                supported_docs = DocumentMetadata.query.filter_by(is_supported=True).count()
-                
-                # Obter breakdown de tipo de arquivo
-                file_types = {}
-                for doc_type in ['md', 'txt', 'docx', 'xlsx', 'pdf']:
-                    count = DocumentMetadata.query.filter_by(file_type=doc_type).count()
-                    file_types[doc_type] = count
-                
-                # Obter breakdown de pasta
-                folder_count = db.session.query(db.func.count(db.func.distinct(DocumentMetadata.folder_path))).scalar()
-                
-                return {
-                    "total_documents": total_docs,
-                    "indexed_documents": indexed_docs,
-                    "supported_documents": supported_docs,
-                    "file_types": file_types,
-                    "folder_count": folder_count,
-                    "cache_status": "active" if total_docs > 0 else "empty"
-                }
-                
-            except RuntimeError:
-                try:
-                    from sqlalchemy import create_engine
-                    from sqlalchemy.orm import sessionmaker
-                    
-                    # Obter caminho absoluto para arquivo de banco de dados
-                    db_path = os.path.abspath('instance/app.db')
-                    if not os.path.exists(db_path):
-                        return {"error": "Database not found"}
-                    
-                    engine = create_engine(f'sqlite:///{db_path}')
-                    Session = sessionmaker(bind=engine)
-                    session = Session()
-                    
-                    total_docs = session.query(DocumentMetadata).count()
-                    indexed_docs = session.query(DocumentMetadata).filter_by(is_indexed=True).count()
-                    supported_docs = session.query(DocumentMetadata).filter_by(is_supported=True).count()
-                    
-                    # Obter breakdown de tipo de arquivo
-                    file_types = {}
-                    for doc_type in ['md', 'txt', 'docx', 'xlsx', 'pdf']:
-                        count = session.query(DocumentMetadata).filter_by(file_type=doc_type).count()
-                        file_types[doc_type] = count
-                    
-                    # Obter breakdown de pasta
-                    folder_count = session.query(db.func.count(db.func.distinct(DocumentMetadata.folder_path))).scalar()
-                    
-                    session.close()
-                    
-                    return {
-                        "total_documents": total_docs,
-                        "indexed_documents": indexed_docs,
-                        "supported_documents": supported_docs,
-                        "file_types": file_types,
-                        "folder_count": folder_count,
-                        "cache_status": "active" if total_docs > 0 else "empty"
-                    }
-                    
-                except Exception as e:
-                    return {"error": f"Database access error: {e}"}
-                    
-        except Exception as e:
-            return {"error": f"Error getting metadata stats: {e}"}
+        """Obter estatísticas sobre o cache de metadados de documentos
+        
+        Uma única consulta agrupada por pasta e tipo de arquivo fornece todos os totais, incluindo
+        bytes e fragmentos por pasta (planejamento de capacidade).
+        """
+        from sqlalchemy import text
+        
+        rows = self._run_sql(lambda session: session.execute(text("""
+            SELECT folder_path, file_type, COUNT(*),
+                   SUM(CASE WHEN is_indexed THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN is_supported THEN 1 ELSE 0 END),
+                   SUM(file_size), SUM(chunk_count)
+            FROM document_metadata
+            GROUP BY folder_path, file_type
+        """)).fetchall(), default=None)
+        if rows is None:
+            return {"error": "Error getting metadata stats"}
+        
+        file_types = {doc_type: 0 for doc_type in ['md', 'txt', 'docx', 'xlsx', 'pdf']}
+        folders = {}
+        total_docs = indexed_docs = supported_docs = total_bytes = total_chunks = 0
+        for folder_path, file_type, count, indexed, supported, size, chunks in rows:
+            indexed, supported, size, chunks = indexed or 0, supported or 0, size or 0, chunks or 0
+            total_docs += count
+            indexed_docs += indexed
+            supported_docs += supported
+            total_bytes += size
+            total_chunks += chunks
+            if file_type in file_types:
+                file_types[file_type] += count
+            folder = folders.setdefault(folder_path, {"documents": 0, "indexed_documents": 0, "bytes": 0, "chunks": 0})
+            folder["documents"] += count
+            folder["indexed_documents"] += indexed
+            folder["bytes"] += size
+            folder["chunks"] += chunks
+        
+        return {
+            "total_documents": total_docs,
+            "indexed_documents": indexed_docs,
+            "supported_documents": supported_docs,
+            "file_types": file_types,
+            "folder_count": len(folders),
+            "total_bytes": total_bytes,
+            "total_chunks": total_chunks,
+            "folders": dict(sorted(folders.items())),
+            "cache_status": "active" if total_docs > 0 else "empty"
+        }
 
     # Instância global
     index_manager = None
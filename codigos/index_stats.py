@@ -0,0 +1,185 @@
+"""
+Estatísticas Incrementais do Índice
+
+Contadores mantidos pelo IndexManager à medida que indexa: fragmentos por arquivo, agregados
+por pasta e por tipo de arquivo, e tokens de embedding por operação. Consultá-los não toca o
+banco nem o sistema de arquivos; o snapshot é remontado apenas depois de uma alteração.
+
+Os valores exatos são recalculados a partir do banco por IndexManager.refresh_stats
+(operação cara, para a página de administração).
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+FILE_TYPES = ("md", "txt", "docx", "xlsx", "pdf")
+
+
+class IndexStats:
+    """Contadores incrementais do índice com snapshot em cache"""
+
+    def __init__(self, vault_path: str):
+        self.vault_path = vault_path
+        self._lock = threading.Lock()
+        self._files = {}  # caminho do arquivo -> número de fragmentos
+        self._folders = {}  # pasta relativa -> {'files', 'chunks', 'file_types'}
+        self._operations = {}  # operação -> {'count', 'total_tokens'}
+        self._recent_tokens_used = 0  # últimos 30 dias: relido do banco periodicamente e somado a cada uso
+        self.refreshed_at = None
+        self.seeded = False
+        self._snapshot = None
+
+    def _folder_of(self, file_path: str) -> str:
+        rel_path = os.path.relpath(os.path.dirname(file_path), self.vault_path)
+        return "Root" if rel_path == "." else rel_path
+
+    @staticmethod
+    def _type_of(file_path: str) -> Optional[str]:
+        extension = os.path.splitext(file_path)[1].lstrip(".").lower()
+        return extension if extension in FILE_TYPES else None
+
+    def _apply(self, file_path: str, chunks: Optional[int]):
+        """Definir (ou remover, com None) a contagem de fragmentos de um arquivo e ajustar os agregados"""
+        previous = self._files.pop(file_path, None)
+        if previous is None and chunks is None:
+            return
+        folder = self._folders.setdefault(self._folder_of(file_path), {
+            "files": 0,
+            "chunks": 0,
+            "file_types": {file_type: 0 for file_type in FILE_TYPES}
+        })
+        file_type = self._type_of(file_path)
+        if previous is not None:
+            folder["files"] -= 1
+            folder["chunks"] -= previous
+            if file_type:
+                folder["file_types"][file_type] -= 1
+        if chunks is not None:
+            self._files[file_path] = chunks
+            folder["files"] += 1
+            folder["chunks"] += chunks
+            if file_type:
+                folder["file_types"][file_type] += 1
+        if folder["files"] <= 0:
+            del self._folders[self._folder_of(file_path)]
+        self._snapshot = None
+
+    def set_file(self, file_path: str, chunks: int):
+        """Registrar um arquivo indexado com seu número de fragmentos"""
+        with self._lock:
+            self._apply(file_path, chunks)
+
+    def add_chunks(self, file_path: str, delta: int):
+        """Ajustar a contagem de fragmentos de um arquivo já registrado"""
+        with self._lock:
+            if file_path in self._files:
+                self._apply(file_path, max(self._files[file_path] + delta, 0))
+
+    def remove_file(self, file_path: str):
+        """Remover um arquivo das estatísticas"""
+        with self._lock:
+            self._apply(file_path, None)
+
+    def add_tokens(self, operation: str, tokens_used: int):
+        """Somar tokens de embedding de uma operação"""
+        with self._lock:
+            entry = self._operations.setdefault(operation, {"count": 0, "total_tokens": 0})
+            entry["count"] += 1
+            entry["total_tokens"] += tokens_used
+            self._recent_tokens_used += tokens_used
+            self._snapshot = None
+
+    def set_recent_tokens(self, recent_tokens_used: int):
+        """Substituir o total dos últimos 30 dias pelo valor relido do banco (usos antigos saem da janela)"""
+        with self._lock:
+            self._recent_tokens_used = recent_tokens_used
+            self._snapshot = None
+
+    def reset(self):
+        """Zerar os contadores de arquivos (novo índice); o uso de tokens é histórico e é mantido"""
+        with self._lock:
+            self._files = {}
+            self._folders = {}
+            self.seeded = True
+            self._snapshot = None
+
+    def seed(self, file_chunks: Dict[str, int], operations: Optional[List[Dict]] = None, recent_tokens_used: int = 0):
+        """Substituir os contadores por valores recalculados a partir do banco (operations=None mantém os tokens)"""
+        with self._lock:
+            self._files = {}
+            self._folders = {}
+            for file_path, chunks in file_chunks.items():
+                self._apply(file_path, chunks)
+            if operations is not None:
+                self._operations = {
+                    op["operation"]: {"count": op["count"], "total_tokens": op["total_tokens"]}
+                    for op in operations
+                }
+                self._recent_tokens_used = recent_tokens_used
+            self.refreshed_at = datetime.now()
+            self.seeded = True
+            self._snapshot = None
+
+    def to_dict(self) -> Dict:
+        """Estado serializável, salvo junto do índice"""
+        with self._lock:
+            return {
+                "files": dict(self._files),
+                "operations": {op: dict(entry) for op, entry in self._operations.items()},
+                "recent_tokens_used": self._recent_tokens_used,
+                "refreshed_at": self.refreshed_at
+            }
+
+    def load(self, data: Optional[Dict]):
+        """Restaurar o estado salvo por to_dict (None mantém as estatísticas não inicializadas)"""
+        if not data:
+            return
+        with self._lock:
+            self._files = {}
+            self._folders = {}
+            for file_path, chunks in data.get("files", {}).items():
+                self._apply(file_path, chunks)
+            self._operations = {op: dict(entry) for op, entry in data.get("operations", {}).items()}
+            self._recent_tokens_used = data.get("recent_tokens_used", 0)
+            self.refreshed_at = data.get("refreshed_at")
+            self.seeded = True
+            self._snapshot = None
+
+    def snapshot(self) -> Dict:
+        """Estatísticas agregadas; remontadas só quando algum contador mudou"""
+        with self._lock:
+            if self._snapshot is None:
+                folders = [
+                    {
+                        "path": path,
+                        "full_path": self.vault_path if path == "Root" else os.path.join(self.vault_path, path),
+                        "files": folder["files"],
+                        "supported_files": folder["files"],
+                        "chunks": folder["chunks"],
+                        "file_types": dict(folder["file_types"])
+                    }
+                    for path, folder in sorted(self._folders.items())
+                ]
+                file_types = {file_type: sum(folder["file_types"][file_type] for folder in folders) for file_type in FILE_TYPES}
+                self._snapshot = {
+                    "unique_files": len(self._files),
+                    "folder_structure": {
+                        "root": self.vault_path,
+                        "folders": folders,
+                        "total_files": len(self._files),
+                        "supported_files": len(self._files),
+                        "file_types": file_types
+                    },
+                    "embedding_usage": {
+                        "total_tokens_used": sum(entry["total_tokens"] for entry in self._operations.values()),
+                        "recent_tokens_used": self._recent_tokens_used,
+                        "operations": [
+                            {"operation": op, "count": entry["count"], "total_tokens": entry["total_tokens"]}
+                            for op, entry in sorted(self._operations.items())
+                        ]
+                    },
+                    "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None
+                }
+            return self._snapshot
@@ -0,0 +1,120 @@
+"""
+Fila de Prioridade da Indexação
+
+A varredura do vault (só os.stat) coloca na fila os arquivos novos ou alterados; o processamento
+(leitura, fragmentação, embedding) consome a fila por ordem de prioridade, dentro de um orçamento
+de tempo por ciclo, e o que sobrar continua no próximo ciclo. A ordem é:
+
+1. prioridade manual (boost) definida pelo administrador para um arquivo ou pasta, maior primeiro;
+2. arquivos modificados dentro de recent_window_sec, antes dos demais;
+3. arquivos menores primeiro (e, no empate, os mais recentes).
+
+Assim uma nota recém-salva fica pesquisável em segundos, mesmo durante uma ingestão em massa de PDFs.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class IndexWorkQueue:
+    """Fila de arquivos pendentes de indexação, ordenada por boost, recência e tamanho"""
+
+    def __init__(self, recent_window_sec: float = 3600):
+        self.recent_window_sec = recent_window_sec
+        self._lock = threading.Lock()
+        self._heap = []  # (chave de prioridade, sequência, caminho)
+        self._entries = {}  # caminho -> (mtime, tamanho, sequência da entrada válida)
+        self._boosts = {}  # caminho de arquivo ou pasta -> prioridade manual
+        self._counter = itertools.count()
+
+    def _boost_of(self, file_path: str) -> int:
+        """Maior boost entre o próprio arquivo e as pastas que o contêm"""
+        boost = 0
+        for path, value in self._boosts.items():
+            if file_path == path or file_path.startswith(os.path.join(path, "")):
+                boost = max(boost, value)
+        return boost
+
+    def priority_key(self, file_path: str, mtime: float, size: int, now: float = None) -> Tuple:
+        """Chave de ordenação (menor = processado antes)"""
+        now = time.time() if now is None else now
+        recent = now - mtime <= self.recent_window_sec
+        return (-self._boost_of(file_path), 0 if recent else 1, size, -mtime)
+
+    def _push(self, file_path: str, mtime: float, size: int, now: float):
+        sequence = next(self._counter)
+        # Entradas anteriores do mesmo arquivo ficam obsoletas no heap e são descartadas no pop
+        self._entries[file_path] = (mtime, size, sequence)
+        heapq.heappush(self._heap, (self.priority_key(file_path, mtime, size, now), sequence, file_path))
+
+    def push(self, file_path: str, mtime: float, size: int):
+        """Enfileirar (ou reposicionar) um arquivo pendente"""
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry[:2] == (mtime, size):
+                return
+            self._push(file_path, mtime, size, time.time())
+
+    def pop(self) -> Optional[Tuple[str, float, int]]:
+        """Próximo arquivo (caminho, mtime, tamanho), ou None se a fila estiver vazia"""
+        with self._lock:
+            while self._heap:
+                _, sequence, file_path = heapq.heappop(self._heap)
+                entry = self._entries.get(file_path)
+                if entry is not None and entry[2] == sequence:
+                    del self._entries[file_path]
+                    return file_path, entry[0], entry[1]
+            return None
+
+    def discard(self, file_path: str):
+        """Retirar um arquivo da fila (ex.: removido do disco)"""
+        with self._lock:
+            self._entries.pop(file_path, None)
+
+    def boost(self, path: str, priority: int = 1):
+        """Definir a prioridade manual de um arquivo ou pasta (0 remove) e reordenar os pendentes afetados"""
+        path = os.path.normpath(path)
+        with self._lock:
+            if priority:
+                self._boosts[path] = priority
+            else:
+                self._boosts.pop(path, None)
+            now = time.time()
+            for file_path, (mtime, size, _) in list(self._entries.items()):
+                if file_path == path or file_path.startswith(os.path.join(path, "")):
+                    self._push(file_path, mtime, size, now)
+
+    def order(self, file_paths: Iterable[str]) -> List[str]:
+        """Ordenar caminhos pela mesma prioridade da fila (arquivos inacessíveis vão para o fim)"""
+        now = time.time()
+        keyed = []
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+                key = (0,) + self.priority_key(file_path, stat.st_mtime, stat.st_size, now)
+            except OSError:
+                key = (1,)
+            keyed.append((key, file_path))
+        keyed.sort()
+        return [file_path for _, file_path in keyed]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def status(self, preview: int = 10) -> Dict:
+        """Arquivos pendentes, boosts ativos e os próximos da fila"""
+        with self._lock:
+            upcoming = heapq.nsmallest(
+                preview,
+                (item for item in self._heap if self._entries.get(item[2], (None, None, None))[2] == item[1])
+            )
+            return {
+                "pending_files": len(self._entries),
+                "boosts": dict(self._boosts),
+                "next_files": [file_path for _, _, file_path in upcoming]
+            }
@@ -0,0 +1,103 @@
+"""
+Detecção de Fragmentos Quase Duplicados (SimHash + LSH)
+
+Cada fragmento recebe uma impressão SimHash de 64 bits calculada sobre shingles de 3 palavras:
+textos quase iguais (modelos de contrato, relatórios mensais, cópias em várias pastas) têm
+impressões a poucos bits de distância. Para encontrar candidatos sem comparar com todos, a
+impressão é dividida em NUM_BANDS faixas de 16 bits (LSH): duas impressões a no máximo
+NUM_BANDS - 1 bits de distância têm pelo menos uma faixa idêntica.
+
+O IndexManager guarda as faixas na tabela chunk_near_duplicates e agrupa cada fragmento novo
+com um representante já existente; só o representante é embedado e entra no índice FAISS.
+"""
+
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+NUM_BANDS = 4
+BAND_BITS = 64 // NUM_BANDS
+SHINGLE_SIZE = 3
+MIN_TOKENS = 20  # Fragmentos muito curtos geram impressões pouco confiáveis
+
+# Linha de chunk_near_duplicates no formato de fingerprint_row
+INSERT_ROW_SQL = """
+    INSERT OR REPLACE INTO chunk_near_duplicates (chunk_id, representative_id, simhash, band0, band1, band2, band3)
+    VALUES (:chunk_id, :representative_id, :simhash, :band0, :band1, :band2, :band3)
+"""
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+
+def simhash(text: str) -> Optional[int]:
+    """Impressão SimHash de 64 bits (sem sinal) do texto, ou None se o texto for curto demais"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    # Cada bit da impressão é o voto majoritário daquele bit entre os hashes dos shingles
+    ones = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).sum(axis=0)
+    bits = (ones * 2 > len(hashes)).astype(np.uint64)
+    return int((bits << _BIT_SHIFTS).sum())
+
+
+def bands(fingerprint: int) -> Tuple[int, ...]:
+    """Faixas de BAND_BITS bits da impressão, usadas como chaves do LSH"""
+    mask = (1 << BAND_BITS) - 1
+    return tuple((fingerprint >> (band * BAND_BITS)) & mask for band in range(NUM_BANDS))
+
+
+def hamming(a: int, b: int) -> int:
+    """Número de bits diferentes entre duas impressões"""
+    return bin(a ^ b).count("1")
+
+
+def to_signed(fingerprint: int) -> int:
+    """Converter para inteiro de 64 bits com sinal (INTEGER do SQLite)"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def from_signed(value: int) -> int:
+    """Inverso de to_signed"""
+    return value + (1 << 64) if value < 0 else value
+
+
+def cluster(items: Iterable[Tuple[int, str]], max_distance: int) -> List[Dict]:
+    """Agrupar (chunk_id, texto) em ordem: cada fragmento aponta para o primeiro representante próximo
+
+    Retorna linhas {chunk_id, representative_id, simhash, band0..} para chunk_near_duplicates
+    (fragmentos curtos demais ficam de fora).
+    """
+    buckets = {}  # (faixa, valor) -> [(representante, impressão)]
+    rows = []
+    for chunk_id, text in items:
+        fingerprint = simhash(text or "")
+        if fingerprint is None:
+            continue
+        keys = list(enumerate(bands(fingerprint)))
+        representative = chunk_id
+        for key in keys:
+            match = next((rep for rep, other in buckets.get(key, []) if hamming(fingerprint, other) <= max_distance), None)
+            if match is not None:
+                representative = match
+                break
+        if representative == chunk_id:
+            for key in keys:
+                buckets.setdefault(key, []).append((chunk_id, fingerprint))
+        rows.append(fingerprint_row(chunk_id, representative, fingerprint))
+    return rows
+
+
+def fingerprint_row(chunk_id: int, representative_id: int, fingerprint: int) -> Dict:
+    """Linha de chunk_near_duplicates para um fragmento"""
+    row = {"chunk_id": chunk_id, "representative_id": representative_id, "simhash": to_signed(fingerprint)}
+    for band, value in enumerate(bands(fingerprint)):
+        row[f"band{band}"] = value
+    return row
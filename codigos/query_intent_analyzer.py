@@ -177,6 +177,65 @@ TERM_EXTRACTION_PATTERNS = [
     (r'analise\s+(de|sobre)\s+([^\s,]+)', 1),
 ]
 
+# Identificadores numéricos indexados para correspondência exata (normalizados para apenas dígitos)
+# Formato: (tipo, pattern, quantidade de dígitos)
+IDENTIFIER_PATTERNS = [
+    ("cnpj", re.compile(r'(?<![\d./-])\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}(?![\d/-])'), 14),
+    ("cpf", re.compile(r'(?<![\d./-])\d{3}\.?\d{3}\.?\d{3}-?\d{2}(?![\d/-])'), 11),
+]
+
+def normalize_identifier(value: str) -> str:
+    """Normaliza um CNPJ/CPF para apenas dígitos (ex.: '12.345.678/0001-90' -> '12345678000190')."""
+    return re.sub(r'\D', '', value)
+
+def _has_valid_check_digits(value: str) -> bool:
+    """Verifica os dígitos verificadores de um CPF (11 dígitos) ou CNPJ (14 dígitos) normalizado."""
+    if len(set(value)) == 1:
+        return False
+    if len(value) == 11:
+        weights = [list(range(10, 1, -1)), list(range(11, 1, -1))]
+    else:
+        weights = [[5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]]
+    for position, weight in zip((len(value) - 2, len(value) - 1), weights):
+        remainder = sum(int(d) * w for d, w in zip(value[:position], weight)) % 11
+        if int(value[position]) != (0 if remainder < 2 else 11 - remainder):
+            return False
+    return True
+
+def extract_identifiers(text: str) -> List[tuple]:
+    """
+    Extrai CNPJs e CPFs de um texto para o índice de correspondência exata.
+    
+    Números sem pontuação só são aceitos com dígitos verificadores válidos,
+    para não indexar telefones e outros números com a mesma quantidade de dígitos.
+    
+    Returns:
+        Lista sem duplicatas de tuplas (tipo, valor normalizado)
+    """
+    identifiers = []
+    for kind, pattern, digits in IDENTIFIER_PATTERNS:
+        for match in pattern.findall(text):
+            value = normalize_identifier(match)
+            if len(value) != digits or (kind, value) in identifiers:
+                continue
+            if value == match and not _has_valid_check_digits(value):
+                continue
+            identifiers.append((kind, value))
+    return identifiers
+
+def _extract_exact_terms(query: str, quoted_terms: List[str]) -> List[Dict]:
+    """Monta os termos de correspondência exata: CNPJ/CPF em dígitos e frases entre aspas em casefold."""
+    exact_terms = []
+    for match in re.findall(r'[\d\.\/\-]{11,18}', query):
+        value = normalize_identifier(match)
+        kind = {14: "cnpj", 11: "cpf"}.get(len(value))
+        if kind and not any(term['normalized'] == value for term in exact_terms):
+            exact_terms.append({'type': kind, 'value': match, 'normalized': value})
+    for phrase in quoted_terms:
+        if phrase.strip():
+            exact_terms.append({'type': "phrase", 'value': phrase, 'normalized': phrase.strip().casefold()})
+    return exact_terms
+
 def analyze_query_intent(query: str, enable_debug_logging: bool = False) -> Dict:
     """
     Analisa a consulta do usuário para determinar a intenção de busca e estratégia.
@@ -190,6 +249,8 @@ def analyze_query_intent(query: str, enable_debug_logging: bool = False) -> Dict
         - is_comprehensive_search: Booleano indicando se busca abrangente é necessária
         - intent_type: String descrevendo o tipo de intenção
         - search_terms: Lista de termos de busca extraídos
+        - exact_terms: Termos para correspondência exata (CNPJ/CPF normalizados e frases entre aspas),
+          cada um como {'type': 'cnpj' | 'cpf' | 'phrase', 'value': ..., 'normalized': ...}
         - query_lower: Versão em minúsculas da consulta
     """
     query_lower = query.lower()
@@ -205,6 +266,7 @@ def analyze_query_intent(query: str, enable_debug_logging: bool = False) -> Dict
     
     # Extrair termos de busca para buscas abrangentes
     search_terms = []
+    exact_terms = []
     if is_comprehensive:
         # Extrair números de CNPJ/CPF
         cnpj_matches = re.findall(r'[\d\.\/\-]{14,18}', query)
@@ -234,6 +296,9 @@ def analyze_query_intent(query: str, enable_debug_logging: bool = False) -> Dict
                 seen.add(term)
                 unique_search_terms.append(term)
         search_terms = unique_search_terms
+        
+        # Termos que podem ser respondidos por correspondência exata, sem embedding
+        exact_terms = _extract_exact_terms(query, quoted_terms)
     
     # Log de debug
     if enable_debug_logging:
@@ -243,6 +308,7 @@ def analyze_query_intent(query: str, enable_debug_logging: bool = False) -> Dict
         print(f"  É abrangente: {is_comprehensive}")
         print(f"  Padrão correspondente: {matched_pattern}")
         print(f"  Termos de busca encontrados: {search_terms}")
+        print(f"  Termos exatos: {exact_terms}")
     
     # Determinar tipo de intenção
     if is_comprehensive:
@@ -257,6 +323,7 @@ def analyze_query_intent(query: str, enable_debug_logging: bool = False) -> Dict
         'is_comprehensive_search': is_comprehensive,
         'intent_type': intent_type,
         'search_terms': search_terms,
+        'exact_terms': exact_terms,
         'query_lower': query_lower
     }
 
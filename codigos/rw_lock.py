@@ -0,0 +1,51 @@
+"""
+Trava de Leitura/Escrita
+
+Permite vários leitores simultâneos (buscas) e um escritor exclusivo (troca do índice).
+Escritores têm preferência: quando um escritor está esperando, novos leitores aguardam,
+para que a troca do índice não seja adiada indefinidamente por buscas contínuas.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Trava de leitura/escrita com preferência para escritores"""
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer_active = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        """Adquirir a trava para leitura (compartilhada)"""
+        with self._condition:
+            while self._writer_active or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Adquirir a trava para escrita (exclusiva)"""
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writer_active or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writer_active = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer_active = False
+                self._condition.notify_all()
@@ -0,0 +1,81 @@
+"""
+Cache de Resultados de Busca
+
+Cache LRU com expiração (TTL) para listas de resultados do IndexManager.search.
+A chave inclui a época do índice: toda alteração no índice incrementa a época,
+então resultados antigos nunca são servidos depois de uma atualização.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Normalizar consulta para a chave do cache (casefold e espaços colapsados)"""
+    return " ".join(query.casefold().split())
+
+
+def make_cache_key(query: str, k: int, mode: str, search_terms: Optional[List[str]],
+                   filters: Optional[Dict], epoch: int) -> tuple:
+    """Montar a chave do cache a partir dos parâmetros da busca e da época do índice"""
+    terms_key = tuple(search_terms) if search_terms else ()
+    filters_key = json.dumps(filters, sort_keys=True, default=str) if filters else ""
+    return (normalize_query(query), k, mode, terms_key, filters_key, epoch)
+
+
+class SearchResultCache:
+    """Cache LRU + TTL thread-safe de resultados de busca"""
+
+    def __init__(self, max_size: int = 256, ttl_sec: float = 600):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._entries = OrderedDict()  # chave -> (expira_em, resultados)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[List[Dict]]:
+        """Retornar cópia dos resultados em cache, ou None se ausente/expirado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            results = entry[1]
+        # Cópia rasa de cada resultado: chamadores como search_with_summaries adicionam campos
+        return [dict(result) for result in results]
+
+    def put(self, key: tuple, results: List[Dict]):
+        """Armazenar resultados, removendo os menos usados recentemente se necessário"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, [dict(result) for result in results])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Esvaziar o cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Estatísticas de uso do cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_sec': self.ttl_sec,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
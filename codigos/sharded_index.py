@@ -0,0 +1,214 @@
+"""
+Índice FAISS Particionado (Shards)
+
+Divide os vetores do índice de documentos em shards independentes, por pasta de primeiro nível
+do vault ("folder") ou por hash do id do fragmento ("hash"). Cada shard é um faiss.IndexFlatL2
+próprio, salvo em arquivo separado: uma alteração em uma pasta só regrava o shard dela.
+
+A busca consulta os shards em paralelo (o FAISS libera o GIL durante a busca) e combina os
+resultados, já ordenados por shard, com um merge k-way. A classe expõe a parte da interface de
+faiss.Index usada pelo IndexManager (d, ntotal, search, reconstruct, reconstruct_batch), com
+posições globais, para que as listas chunk_ids/chunk_hashes continuem alinhadas às posições.
+"""
+
+import hashlib
+import heapq
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+SHARD_STRATEGIES = ("folder", "hash")
+
+
+def shard_key(strategy: str, num_shards: int, chunk_id: int, file_path: Optional[str], vault_path: str) -> str:
+    """Chave do shard de um fragmento: pasta de primeiro nível do vault ou hash do id"""
+    if strategy == "folder":
+        if not file_path:
+            return ""
+        parts = os.path.relpath(file_path, vault_path).replace("\\", "/").split("/")
+        # Arquivos na raiz do vault ficam no shard ""
+        return parts[0] if len(parts) > 1 else ""
+    return str(zlib.crc32(str(chunk_id).encode()) % num_shards)
+
+
+def _shard_filename(key: str) -> str:
+    """Nome de arquivo estável para a chave do shard (nomes de pasta podem ter qualquer caractere)"""
+    return hashlib.md5(key.encode("utf-8")).hexdigest()[:16] + ".faiss"
+
+
+class ShardedIndex:
+    """Conjunto de shards IndexFlatL2 com busca em paralelo e posições globais"""
+
+    def __init__(self, d: int, strategy: str, num_shards: int = 8, max_workers: int = 4):
+        self.d = d
+        self.strategy = strategy
+        self.num_shards = num_shards
+        self.max_workers = max_workers
+        self.shards = {}  # chave -> faiss.IndexFlatL2
+        self.shard_positions = {}  # chave -> posições globais dos vetores do shard, na ordem local
+        self.locations = []  # posição global -> (chave, posição local)
+        self.dirty = set()  # shards alterados desde o último save_shards
+        self._executor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # locations é derivável de shard_positions; o executor não é serializável
+        state["locations"] = None
+        state["_executor"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rebuild_locations()
+
+    def _rebuild_locations(self):
+        self.locations = [None] * sum(len(positions) for positions in self.shard_positions.values())
+        for key, positions in self.shard_positions.items():
+            for local, position in enumerate(positions):
+                self.locations[position] = (key, local)
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.locations)
+
+    def add_with_keys(self, vectors: np.ndarray, keys: List[str]):
+        """Adicionar vetores (um por linha) aos shards indicados; recebem as próximas posições globais"""
+        groups = {}
+        for row, key in enumerate(keys):
+            groups.setdefault(key, []).append(row)
+        # Posições globais seguem a ordem das linhas, como em faiss.Index.add
+        base = len(self.locations)
+        self.locations.extend([None] * len(keys))
+        for key, rows in groups.items():
+            index = self.shards.get(key)
+            if index is None:
+                index = self.shards[key] = faiss.IndexFlatL2(self.d)
+                self.shard_positions[key] = []
+            local_start = index.ntotal
+            index.add(np.ascontiguousarray(vectors[rows], dtype=np.float32))
+            for offset, row in enumerate(rows):
+                self.shard_positions[key].append(base + row)
+                self.locations[base + row] = (key, local_start + offset)
+            self.dirty.add(key)
+
+    def attach_shard(self, key: str, index, positions: List[int], dirty: bool = True):
+        """Incluir um shard já montado com as posições globais dos seus vetores"""
+        self.shards[key] = index
+        self.shard_positions[key] = list(positions)
+        if dirty:
+            self.dirty.add(key)
+        if len(self.locations) < max(positions, default=-1) + 1:
+            self.locations.extend([None] * (max(positions) + 1 - len(self.locations)))
+        for local, position in enumerate(positions):
+            self.locations[position] = (key, local)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        key, local = self.locations[position]
+        return self.shards[key].reconstruct(local)
+
+    def reconstruct_batch(self, positions) -> np.ndarray:
+        return np.vstack([self.reconstruct(int(position)) for position in positions])
+
+    def _fan_out(self, fn, keys: List[str]) -> list:
+        """Executar fn(chave) em cada shard, em paralelo quando há mais de um"""
+        if len(keys) <= 1 or self.max_workers <= 1:
+            return [fn(key) for key in keys]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="faiss-shard")
+        return list(self._executor.map(fn, keys))
+
+    def _merge(self, nq: int, k: int, shard_results: List[Tuple[str, np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge k-way dos resultados de cada shard (já ordenados por distância) em posições globais"""
+        D = np.full((nq, k), np.inf, dtype=np.float32)
+        I = np.full((nq, k), -1, dtype=np.int64)
+        for q in range(nq):
+            rows = []
+            for key, shard_D, shard_I in shard_results:
+                positions = self.shard_positions[key]
+                rows.append([(float(distance), positions[local]) for distance, local in zip(shard_D[q], shard_I[q]) if local >= 0])
+            for j, (distance, position) in enumerate(islice(heapq.merge(*rows), k)):
+                D[q, j] = distance
+                I[q, j] = position
+        return D, I
+
+    def search(self, x: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Buscar os k vizinhos mais próximos em todos os shards; retorna (D, I) como faiss.Index.search"""
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        keys = [key for key, index in self.shards.items() if index.ntotal]
+
+        def search_shard(key):
+            index = self.shards[key]
+            D, I = index.search(x, min(k, index.ntotal))
+            return key, D, I
+
+        return self._merge(x.shape[0], k, self._fan_out(search_shard, keys))
+
+    def search_positions(self, x: np.ndarray, k: int, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Buscar apenas entre as posições globais informadas (busca filtrada)"""
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        local_by_key = {}
+        for position in positions:
+            key, local = self.locations[int(position)]
+            local_by_key.setdefault(key, []).append(local)
+
+        def search_shard(key):
+            index = self.shards[key]
+            local = np.asarray(local_by_key[key], dtype=np.int64)
+            n = min(k, len(local))
+            if hasattr(faiss, "SearchParameters"):
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(local))
+                D, I = index.search(x, n, params=params)
+                return key, D, I
+            vectors = np.vstack([index.reconstruct(int(i)) for i in local])
+            distances = (
+                np.sum(x ** 2, axis=1)[:, None]
+                + np.sum(vectors ** 2, axis=1)[None, :]
+                - 2 * x @ vectors.T
+            )
+            order = np.argsort(distances, axis=1)[:, :n]
+            return key, np.take_along_axis(distances, order, axis=1), local[order]
+
+        return self._merge(x.shape[0], k, self._fan_out(search_shard, list(local_by_key)))
+
+    def save_shards(self, directory: str):
+        """Gravar os shards alterados e remover arquivos de shards que deixaram de existir"""
+        os.makedirs(directory, exist_ok=True)
+        for key in list(self.dirty):
+            if key in self.shards:
+                path = os.path.join(directory, _shard_filename(key))
+                faiss.write_index(self.shards[key], path + ".tmp")
+                os.replace(path + ".tmp", path)
+        self.dirty.clear()
+        expected = {_shard_filename(key) for key in self.shards}
+        for name in os.listdir(directory):
+            if name.endswith(".faiss") and name not in expected:
+                os.remove(os.path.join(directory, name))
+
+    def load_shards(self, directory: str):
+        """Carregar os arquivos dos shards listados em shard_positions"""
+        for key, positions in self.shard_positions.items():
+            index = faiss.read_index(os.path.join(directory, _shard_filename(key)))
+            if index.ntotal != len(positions):
+                raise ValueError(f"Shard '{key}' com {index.ntotal} vetores, esperados {len(positions)}")
+            self.shards[key] = index
+        self.dirty.clear()
+
+    def manifest(self) -> "ShardedIndex":
+        """Cópia sem os vetores, para salvar junto das listas de ids (os shards vão em arquivos próprios)"""
+        copy = ShardedIndex(self.d, self.strategy, self.num_shards, self.max_workers)
+        copy.shard_positions = self.shard_positions
+        copy.locations = self.locations
+        return copy
+
+    def get_stats(self) -> Dict:
+        """Número de vetores por shard"""
+        return {
+            "strategy": self.strategy,
+            "shard_count": len(self.shards),
+            "vectors_per_shard": {key: len(positions) for key, positions in self.shard_positions.items()}
+        }
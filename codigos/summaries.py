@@ -0,0 +1,91 @@
+"""
+Resumos Extrativos de Fragmentos
+
+Mesma heurística do IndexManager.get_smart_summary original (pontuação de sentenças por palavras
+indicadoras e números, seleção gulosa pela pontuação), calculada de forma vetorizada: cada palavra
+é procurada uma única vez no texto inteiro e as ocorrências são atribuídas às sentenças com
+np.searchsorted; a seleção usa soma acumulada dos comprimentos em vez de concatenar strings.
+
+Os resumos nos tamanhos configurados são calculados uma vez, quando o fragmento é salvo, e
+guardados em chunk_metadata["summaries"]; a busca com resumos apenas os consulta.
+"""
+
+import re
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# (palavras, peso) - mesmas palavras e pesos da heurística original (correspondência por substring)
+SENTENCE_KEYWORDS = [
+    (("important", "key", "critical", "essential", "main", "primary"), 3),
+    (("example", "instance", "case", "scenario"), 2),
+    (("definition", "concept", "principle", "rule"), 2),
+    (("however", "but", "although", "nevertheless"), 1),  # Contrastes costumam trazer informação importante
+]
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def score_sentences(text: str):
+    """Dividir o texto em sentenças e pontuá-las; retorna (sentenças, comprimentos, pontuações)"""
+    flat = text.replace('\n', ' ')
+    sentences = flat.split('. ')
+    lengths = np.fromiter(map(len, sentences), dtype=np.int64, count=len(sentences))
+    starts = np.concatenate(([0], np.cumsum(lengths[:-1] + 2)))
+    scores = np.zeros(len(sentences), dtype=np.int64)
+
+    lower = flat.lower()
+    for words, weight in SENTENCE_KEYWORDS:
+        if len(lower) == len(flat):
+            positions = [position for word in words for position in _find_all(lower, word)]
+            scores += weight * _sentences_hit(positions, starts, len(sentences))
+        else:
+            # lower() mudou o comprimento (caracteres especiais): as posições não batem, testar por sentença
+            scores += weight * np.fromiter(
+                (any(word in sentence.lower() for word in words) for sentence in sentences),
+                dtype=np.int64, count=len(sentences)
+            )
+    scores += _sentences_hit([match.start() for match in NUMBER_PATTERN.finditer(flat)], starts, len(sentences))
+    return sentences, lengths, scores
+
+
+def _find_all(text: str, word: str):
+    """Posições de todas as ocorrências de word em text"""
+    position = text.find(word)
+    while position != -1:
+        yield position
+        position = text.find(word, position + 1)
+
+
+def _sentences_hit(positions: List[int], starts: np.ndarray, count: int) -> np.ndarray:
+    """Vetor 0/1 indicando as sentenças que contêm alguma das posições"""
+    hits = np.zeros(count, dtype=np.int64)
+    if positions:
+        hits[np.searchsorted(starts, positions, side='right') - 1] = 1
+    return hits
+
+
+def smart_summary(text: str, max_length: int = 1000, scored=None) -> str:
+    """Resumo extrativo de até max_length caracteres (mesmo resultado do get_smart_summary original)"""
+    if len(text) <= max_length:
+        return text
+
+    sentences, lengths, scores = scored if scored is not None else score_sentences(text)
+    # Ordenação estável por pontuação decrescente, como list.sort(reverse=True)
+    order = np.argsort(-scores, kind='stable')
+    # Cada sentença entra com ". "; parar na primeira que não couber
+    cumulative = np.cumsum(lengths[order] + 2)
+    selected = order[:np.searchsorted(cumulative, max_length, side='right')]
+
+    summary = "".join(sentences[i] + ". " for i in selected)
+    if summary and not summary.endswith('.'):
+        summary = summary.rstrip() + '.'
+    return summary.strip() or text[:max_length] + "..."
+
+
+def precompute_summaries(text: str, lengths: Iterable[int]) -> Dict[str, str]:
+    """Resumos do texto para cada tamanho menor que o texto (chaves em texto, para JSON)"""
+    lengths = [length for length in lengths if len(text) > length]
+    if not lengths:
+        return {}
+    scored = score_sentences(text)
+    return {str(length): smart_summary(text, length, scored) for length in lengths}
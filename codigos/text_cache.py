@@ -0,0 +1,99 @@
+"""
+Cache de Texto Extraído
+
+Extrair texto de PDF (com tabelas), XLSX (pandas) e DOCX é caro, e a verificação de alterações
+precisava do texto completo só para calcular o hash e, muitas vezes, concluir que nada mudou (ex.:
+ferramenta de sincronização que apenas tocou o arquivo). O cache guarda o texto extraído,
+comprimido com zlib, endereçado pela impressão exata dos bytes brutos do arquivo (fingerprint.py):
+um arquivo com os mesmos bytes, em qualquer caminho, não é extraído de novo. A impressão custa uma
+leitura sequencial do arquivo, bem menos que a extração.
+
+Só os formatos com extração cara passam pelo cache; .md e .txt são lidos diretamente.
+"""
+
+import os
+import threading
+import zlib
+from typing import Optional
+
+CACHED_EXTENSIONS = (".pdf", ".docx", ".xlsx")
+
+
+class ParsedTextCache:
+    """Texto extraído comprimido em disco, um arquivo por impressão exata, com limite de tamanho total"""
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None  # Calculado na primeira gravação
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, fingerprint: str) -> str:
+        algorithm, _, digest = fingerprint.partition(":")
+        return os.path.join(self.directory, digest[:2], f"{algorithm}_{digest}.z")
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        """Texto guardado para a impressão, ou None"""
+        path = self._path(fingerprint)
+        try:
+            with open(path, "rb") as f:
+                text = zlib.decompress(f.read()).decode("utf-8")
+        except (OSError, zlib.error, UnicodeDecodeError):
+            self.misses += 1
+            return None
+        os.utime(path)  # Marcar como usado recentemente (poda por data de acesso)
+        self.hits += 1
+        return text
+
+    def put(self, fingerprint: str, text: str):
+        """Guardar o texto extraído para a impressão"""
+        path = self._path(fingerprint)
+        data = zlib.compress(text.encode("utf-8"), 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._prune()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".z"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _prune(self):
+        """Remover as entradas usadas há mais tempo até ficar abaixo de 80% do limite"""
+        target = self.max_bytes * 0.8
+        for _, size, path in sorted(self._entries()):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+    def get_stats(self):
+        return {
+            "directory": self.directory,
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,113 @@
+"""
+Agregados de Uso de Embeddings
+
+A tabela index_embedding_usage recebe uma linha por chamada de embedding, dos dois gerenciadores
+(documentos e memória de chat). Para que as estatísticas não dependam do tamanho do histórico,
+cada registro também atualiza, na mesma transação, os agregados diário (embedding_usage_daily)
+e mensal (embedding_usage_monthly). As consultas de estatísticas leem só os agregados, e as
+linhas brutas antigas podem ser removidas (retenção) sem perder os totais.
+
+As funções recebem qualquer sessão/conexão SQLAlchemy com execute(), para servir tanto à sessão
+do Flask quanto às sessões autônomas.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import text
+
+ROLLUP_TABLES = {
+    "embedding_usage_daily": "day",
+    "embedding_usage_monthly": "month"
+}
+
+
+def ensure_rollup_tables(session) -> bool:
+    """Criar as tabelas de agregados; na criação, preenchê-las a partir das linhas brutas existentes.
+
+    Retorna True se as tabelas foram criadas agora (e preenchidas).
+    """
+    created = False
+    for table, period in ROLLUP_TABLES.items():
+        exists = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table}
+        ).fetchone()
+        if exists:
+            continue
+        session.execute(text(f"""
+            CREATE TABLE {table} (
+                {period} TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                model TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                tokens_used INTEGER NOT NULL DEFAULT 0,
+                text_length INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({period}, operation, model)
+            ) WITHOUT ROWID
+        """))
+        period_expr = "date(created_at)" if period == "day" else "strftime('%Y-%m', created_at)"
+        session.execute(text(f"""
+            INSERT INTO {table} ({period}, operation, model, calls, tokens_used, text_length)
+            SELECT {period_expr}, operation, model, COUNT(*), SUM(tokens_used), SUM(text_length)
+            FROM index_embedding_usage
+            WHERE created_at IS NOT NULL
+            GROUP BY 1, 2, 3
+        """))
+        created = True
+    return created
+
+
+def record_usage(session, operation: str, model: str, tokens_used: int, text_length: int, when: datetime = None):
+    """Somar um uso aos agregados diário e mensal (chamar na mesma transação do INSERT bruto)"""
+    when = when or datetime.utcnow()
+    params = {
+        "operation": operation,
+        "model": model,
+        "tokens_used": tokens_used or 0,
+        "text_length": text_length or 0
+    }
+    for table, period in ROLLUP_TABLES.items():
+        session.execute(text(f"""
+            INSERT INTO {table} ({period}, operation, model, calls, tokens_used, text_length)
+            VALUES (:period, :operation, :model, 1, :tokens_used, :text_length)
+            ON CONFLICT ({period}, operation, model) DO UPDATE SET
+                calls = calls + 1,
+                tokens_used = tokens_used + excluded.tokens_used,
+                text_length = text_length + excluded.text_length
+        """), dict(params, period=when.strftime("%Y-%m-%d" if period == "day" else "%Y-%m")))
+
+
+def recent_tokens(session, recent_days: int = 30) -> int:
+    """Tokens usados nos últimos recent_days dias, a partir do agregado diário"""
+    since = (datetime.utcnow() - timedelta(days=recent_days)).strftime("%Y-%m-%d")
+    return session.execute(
+        text("SELECT SUM(tokens_used) FROM embedding_usage_daily WHERE day >= :since"), {"since": since}
+    ).scalar() or 0
+
+
+def usage_summary(session, recent_days: int = 30) -> Dict:
+    """Totais de uso a partir dos agregados: total, por operação e dos últimos recent_days dias"""
+    total = session.execute(text("SELECT SUM(tokens_used) FROM embedding_usage_monthly")).scalar() or 0
+    operations = session.execute(text("""
+        SELECT operation, SUM(calls), SUM(tokens_used)
+        FROM embedding_usage_monthly
+        GROUP BY operation
+    """)).fetchall()
+    recent = recent_tokens(session, recent_days)
+    return {
+        "total_tokens_used": total,
+        "recent_tokens_used": recent,
+        "operations": [
+            {"operation": operation, "count": count, "total_tokens": tokens or 0}
+            for operation, count, tokens in operations
+        ]
+    }
+
+
+def compact_usage(session, raw_retention_days: int) -> int:
+    """Remover linhas brutas mais antigas que raw_retention_days (já contadas nos agregados); retorna quantas"""
+    cutoff = (datetime.utcnow() - timedelta(days=raw_retention_days)).strftime("%Y-%m-%d")
+    result = session.execute(
+        text("DELETE FROM index_embedding_usage WHERE date(created_at) < :cutoff"), {"cutoff": cutoff}
+    )
+    return result.rowcount or 0